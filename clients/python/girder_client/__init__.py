@@ -8,6 +8,8 @@ except importlib.metadata.PackageNotFoundError:
 
 __license__ = 'Apache 2.0'
 
+import concurrent.futures
+import datetime
 import getpass
 import glob
 import io
@@ -18,10 +20,12 @@ import os
 import re
 import shutil
 import tempfile
+import threading
 from contextlib import contextmanager
 
 import diskcache
 import requests
+from requests.adapters import HTTPAdapter
 
 DEFAULT_PAGE_LIMIT = 50  # Number of results to fetch per request
 REQ_BUFFER_SIZE = 65536  # Chunk size when iterating a download body
@@ -119,6 +123,8 @@ class GirderClient:
 
     # The current maximum chunk size for uploading file chunks
     MAX_CHUNK_SIZE = 1024 * 1024 * 64
+    # The number of times a failed chunk is resent after resyncing with the server
+    UPLOAD_RETRIES = 3
 
     DEFAULT_API_ROOT = 'api/v1'
     DEFAULT_HOST = 'localhost'
@@ -150,7 +156,7 @@ class GirderClient:
             return 'https'
 
     def __init__(self, host=None, port=None, apiRoot=None, scheme=None, apiUrl=None,
-                 cacheSettings=None, progressReporterCls=None):
+                 cacheSettings=None, progressReporterCls=None, parallel=1):
         """
         Construct a new GirderClient object, given a host name and port number,
         as well as a username and password which will be used in all requests
@@ -178,6 +184,9 @@ class GirderClient:
             a class attribute `reportProgress` set to True (It can conveniently be
             initialized using `sys.stdout.isatty()`).
             This defaults to :class:`_NoopProgressReporter`.
+        :param parallel: The number of requests used concurrently when uploading
+            many files with :py:meth:`upload`, and when uploading the parts of
+            a large file to an assetstore that accepts them out of order.
         """
         self.host = None
         self.scheme = None
@@ -219,6 +228,10 @@ class GirderClient:
 
         self.progressReporterCls = progressReporterCls
         self._session = None
+        self.parallel = max(1, parallel)
+        self._chunkSlots = None
+        self._uploadPool = None
+        self._uploadFutures = []
 
     @contextmanager
     def session(self, session=None):
@@ -960,6 +973,12 @@ class GirderClient:
         """
         Uploads contents of a file.
 
+        Chunks are sent in order, except for large files going to an S3
+        assetstore, whose parts are sent concurrently using up to
+        :py:attr:`parallel` requests.  A chunk that fails to send is resent
+        from the offset the server reports, up to :py:attr:`UPLOAD_RETRIES`
+        times.
+
         :param uploadObj: The upload object contain the upload id.
         :type uploadObj: dict
         :param stream: Readable stream object.
@@ -974,11 +993,14 @@ class GirderClient:
         :type progressCallback: callable
         """
         offset = 0
+        upload = uploadObj
         uploadId = uploadObj['_id']
 
         with self.progressReporterCls(label=uploadObj.get('name', ''), length=size) as reporter:
-
-            while True:
+            if self.parallel > 1 and uploadObj.get('s3', {}).get('chunked'):
+                uploadObj, offset = self._uploadParts(
+                    uploadObj, stream, size, reporter, progressCallback)
+            while offset < size:
                 chunk = stream.read(min(self.MAX_CHUNK_SIZE, (size - offset)))
 
                 if not chunk:
@@ -987,9 +1009,7 @@ class GirderClient:
                 if isinstance(chunk, str):
                     chunk = chunk.encode('utf8')
 
-                uploadObj = self.post(
-                    'file/chunk?offset=%d&uploadId=%s' % (offset, uploadId),
-                    data=_ProgressBytesIO(chunk, reporter=reporter))
+                uploadObj = self._uploadChunk(upload, chunk, offset, reporter)
 
                 if '_id' not in uploadObj:
                     raise Exception(
@@ -1009,9 +1029,148 @@ class GirderClient:
             raise IncorrectUploadLengthError(
                 'Expected upload to be %d bytes, but received %d.' % (size, offset),
                 upload=uploadObj)
+        if size and uploadObj.get('_modelType') != 'file':
+            # The response to the chunk that finished the upload was lost
+            uploadObj = self._uploadedFile(upload)
+            if uploadObj is None:
+                raise Exception('Upload %s was sent, but its file was not found.' % uploadId)
 
         return uploadObj
 
+    def _uploadedFile(self, upload):
+        """
+        Find the file that an upload created, for when the response that
+        would have returned it was lost.
+
+        :param upload: The upload document, as returned when it was created.
+        :type upload: dict
+        :returns: The file document, or None if it was not found.
+        """
+        try:
+            if upload.get('fileId'):
+                files = [self.getFile(upload['fileId'])]
+            elif upload.get('parentType') == 'item':
+                files = self.listFile(upload['parentId'])
+            elif upload.get('parentType') == 'folder':
+                files = [
+                    file for item in self.listItem(upload['parentId'], name=upload['name'])
+                    for file in self.listFile(item['_id'])]
+            else:
+                return None
+            created = datetime.datetime.fromisoformat(upload['created'])
+            files = [
+                file for file in files
+                if file['name'] == upload['name'] and file['size'] == upload['size']
+                and file.get('creatorId') == upload.get('userId')
+                and datetime.datetime.fromisoformat(file['created']) >= created]
+        except (requests.ConnectionError, HttpError):
+            return None
+        return max(files, key=lambda file: file['created'], default=None)
+
+    def _uploadChunk(self, upload, chunk, offset, reporter, isPart=False):
+        """
+        Send a chunk of an upload.  If the request fails because of a
+        connection or server error, the offset the server has recorded is
+        requested and whatever part of the chunk it is missing is sent again.
+
+        :param upload: The upload document, as returned when it was created.
+        :type upload: dict
+        :param chunk: The bytes of the chunk.
+        :type chunk: bytes
+        :param offset: The offset of the chunk within the file.
+        :type offset: int
+        :param reporter: The progress reporter of the upload.
+        :param isPart: Whether the chunk is a part of an upload whose parts
+            may be sent in any order.  The server lists the parts it is
+            missing for those, rather than a single offset.
+        :returns: The upload or, for the last chunk, the file document that
+            the server returned.  If the response to a chunk was lost, only
+            the ``_id`` of the upload is returned, unless the chunk finished
+            the upload, in which case the file document is looked up.
+        """
+        uploadId = upload['_id']
+        retries = 0
+        while True:
+            try:
+                return self.post(
+                    'file/chunk?offset=%d&uploadId=%s' % (offset, uploadId),
+                    data=_ProgressBytesIO(chunk, reporter=reporter))
+            except (requests.ConnectionError, HttpError) as exc:
+                if retries >= self.UPLOAD_RETRIES or (
+                        isinstance(exc, HttpError) and exc.status < 500):
+                    raise
+                retries += 1
+                _logger.warning('Retrying chunk at offset %d of upload %s: %s',
+                                offset, uploadId, exc)
+                try:
+                    resume = self.get('file/offset', {'uploadId': uploadId})
+                except (requests.ConnectionError, HttpError):
+                    # The upload may have been finalized by a chunk whose
+                    # response was lost, in which case it can't be resumed.
+                    file = self._uploadedFile(upload)
+                    if file is None:
+                        raise exc
+                    return file
+            if isPart:
+                if offset not in resume.get('missing', [offset]):
+                    return {'_id': uploadId}
+            elif resume['offset'] >= offset + len(chunk):
+                # The server has stored the chunk, but its response was lost
+                return {'_id': uploadId}
+            elif resume['offset'] > offset:
+                chunk = chunk[resume['offset'] - offset:]
+                offset = resume['offset']
+
+    def _uploadParts(self, uploadObj, stream, size, reporter, progressCallback=None):
+        """
+        Send the parts of an upload concurrently.  This is only used for S3
+        assetstores, which accept chunks that match the upload's parts in any
+        order.
+
+        :returns: The file document if every part was sent, otherwise the
+            upload document, along with the number of bytes read from stream.
+        """
+        partSize = uploadObj['s3']['chunkLength']
+        slots = self._chunkSlots or threading.BoundedSemaphore(self.parallel)
+        lock = threading.Lock()
+        progress = {'current': 0, 'total': size}
+        result = uploadObj
+        offset = 0
+
+        def sendPart(chunk, partOffset):
+            try:
+                obj = self._uploadChunk(uploadObj, chunk, partOffset, reporter, isPart=True)
+            finally:
+                slots.release()
+            with lock:
+                progress['current'] += len(chunk)
+                if callable(progressCallback):
+                    progressCallback(dict(progress))
+            return obj
+
+        with concurrent.futures.ThreadPoolExecutor(self.parallel) as pool:
+            futures = []
+            while offset < size:
+                # Bound the number of parts held in memory
+                slots.acquire()
+                if any(future.done() and future.exception() for future in futures):
+                    slots.release()
+                    break
+                chunk = stream.read(min(partSize, size - offset))
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf8')
+                if len(chunk) != min(partSize, size - offset):
+                    slots.release()
+                    offset += len(chunk)
+                    break
+                futures.append(pool.submit(sendPart, chunk, offset))
+                offset += len(chunk)
+            for future in futures:
+                obj = future.result()
+                if obj.get('_modelType') == 'file':
+                    result = obj
+        return result, offset
+
     def uploadFile(self, parentId, stream, name, size, parentType='item',
                    progressCallback=None, reference=None, mimeType=None):
         """
@@ -1517,21 +1676,25 @@ class GirderClient:
         if not self.progressReporterCls.reportProgress:
             print('Uploading Item from %s' % localFile)
         if not dryRun:
-            # If we are reusing existing items or have upload callbacks, then
-            # we need to know the item as part of the process.  If this is a
-            # zero-length file, we create an item.  Otherwise, we can just
-            # upload to the parent folder and never learn about the created
-            # item.
-            if reuseExisting or len(self._itemUploadCallbacks) or os.path.getsize(filePath) == 0:
-                currentItem = self.loadOrCreateItem(
-                    os.path.basename(localFile), parentFolderId, reuseExisting)
-                self.uploadFileToItem(
-                    currentItem['_id'], filePath, filename=localFile, reference=reference)
-                for callback in self._itemUploadCallbacks:
-                    callback(currentItem, filePath)
-            else:
-                self.uploadFileToFolder(
-                    parentFolderId, filePath, filename=localFile, reference=reference)
+            self._submitUpload(
+                self._uploadFileAsItem, localFile, parentFolderId, filePath, reuseExisting,
+                reference)
+
+    def _uploadFileAsItem(self, localFile, parentFolderId, filePath, reuseExisting, reference):
+        # If we are reusing existing items or have upload callbacks, then we
+        # need to know the item as part of the process.  If this is a
+        # zero-length file, we create an item.  Otherwise, we can just upload
+        # to the parent folder and never learn about the created item.
+        if reuseExisting or len(self._itemUploadCallbacks) or os.path.getsize(filePath) == 0:
+            currentItem = self.loadOrCreateItem(
+                os.path.basename(localFile), parentFolderId, reuseExisting)
+            self.uploadFileToItem(
+                currentItem['_id'], filePath, filename=localFile, reference=reference)
+            for callback in self._itemUploadCallbacks:
+                callback(currentItem, filePath)
+        else:
+            self.uploadFileToFolder(
+                parentFolderId, filePath, filename=localFile, reference=reference)
 
     def _uploadFolderAsItem(self, localFolder, parentFolderId, reuseExisting=False, blacklist=None,
                             dryRun=False, reference=None):
@@ -1563,9 +1726,12 @@ class GirderClient:
             print('Adding file %s, (%d of %d) to Item' % (currentFile, ind + 1, filecount))
 
             if not dryRun:
-                self.uploadFileToItem(item['_id'], filepath, filename=currentFile)
+                self._submitUpload(
+                    self.uploadFileToItem, item['_id'], filepath, filename=currentFile)
 
         if not dryRun:
+            if self._itemUploadCallbacks:
+                self._waitForUploads()
             for callback in self._itemUploadCallbacks:
                 callback(item, localFolder)
 
@@ -1628,16 +1794,40 @@ class GirderClient:
                         reference=reference)
 
             if not dryRun:
+                if self._folderUploadCallbacks:
+                    self._waitForUploads()
                 for callback in self._folderUploadCallbacks:
                     callback(folder, localFolder)
 
+    def _submitUpload(self, func, *args, **kwargs):
+        """
+        Run an upload in the worker pool of :py:meth:`upload`, or right away
+        if there is no pool.
+        """
+        if self._uploadPool is None:
+            return func(*args, **kwargs)
+        self._uploadFutures.append(self._uploadPool.submit(func, *args, **kwargs))
+
+    def _waitForUploads(self):
+        """
+        Wait for the uploads submitted to the worker pool so far, raising the
+        first error that any of them failed with.
+        """
+        futures, self._uploadFutures = self._uploadFutures, []
+        for future in futures:
+            future.result()
+
     def upload(self, filePattern, parentId, parentType='folder', leafFoldersAsItems=False,
-               reuseExisting=False, blacklist=None, dryRun=False, reference=None):
+               reuseExisting=False, blacklist=None, dryRun=False, reference=None,
+               parallel=None):
         """
         Upload a pattern of files.
 
         This will recursively walk down every tree in the file pattern to
-        create a hierarchy on the server under the parentId.
+        create a hierarchy on the server under the parentId.  Folders and
+        items are created in order, while files are uploaded by a pool of
+        ``parallel`` workers sharing the connections of a single
+        :py:meth:`session`.
 
         :param filePattern: a glob pattern for files that will be uploaded,
             recursively copying any file folder structures.  If this is a list
@@ -1658,7 +1848,45 @@ class GirderClient:
         :type dryRun: bool
         :param reference: Option reference to send along with the upload.
         :type reference: str
-        """
+        :param parallel: The number of files, or parts of a large file, to
+            upload concurrently.  Defaults to :py:attr:`parallel`.
+        :type parallel: int
+        """
+        parallel = max(1, parallel or self.parallel)
+        if self._session is None:
+            with self.session() as session:
+                adapter = session.get_adapter(self.urlBase)
+                session.mount(self.urlBase, HTTPAdapter(
+                    pool_maxsize=parallel * 2, max_retries=adapter.max_retries))
+                return self.upload(
+                    filePattern, parentId, parentType, leafFoldersAsItems, reuseExisting,
+                    blacklist, dryRun, reference, parallel)
+
+        previous = self.parallel, self._chunkSlots
+        self.parallel = parallel
+        self._chunkSlots = threading.BoundedSemaphore(parallel)
+        try:
+            if parallel > 1 and not dryRun:
+                with concurrent.futures.ThreadPoolExecutor(parallel) as pool:
+                    self._uploadPool = pool
+                    try:
+                        self._uploadPattern(
+                            filePattern, parentId, parentType, leafFoldersAsItems,
+                            reuseExisting, blacklist, dryRun, reference)
+                        self._waitForUploads()
+                    finally:
+                        self._uploadPool = None
+                        self._uploadFutures = []
+                        pool.shutdown(cancel_futures=True)
+            else:
+                self._uploadPattern(
+                    filePattern, parentId, parentType, leafFoldersAsItems, reuseExisting,
+                    blacklist, dryRun, reference)
+        finally:
+            self.parallel, self._chunkSlots = previous
+
+    def _uploadPattern(self, filePattern, parentId, parentType, leafFoldersAsItems,
+                       reuseExisting, blacklist, dryRun, reference):
         filePatternList = filePattern if isinstance(filePattern, (list, tuple)) else [filePattern]
         blacklist = blacklist or []
         empty = True
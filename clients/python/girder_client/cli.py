@@ -2,6 +2,7 @@
 import logging
 import sys
 import types
+from contextlib import contextmanager
 from http.client import HTTPConnection
 
 import click
@@ -80,11 +81,18 @@ class GirderCli(GirderClient):
         elif username:
             self.authenticate(username, password, interactive=interactive)
 
-    def sendRestRequest(self, *args, **kwargs):
-        with self.session() as session:
+    @contextmanager
+    def session(self, session=None):
+        with super().session(session) as session:
             session.verify = self.sslVerify
             if self.retries:
                 session.mount(self.urlBase, HTTPAdapter(max_retries=self.retries))
+            yield session
+
+    def sendRestRequest(self, *args, **kwargs):
+        if self._session is not None:
+            return super().sendRestRequest(*args, **kwargs)
+        with self.session():
             return super().sendRestRequest(*args, **kwargs)
 
 
@@ -335,15 +343,18 @@ _short_help = 'Upload files to Girder'
               help='comma-separated list of filenames to ignore')
 @click.option('--reference', default=None,
               help='optional reference to send along with the upload')
+@click.option('--parallel', default=1, show_default=True, type=click.IntRange(min=1),
+              help='number of files, or parts of large files, to upload concurrently')
 @click.pass_obj
 def _upload(gc, parent_type, parent_id, local_folder,
-            leaf_folders_as_items, reuse, blacklist, dry_run, reference):
+            leaf_folders_as_items, reuse, blacklist, dry_run, reference, parallel):
     if parent_type == 'auto':
         parent_type = _lookup_parent_type(gc, parent_id)
     gc.upload(
         local_folder, parent_id, parent_type,
         leafFoldersAsItems=leaf_folders_as_items, reuseExisting=reuse,
-        blacklist=blacklist.split(','), dryRun=dry_run, reference=reference)
+        blacklist=blacklist.split(','), dryRun=dry_run, reference=reference,
+        parallel=parallel)
 
 
 _short_help = 'List contents of a user, collection, folder, item, or file'
@@ -376,7 +376,8 @@ class Description:
 
         return self
 
-    def pagingParams(self, defaultSort, defaultSortDir=SortDir.ASCENDING, defaultLimit=50):
+    def pagingParams(self, defaultSort, defaultSortDir=SortDir.ASCENDING, defaultLimit=50,
+                     cursor=False):
         """
         Adds the limit, offset, sort, and sortdir parameter documentation to
         this route handler.
@@ -387,10 +388,19 @@ class Description:
         :type defaultSortDir: int
         :param defaultLimit: The default page size.
         :type defaultLimit: int
+        :param cursor: Whether to also add the cursor parameter, for handlers
+            that support keyset pagination with :py:func:`girder.api.rest.pageByCursor`.
+        :type cursor: bool
         """
         self.param(
             'limit', 'Result set size limit.', default=defaultLimit, required=False, dataType='int')
         self.param('offset', 'Offset into result set.', default=0, required=False, dataType='int')
+        if cursor:
+            self.param(
+                'cursor', 'Pass this instead of an offset to page through the result set with a '
+                'cursor, which is faster for deep pages.  Pass an empty value for the first page, '
+                'then the value of the Girder-Next-Cursor response header of each page to get the '
+                'next one.  That header is not set on the last page.', required=False)
 
         if defaultSort is not None:
             self.param(
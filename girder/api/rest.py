@@ -20,13 +20,14 @@ import pymongo.command_cursor
 from dogpile.cache.util import kwarg_function_key_generator
 
 from girder import auditLogger, events
-from girder.constants import ServerMode, SortDir, TokenScope
+from girder.constants import TOTAL_COUNT_ESTIMATE_MAX, ServerMode, SortDir, TokenScope
 from girder.exceptions import AccessException, GirderException, RestException, ValidationException
+from girder.models.model_base import countResults
 from girder.models.setting import Setting
 from girder.models.token import Token
 from girder.models.user import User
 from girder.settings import SettingKey
-from girder.utility import JsonEncoder, config, optionalArgumentDecorator, toBool
+from girder.utility import JsonEncoder, config, keyset, optionalArgumentDecorator, toBool
 from girder.utility._cache import requestCache
 from girder.utility.model_importer import ModelImporter
 
@@ -36,6 +37,13 @@ from . import docs
 READ_BUFFER_LEN = 65536
 
 _MONGO_CURSOR_TYPES = (pymongo.cursor.Cursor, pymongo.command_cursor.CommandCursor)
+# The ASGI server sets this WSGI environ key when it can send response bodies
+# from files on disk itself; the path of the file is passed in SENDFILE_HEADER.
+SENDFILE_ENVIRON_KEY = 'girder.sendfile'
+SENDFILE_HEADER = 'X-Girder-Sendfile'
+# The server also sets this WSGI environ key to a list, to which functions to
+# call once the whole file has been sent are added.
+SENDFILE_CALLBACKS_ENVIRON_KEY = 'girder.sendfile.callbacks'
 logger = logging.getLogger(__name__)
 
 
@@ -163,7 +171,7 @@ def getCurrentToken(allowCookie=None):
     if not tokenStr:
         return None
 
-    return Token().load(tokenStr, force=True, objectId=False)
+    return Token().loadCached(tokenStr)
 
 
 def getCurrentUser(returnToken=False):
@@ -206,7 +214,7 @@ def getCurrentUser(returnToken=False):
         except AccessException:
             return retVal(None, token)
 
-        user = User().load(token['userId'], force=True)
+        user = User().loadCached(token['userId'])
         return retVal(user, token)
 
 
@@ -410,8 +418,41 @@ class loadmodel:  # noqa: class name
         return wrapped
 
 
+def _setTotalCount(val, defaultMode='exact'):
+    """
+    Set the Girder-Total-Count response header for the results of a listing.
+    Clients can choose how it is computed with the Girder-Total-Count-Mode
+    request header:
+
+    * ``exact``: count all of the results.
+    * ``estimated``: use the estimated document count of the collection if
+      the results are not filtered, otherwise count at most
+      ``TOTAL_COUNT_ESTIMATE_MAX`` results.  The Girder-Total-Count-Estimated
+      response header is also set.
+    * ``none``: don't set the header.
+
+    :param val: A cursor returned by find or findWithPermissions.
+    :param defaultMode: The mode used if the client doesn't choose one.
+    :type defaultMode: str
+    """
+    mode = cherrypy.request.headers.get('Girder-Total-Count-Mode', defaultMode).strip().lower()
+    if mode not in ('exact', 'estimated', 'none'):
+        raise RestException('Invalid Girder-Total-Count-Mode header: %s.' % mode)
+    if mode == 'none':
+        return
+
+    if mode == 'estimated':
+        count = countResults(val, limit=TOTAL_COUNT_ESTIMATE_MAX, estimate=True)
+    else:
+        count = countResults(val)
+    if count is not None:
+        cherrypy.response.headers['Girder-Total-Count'] = count
+        if mode == 'estimated':
+            cherrypy.response.headers['Girder-Total-Count-Estimated'] = 'true'
+
+
 class filtermodel:  # noqa: class name
-    def __init__(self, model, plugin='_core', addFields=None):
+    def __init__(self, model, plugin='_core', addFields=None, countMode='exact'):
         """
         This creates a decorator that will filter a model or list of models
         returned by the wrapped function using the specified model's
@@ -427,8 +468,14 @@ class filtermodel:  # noqa: class name
             the returned document(s), in addition to any in the model's normal
             whitelist. Only affects top level fields.
         :type addFields: `set, list, tuple, or None`
+        :param countMode: How the Girder-Total-Count header is computed if the
+            client doesn't choose, one of ``exact``, ``estimated`` or ``none``.
+            Endpoints whose result sets can be very large may pass ``none`` to
+            only count them when asked to.
+        :type countMode: str
         """
         self.addFields = addFields
+        self.countMode = countMode
         self.model = model
         self.plugin = plugin
         self._isModelClass = inspect.isclass(model)
@@ -448,10 +495,7 @@ class filtermodel:  # noqa: class name
             user = getCurrentUser()
 
             if isinstance(val, _MONGO_CURSOR_TYPES):
-                if callable(getattr(val, 'count_documents', None)):
-                    cherrypy.response.headers['Girder-Total-Count'] = val.count_documents()
-                elif callable(getattr(val, 'count', None)):
-                    cherrypy.response.headers['Girder-Total-Count'] = val.count()
+                _setTotalCount(val, self.countMode)
                 return [model.filter(m, user, self.addFields) for m in val]
             elif isinstance(val, (list, tuple, types.GeneratorType)):
                 return [model.filter(m, user, self.addFields) for m in val]
@@ -462,6 +506,41 @@ class filtermodel:  # noqa: class name
         return wrapped
 
 
+def pageByCursor(find, cursor, limit, offset, sort):
+    """
+    Get a page of a listing using keyset pagination.  Rather than skipping
+    ``offset`` documents, this only queries for the documents that sort after
+    the last document of the previous page, so deep pages are as fast as the
+    first one.  If the page is full, the cursor of the next page is set in the
+    ``Girder-Next-Cursor`` response header.  The total count of the listing is
+    not computed.
+
+    :param find: A function that takes ``sort`` and ``filters`` keyword
+        arguments and returns up to ``limit`` documents of the listing which
+        match the ``filters`` query, in the given sort order.
+    :type find: callable
+    :param cursor: The cursor of the page, or an empty string for the first
+        page.
+    :type cursor: str
+    :param limit: The page size.
+    :type limit: int
+    :param offset: The offset parameter, which must be 0 when using a cursor.
+    :type offset: int
+    :param sort: The sort order.
+    :type sort: List of (key, order) tuples.
+    :returns: A list of the documents of the page.
+    """
+    if offset:
+        raise RestException('The offset parameter cannot be used with a cursor.')
+
+    sort = keyset.normalizeSort(sort)
+    filters = keyset.cursorQuery(sort, keyset.decodeCursor(cursor, sort)) if cursor else {}
+    results = list(find(sort=sort, filters=filters))
+    if limit and len(results) == limit:
+        cherrypy.response.headers['Girder-Next-Cursor'] = keyset.encodeCursor(results[-1], sort)
+    return results
+
+
 def setRawResponse(val=True):
     """
     Normally, non-streaming responses go through a serialization process in
@@ -488,6 +567,44 @@ def setResponseHeader(header, value):
     cherrypy.response.headers[header] = value
 
 
+def sendFile(path):
+    """
+    If the server supports it, have it send the response body directly from a
+    file on disk, which is much faster than yielding its contents from a
+    generator.  The Content-Length header, and the Content-Range header for
+    partial responses, must already be set; they determine which bytes of the
+    file are sent.
+
+    :param path: The absolute path of the file.
+    :type path: str
+    :returns: True if the server will send the file, in which case the
+        response body must be empty.
+    """
+    environ = getattr(cherrypy.request, 'wsgi_environ', None) or {}
+    if not environ.get(SENDFILE_ENVIRON_KEY):
+        return False
+    setResponseHeader(SENDFILE_HEADER, urllib.parse.quote(path))
+    return True
+
+
+def afterFileSent(callback):
+    """
+    If the server is sending the current response body from a file (see
+    :py:func:`sendFile`), call a function once the whole file has been sent.
+    It is not called if the client disconnects first, or if the request is a
+    HEAD request.  If the response is not sent from a file, the function is
+    called immediately.
+
+    :param callback: The function to call, with no arguments.
+    """
+    environ = getattr(cherrypy.request, 'wsgi_environ', None) or {}
+    callbacks = environ.get(SENDFILE_CALLBACKS_ENVIRON_KEY)
+    if callbacks is None or SENDFILE_HEADER not in cherrypy.response.headers:
+        callback()
+    else:
+        callbacks.append(callback)
+
+
 def rawResponse(fun):
     """
     This is a decorator that can be placed on REST route handlers, and is
@@ -625,10 +742,7 @@ def _mongoCursorToList(val):
     # This needs to be before the callable check, as mongo cursors can
     # be callable.
     if isinstance(val, _MONGO_CURSOR_TYPES):
-        if callable(getattr(val, 'count_documents', None)):
-            cherrypy.response.headers['Girder-Total-Count'] = val.count_documents()
-        elif callable(getattr(val, 'count', None)):
-            cherrypy.response.headers['Girder-Total-Count'] = val.count()
+        _setTotalCount(val)
         val = list(val)
     return val
 
@@ -126,11 +126,24 @@ class Assetstore(Resource):
         .param('fileExcludeRegex', 'If set, only filenames that do not match this regular '
                'expression will be imported. If a file matches both the include and exclude regex, '
                'it will be excluded.', required=False)
+        .param('batchEvents', 'Whether to trigger one imported event per batch of '
+               'folders or items rather than one per folder or item.',
+               dataType='boolean', required=False, default=False)
+        .param('incremental', 'Whether to skip files that have not changed since they '
+               'were last imported, and update the ones that have.',
+               dataType='boolean', required=False, default=False)
+        .param('markVanished', 'Whether to mark previously imported files that no longer '
+               'exist underneath the import path as vanished.',
+               dataType='boolean', required=False, default=False)
+        .param('concurrency', 'The number of directories or prefixes to list at once. '
+               'If not set, this uses the server default.',
+               dataType='integer', required=False)
         .errorResponse()
         .errorResponse('You are not an administrator.', 403)
     )
     def importData(self, assetstore, importPath, destinationId, destinationType, progress,
-                   leafFoldersAsItems, fileIncludeRegex, fileExcludeRegex, **kwargs):
+                   leafFoldersAsItems, fileIncludeRegex, fileExcludeRegex, batchEvents,
+                   incremental, markVanished, concurrency, **kwargs):
         user = self.getCurrentUser()
         parent = ModelImporter.model(destinationType).load(
             destinationId, user=user, level=AccessType.ADMIN, exc=True)
@@ -149,6 +162,10 @@ class Assetstore(Resource):
                 'fileIncludeRegex': fileIncludeRegex,
                 'fileExcludeRegex': fileExcludeRegex,
                 'importPath': importPath,
+                'batchEvents': batchEvents,
+                'incremental': incremental,
+                'markVanished': markVanished,
+                'concurrency': concurrency,
                 **extraParams
             },
             progress=progress,
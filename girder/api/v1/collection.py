@@ -7,7 +7,8 @@ from girder.utility import ziputil
 from girder.utility.progress import ProgressContext
 
 from ..describe import Description, autoDescribeRoute
-from ..rest import Resource, filtermodel, setContentDisposition, setResponseHeader
+from ..rest import (
+    Resource, filtermodel, pageByCursor, setContentDisposition, setResponseHeader)
 
 
 class Collection(Resource):
@@ -37,11 +38,20 @@ class Collection(Resource):
         Description('List or search for collections.')
         .responseClass('Collection', array=True)
         .param('text', 'Pass this to perform a text search for collections.', required=False)
-        .pagingParams(defaultSort='name')
+        .pagingParams(defaultSort='name', cursor=True)
     )
-    def find(self, text, limit, offset, sort):
+    def find(self, text, limit, offset, sort, cursor):
         user = self.getCurrentUser()
 
+        if cursor is not None:
+            def find(sort, filters):
+                if text is not None:
+                    return self._model.textSearch(
+                        text, user=user, limit=limit, sort=sort, filters=filters)
+                return self._model.list(user=user, limit=limit, sort=sort, filters=filters)
+
+            return pageByCursor(find, cursor, limit, offset, sort)
+
         if text is not None:
             return self._model.textSearch(text, user=user, limit=limit, offset=offset)
 
@@ -119,9 +129,8 @@ class Collection(Resource):
 
         def stream():
             zip = ziputil.ZipGenerator(collection['name'])
-            for (path, file) in self._model.fileList(
-                    collection, user=self.getCurrentUser(), subpath=False, mimeFilter=mimeFilter):
-                yield from zip.addFile(file, path)
+            yield from zip.addFiles(self._model.fileList(
+                collection, user=self.getCurrentUser(), subpath=False, mimeFilter=mimeFilter))
             yield zip.footer()
         return stream
 
@@ -151,10 +160,15 @@ class Collection(Resource):
         .param('progress', 'If recurse is set to True, this controls whether '
                'progress notifications will be sent.', dataType='boolean',
                default=False, required=False)
+        .param('bulk', 'If recurse is set to True, update folders in batches. '
+               'This is much faster for large hierarchies, but does not trigger '
+               'save events for each folder.', dataType='boolean',
+               default=False, required=False)
         .errorResponse('ID was invalid.')
         .errorResponse('Admin permission denied on the collection.', 403)
     )
-    def updateCollectionAccess(self, collection, access, public, recurse, progress, publicFlags):
+    def updateCollectionAccess(self, collection, access, public, recurse, progress, publicFlags,
+                               bulk):
         user = self.getCurrentUser()
         progress = progress and recurse
 
@@ -165,7 +179,7 @@ class Collection(Resource):
                     collection, includeItems=False, user=user, level=AccessType.ADMIN))
             return self._model.setAccessList(
                 collection, access, save=True, user=user, recurse=recurse,
-                progress=ctx, setPublic=public, publicFlags=publicFlags)
+                progress=ctx, setPublic=public, publicFlags=publicFlags, bulk=bulk)
 
     @access.user(scope=TokenScope.DATA_READ)
     @filtermodel(model=CollectionModel)
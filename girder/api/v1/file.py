@@ -217,7 +217,8 @@ class File(Resource):
         must remain logged in when passing each chunk, to authenticate that
         the writer of the chunk is the same as the person who initiated the
         upload. The passed offset is a verification mechanism for ensuring the
-        server and client agree on the number of bytes sent/received.
+        server and client agree on the number of bytes sent/received; some
+        assetstores also accept chunks out of order, at any offset they allow.
         """
         if cherrypy.request.headers.get('Content-Type', '').startswith('multipart/form-data'):
             raise RestException('Multipart encoding is no longer supported. Send the chunk in '
@@ -235,13 +236,10 @@ class File(Resource):
         if upload['userId'] != user['_id']:
             raise AccessException('You did not initiate this upload.')
 
-        if upload['received'] != offset:
-            raise RestException(
-                'Server has received %s bytes, but client sent offset %s.' % (
-                    upload['received'], offset))
         try:
             return Upload().handleChunk(
-                upload, chunk, filter=True, user=user, uploadExtraParameters=uploadExtraParameters)
+                upload, chunk, filter=True, user=user, uploadExtraParameters=uploadExtraParameters,
+                offset=offset)
         except OSError as exc:
             if exc.errno == errno.EACCES:
                 raise Exception('Failed to store upload.')
@@ -8,7 +8,8 @@ from girder.utility.model_importer import ModelImporter
 from girder.utility.progress import ProgressContext
 
 from ..describe import Description, autoDescribeRoute
-from ..rest import Resource, filtermodel, setContentDisposition, setResponseHeader
+from ..rest import (
+    Resource, filtermodel, pageByCursor, setContentDisposition, setResponseHeader)
 
 
 class Folder(Resource):
@@ -49,11 +50,11 @@ class Folder(Resource):
         .param('text', 'Pass to perform a text search.', required=False)
         .param('name', 'Pass to lookup a folder by exact name match. Must '
                'pass parentType and parentId as well when using this.', required=False)
-        .pagingParams(defaultSort='lowerName')
+        .pagingParams(defaultSort='lowerName', cursor=True)
         .errorResponse()
         .errorResponse('Read access was denied on the parent resource.', 403)
     )
-    def find(self, parentType, parentId, text, name, limit, offset, sort):
+    def find(self, parentType, parentId, text, name, limit, offset, sort, cursor):
         """
         Get a list of folders with given search parameters. Currently accepted
         search modes are:
@@ -65,6 +66,11 @@ class Folder(Resource):
         2. Searching with full text search across all folders in the system.
            Simply pass a "text" parameter for this mode.
         """
+        if cursor is not None:
+            return pageByCursor(
+                lambda sort, filters: self._find(
+                    parentType, parentId, text, name, limit, 0, sort, filters),
+                cursor, limit, offset, sort)
         return self._find(parentType, parentId, text, name, limit, offset, sort)
 
     def _find(self, parentType, parentId, text, name, limit, offset, sort, filters=None):
@@ -166,9 +172,8 @@ class Folder(Resource):
 
         def stream():
             zip = ziputil.ZipGenerator(folder['name'])
-            for (path, file) in self._model.fileList(
-                    folder, user=user, subpath=False, mimeFilter=mimeFilter):
-                yield from zip.addFile(file, path)
+            yield from zip.addFiles(self._model.fileList(
+                folder, user=user, subpath=False, mimeFilter=mimeFilter))
             yield zip.footer()
         return stream
 
@@ -223,10 +228,14 @@ class Folder(Resource):
         .param('progress', 'If recurse is set to True, this controls whether '
                'progress notifications will be sent.', dataType='boolean',
                default=False, required=False)
+        .param('bulk', 'If recurse is set to True, update subfolders in batches. '
+               'This is much faster for large hierarchies, but does not trigger '
+               'save events for each subfolder.', dataType='boolean',
+               default=False, required=False)
         .errorResponse('ID was invalid.')
         .errorResponse('Admin access was denied for the folder.', 403)
     )
-    def updateFolderAccess(self, folder, access, publicFlags, public, recurse, progress):
+    def updateFolderAccess(self, folder, access, publicFlags, public, recurse, progress, bulk):
         user = self.getCurrentUser()
         progress = progress and recurse  # Only enable progress in recursive case
         with ProgressContext(progress, user=user, title='Updating permissions',
@@ -236,7 +245,7 @@ class Folder(Resource):
                     folder, includeItems=False, user=user, level=AccessType.ADMIN))
             return self._model.setAccessList(
                 folder, access, save=True, recurse=recurse, user=user,
-                progress=ctx, setPublic=public, publicFlags=publicFlags)
+                progress=ctx, setPublic=public, publicFlags=publicFlags, bulk=bulk)
 
     @access.user(scope=TokenScope.DATA_WRITE)
     @filtermodel(model=FolderModel)
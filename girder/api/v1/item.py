@@ -7,7 +7,8 @@ from girder.models.item import Item as ItemModel
 from girder.utility import ziputil
 
 from ..describe import Description, autoDescribeRoute
-from ..rest import Resource, filtermodel, setContentDisposition, setResponseHeader
+from ..rest import (
+    Resource, filtermodel, pageByCursor, setContentDisposition, setResponseHeader)
 
 
 class Item(Resource):
@@ -45,11 +46,11 @@ class Item(Resource):
                required=False)
         .param('name', 'Pass to lookup an item by exact name match. Must '
                'pass folderId as well when using this.', required=False)
-        .pagingParams(defaultSort='lowerName')
+        .pagingParams(defaultSort='lowerName', cursor=True)
         .errorResponse()
         .errorResponse('Read access was denied on the parent folder.', 403)
     )
-    def find(self, folderId, text, name, limit, offset, sort):
+    def find(self, folderId, text, name, limit, offset, sort, cursor):
         """
         Get a list of items with given search parameters. Currently accepted
         search modes are:
@@ -61,6 +62,10 @@ class Item(Resource):
         2. Searching with full text search across all items in the system.
            Simply pass a "text" parameter for this mode.
         """
+        if cursor is not None:
+            return pageByCursor(
+                lambda sort, filters: self._find(folderId, text, name, limit, 0, sort, filters),
+                cursor, limit, offset, sort)
         return self._find(folderId, text, name, limit, offset, sort)
 
     def _find(self, folderId, text, name, limit, offset, sort, filters=None):
@@ -241,8 +246,7 @@ class Item(Resource):
 
         def stream():
             zip = ziputil.ZipGenerator(item['name'])
-            for (path, file) in self._model.fileList(item, subpath=False):
-                yield from zip.addFile(file, path)
+            yield from zip.addFiles(self._model.fileList(item, subpath=False))
             yield zip.footer()
         return stream
 
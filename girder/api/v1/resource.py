@@ -171,15 +171,17 @@ class Resource(BaseResource):
         setResponseHeader('Content-Type', 'application/zip')
         setContentDisposition('Resources.zip')
 
-        def stream():
-            zip = ziputil.ZipGenerator()
+        def fileList():
             for kind in resources:
                 model = ModelImporter.model(kind)
                 for id in resources[kind]:
                     doc = model.load(id=id, user=user, level=AccessType.READ)
-                    for (path, file) in model.fileList(
-                            doc=doc, user=user, includeMetadata=includeMetadata, subpath=True):
-                        yield from zip.addFile(file, path)
+                    yield from model.fileList(
+                        doc=doc, user=user, includeMetadata=includeMetadata, subpath=True)
+
+        def stream():
+            zip = ziputil.ZipGenerator()
+            yield from zip.addFiles(fileList())
             yield zip.footer()
         return stream
 
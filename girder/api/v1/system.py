@@ -332,11 +332,13 @@ class System(Resource):
         title = 'Running system consistency check'
         with ProgressContext(progress, user=user, title=title) as pc:
             results = {}
-            pc.update(title='Checking for orphaned records (Step 1 of 3)')
+            pc.update(title='Checking for orphaned records (Step 1 of 4)')
             results['orphansRemoved'] = self._pruneOrphans(pc)
-            pc.update(title='Checking for incorrect base parents (Step 2 of 3)')
+            pc.update(title='Checking for incorrect base parents (Step 2 of 4)')
             results['baseParentsFixed'] = self._fixBaseParents(pc)
-            pc.update(title='Checking for incorrect sizes (Step 3 of 3)')
+            pc.update(title='Checking for incorrect ancestors (Step 3 of 4)')
+            results['ancestorsFixed'] = self._fixAncestors(pc)
+            pc.update(title='Checking for incorrect sizes (Step 4 of 4)')
             results['sizesChanged'] = self._recalculateSizes(pc)
             return results
         # TODO:
@@ -390,7 +392,7 @@ class System(Resource):
     def _fixBaseParents(self, progress):
         fixes = 0
         models = [Folder(), Item()]
-        steps = sum(model.find().count() for model in models)
+        steps = sum(model.collection.estimated_document_count() for model in models)
         progress.update(total=steps, current=0)
         for model in models:
             for doc in model.find():
@@ -407,10 +409,17 @@ class System(Resource):
                     fixes += 1
         return fixes
 
+    def _fixAncestors(self, progress):
+        progress.update(total=0, current=0)
+        fixes = sum(1 for _ in Folder().checkAncestors())
+        if fixes:
+            Folder().rebuildAncestors(progress=progress)
+        return fixes
+
     def _pruneOrphans(self, progress):
         count = 0
         models = [File(), Folder(), Item()]
-        steps = sum(model.find().count() for model in models)
+        steps = sum(model.collection.estimated_document_count() for model in models)
         progress.update(total=steps, current=0)
         for model in models:
             for doc in model.find():
@@ -423,7 +432,7 @@ class System(Resource):
     def _recalculateSizes(self, progress):
         fixes = 0
         models = [Collection(), User()]
-        steps = sum(model.find().count() for model in models)
+        steps = sum(model.collection.estimated_document_count() for model in models)
         progress.update(total=steps, current=0)
         for model in models:
             for doc in model.find():
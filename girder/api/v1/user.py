@@ -4,7 +4,7 @@ import datetime
 import cherrypy
 
 from girder.api import access
-from girder.api.rest import Resource, filtermodel, setCurrentUser
+from girder.api.rest import Resource, filtermodel, pageByCursor, setCurrentUser
 from girder.constants import AccessType, TokenScope
 from girder.exceptions import AccessException, RestException
 from girder.models.setting import Setting
@@ -52,9 +52,15 @@ class User(Resource):
         Description('List or search for users.')
         .responseClass('User', array=True)
         .param('text', 'Pass this to perform a full text search for items.', required=False)
-        .pagingParams(defaultSort='lastName')
+        .pagingParams(defaultSort='lastName', cursor=True)
     )
-    def find(self, text, limit, offset, sort):
+    def find(self, text, limit, offset, sort, cursor):
+        if cursor is not None:
+            return pageByCursor(
+                lambda sort, filters: self._model.search(
+                    text=text, user=self.getCurrentUser(), limit=limit, sort=sort,
+                    filters=filters),
+                cursor, limit, offset, sort)
         return list(self._model.search(
             text=text, user=self.getCurrentUser(), offset=offset, limit=limit, sort=sort))
 
@@ -1,17 +1,114 @@
 import asyncio
 import logging
+import os
 import queue
 import socket
 import sys
 import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
+from http.cookies import SimpleCookie
 
+import cherrypy
+from cherrypy import _cpreqbody, _cprequest
+from cherrypy.lib import cptools, httputil
 from starlette.applications import Starlette
-from starlette.routing import Mount, WebSocketRoute
+from starlette.routing import Mount, Route, WebSocketRoute
 
+from girder.api.rest import SENDFILE_CALLBACKS_ENVIRON_KEY, SENDFILE_ENVIRON_KEY, SENDFILE_HEADER
 from girder.notification import UserNotificationsSocket
 from girder.wsgi import app as wsgi_app
 
+# Read size used when sending files without the zero-copy extension
+SENDFILE_CHUNK_SIZE = 1024 * 1024
+
+# Set GIRDER_ASGI_NATIVE_ROUTES=true to serve the routes in NATIVE_ROUTES without the WSGI bridge
+NATIVE_ROUTES_ENABLED = os.environ.get('GIRDER_ASGI_NATIVE_ROUTES', '').lower() in (
+    '1', 'true', 'yes', 'on')
+# The maximum number of threads that run the handlers of native routes
+NATIVE_THREAD_POOL = int(os.environ.get('GIRDER_ASGI_NATIVE_THREADS', 32))
+
+# The (method, resource name, subpath) of each REST route that can be served natively
+NATIVE_ROUTES = (
+    ('GET', 'file', '/{id}/download'),
+    ('GET', 'file', '/{id}/download/{name}'),
+    ('POST', 'file', '/chunk'),
+    ('GET', 'item', ''),
+    ('GET', 'folder', ''),
+)
+
+
+def _pop_sendfile(headers):
+    """
+    If the response body should be sent from a file, remove the internal
+    header naming it and return the path, offset, and length to send.
+    """
+    header_name = SENDFILE_HEADER.lower().encode('latin-1')
+    values = {k.lower(): v.decode('latin-1') for k, v in headers}
+    if header_name not in values:
+        return None
+    headers[:] = [(k, v) for k, v in headers if k.lower() != header_name]
+    path = urllib.parse.unquote(values[header_name])
+    offset = 0
+    if b'content-range' in values:
+        offset = int(values[b'content-range'].split()[1].split('-')[0])
+    return path, offset, int(values[b'content-length'])
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_file(scope, receive, send, start, path, offset, count):
+    """
+    Send a response whose body is part of a file.
+
+    :returns: whether all of it was sent before the client disconnected.
+    """
+    loop = asyncio.get_running_loop()
+    # Servers may drop what is sent after the client disconnects without
+    # raising an error, so watch for the disconnect.
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        with open(path, 'rb') as f:
+            await send(start)
+            if scope['method'] == 'HEAD':
+                count = 0
+            elif 'http.response.zerocopysend' in scope.get('extensions', {}):
+                await send({
+                    'type': 'http.response.zerocopysend',
+                    'file': f,
+                    'offset': offset,
+                    'count': count,
+                    'more_body': True,
+                })
+                count = 0
+            while count > 0 and not disconnected.done():
+                chunk = await loop.run_in_executor(
+                    None, os.pread, f.fileno(), min(SENDFILE_CHUNK_SIZE, count), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                count -= len(chunk)
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+            # Let the watcher see a disconnect during the last send
+            await asyncio.sleep(0)
+            sent = count == 0 and scope['method'] != 'HEAD' and not disconnected.done()
+            await send({
+                'type': 'http.response.body',
+                'body': b'',
+                'more_body': False,
+            })
+            return sent
+    finally:
+        disconnected.cancel()
+
 
 class _WSGIBridge:
     """
@@ -19,12 +116,15 @@ class _WSGIBridge:
 
     Streams request bodies directly to the WSGI app via a socketpair,
     eliminating async/sync round-trip overhead and large memory copies.
+    Responses whose bodies are files on disk (see
+    :py:func:`girder.api.rest.sendFile`) are sent by the bridge itself, using
+    the ASGI zero-copy send extension if the server supports it.
     """
 
     def __init__(self, wsgi_app):
         self._app = wsgi_app
 
-    def _build_environ(self, scope, body_file):
+    def _build_environ(self, scope, body_file, sendfile_callbacks):
         environ = {
             'REQUEST_METHOD': scope['method'],
             'SCRIPT_NAME': scope.get('root_path', ''),
@@ -38,6 +138,8 @@ class _WSGIBridge:
             'wsgi.multithread': True,
             'wsgi.multiprocess': False,
             'wsgi.run_once': False,
+            SENDFILE_ENVIRON_KEY: True,
+            SENDFILE_CALLBACKS_ENVIRON_KEY: sendfile_callbacks,
         }
         client = scope.get('client')
         if client:
@@ -69,6 +171,7 @@ class _WSGIBridge:
         response_headers = []
         chunk_queue = queue.Queue(maxsize=1)
         error = []
+        sendfile_callbacks = []
 
         def start_response(status, headers, exc_info=None):
             response_headers.clear()
@@ -87,7 +190,7 @@ class _WSGIBridge:
         def run_wsgi():
             body_file = rsock.makefile('rb')
             try:
-                environ = self._build_environ(scope, body_file)
+                environ = self._build_environ(scope, body_file, sendfile_callbacks)
                 result = self._app(environ, start_response)
                 try:
                     for chunk in result:
@@ -128,6 +231,22 @@ class _WSGIBridge:
             headers_sent = False
             while True:
                 chunk = await loop.run_in_executor(None, chunk_queue.get)
+                sendfile = None if headers_sent else _pop_sendfile(response_headers)
+                if sendfile:
+                    # The WSGI response body is empty; wait for it to end.
+                    while chunk is not None:
+                        chunk = await loop.run_in_executor(None, chunk_queue.get)
+                    # Only one task may receive at a time
+                    await asyncio.wait([req_task])
+                    sent = await _send_file(scope, receive, send, {
+                        'type': 'http.response.start',
+                        'status': response_status.get('code', 500),
+                        'headers': response_headers,
+                    }, *sendfile)
+                    if sent:
+                        for callback in sendfile_callbacks:
+                            await loop.run_in_executor(None, callback)
+                    break
                 if not headers_sent:
                     await send({
                         'type': 'http.response.start',
@@ -168,6 +287,184 @@ class _WSGIBridge:
             raise error[0]
 
 
+class _ReceiveStream:
+    """
+    A blocking, file-like view of an ASGI request body, which is read by a
+    handler running in a worker thread while the event loop receives it.
+    """
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = bytearray()
+        self._done = False
+
+    def _fill(self):
+        message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+        if message['type'] == 'http.disconnect':
+            raise OSError('The client disconnected while sending the request body.')
+        self._buffer += message.get('body', b'')
+        self._done = not message.get('more_body', False)
+
+    def read(self, size=-1):
+        while not self._done and (size is None or size < 0 or len(self._buffer) < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class _NativeHandler:
+    """
+    Serves a Girder REST resource directly from ASGI, bypassing the WSGI bridge.
+
+    Requests are dispatched to the same :py:class:`girder.api.rest.Resource`
+    that CherryPy would call, so events, access checks, and response encoding
+    are unchanged.  However, the handler runs in a thread pool that is shared
+    by all native routes, and its response is sent as it is produced instead of
+    being passed between threads.  CherryPy's own dispatching, hooks, and tools
+    are not run, except for the proxy tool if it is enabled.
+    """
+
+    def __init__(self, cp_app, resource_name, executor):
+        self._app = cp_app
+        self._resource_name = resource_name
+        self._executor = executor
+
+    def _build_request(self, scope, body_file):
+        client = scope.get('client') or ('', 0)
+        server = scope.get('server') or ('', 80)
+        version = scope.get('http_version', '1.1')
+        request = _cprequest.Request(
+            httputil.Host(server[0], server[1]), httputil.Host(client[0], client[1]),
+            scope.get('scheme', 'http'), f'HTTP/{version}')
+        request.app = self._app
+        request.method = scope['method']
+        request.protocol = tuple(int(part) for part in version.split('.'))
+        request.script_name = self._app.script_name
+        request.path_info = scope['path'][len(self._app.script_name):]
+        request.query_string = scope.get('query_string', b'').decode('latin-1')
+        request.header_list = [
+            (name.decode('latin-1'), value.decode('latin-1'))
+            for name, value in scope.get('headers', [])]
+        request.headers = httputil.HeaderMap()
+        request.cookie = SimpleCookie()
+        request.params = {}
+        request.toolmaps = {}
+        request.hooks = request.hooks.copy()
+        request.rfile = body_file
+        request.wsgi_environ = {SENDFILE_ENVIRON_KEY: True, SENDFILE_CALLBACKS_ENVIRON_KEY: []}
+        return request
+
+    def _resolve(self, scope):
+        prefix = f'{self._app.script_name}/v1/{self._resource_name}'
+        resource = getattr(self._app.root.v1, self._resource_name)
+        return resource, tuple(scope['path'][len(prefix):].split('/')[1:])
+
+    @staticmethod
+    def _call(request, response, func, *args):
+        # Handlers, and the generators they return, expect the request to be
+        # loaded in the thread that runs them.
+        cherrypy.serving.load(request, response)
+        try:
+            return func(*args)
+        finally:
+            cherrypy.serving.clear()
+
+    @staticmethod
+    def _handle(request, response, resource, path):
+        try:
+            request.config = dict(cherrypy.config)
+            request.config.update(request.app.config.get('/', {}))
+            request.namespaces(request.config)
+            request.process_headers()
+            if request.config.get('tools.proxy.on'):
+                cptools.proxy()
+            request.process_query_string()
+            request.body = _cpreqbody.RequestBody(
+                request.rfile, request.headers, request_params=request.params)
+            if request.method in request.methods_with_bodies:
+                request.body.process()
+            method = 'GET' if request.method == 'HEAD' else request.method
+            response.body = getattr(resource, method)(*path, **request.params)
+        except (cherrypy.HTTPError, cherrypy.HTTPRedirect) as exc:
+            exc.set_response()
+        response.finalize()
+
+    @staticmethod
+    def _close(body):
+        if hasattr(body, 'close'):
+            body.close()
+
+    async def __call__(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+
+        def run(func, *args):
+            return loop.run_in_executor(
+                self._executor, self._call, request, response, func, *args)
+
+        request = self._build_request(scope, _ReceiveStream(receive, loop))
+        response = _cprequest.Response()
+        await run(self._handle, request, response, *self._resolve(scope))
+        start = {
+            'type': 'http.response.start',
+            'status': int(response.status.split()[0]),
+            'headers': response.header_list,
+        }
+        body = iter(response.body)
+        try:
+            sendfile = _pop_sendfile(response.header_list)
+            if sendfile:
+                # The body is empty, but producing it may add callbacks
+                await run(list, body)
+                if await _send_file(scope, receive, send, start, *sendfile):
+                    for callback in request.wsgi_environ[SENDFILE_CALLBACKS_ENVIRON_KEY]:
+                        await run(callback)
+                return
+            await send(start)
+            if not response.stream and scope['method'] != 'HEAD':
+                await send({'type': 'http.response.body', 'body': b''.join(body)})
+                return
+            while scope['method'] != 'HEAD':
+                chunk = await run(next, body, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({
+                'type': 'http.response.body',
+                'body': b'',
+                'more_body': False,
+            })
+        finally:
+            await run(self._close, body)
+
+
+def _native_routes(tree):
+    """
+    Create the Starlette routes that serve ``NATIVE_ROUTES`` on each mount of
+    the Girder API in a CherryPy tree.
+    """
+    executor = ThreadPoolExecutor(
+        max_workers=NATIVE_THREAD_POOL, thread_name_prefix='girder-native')
+    routes = []
+    for script_name, cp_app in tree.apps.items():
+        if getattr(cp_app.root, 'v1', None) is None:
+            continue
+        for method, resource_name, subpath in NATIVE_ROUTES:
+            routes.append(Route(
+                f'{script_name}/v1/{resource_name}{subpath}',
+                _NativeHandler(cp_app, resource_name, executor),
+                methods=[method]))
+    return routes
+
+
 @asynccontextmanager
 async def lifespan(app):
     logger = logging.getLogger(__name__)
@@ -175,10 +472,22 @@ async def lifespan(app):
     yield
 
 
-app = Starlette(
-    lifespan=lifespan,
-    routes=[
-        WebSocketRoute('/notifications/me', UserNotificationsSocket),
-        Mount('/', app=_WSGIBridge(wsgi_app)),
-    ],
-)
+def create_app(native_routes=NATIVE_ROUTES_ENABLED):
+    """
+    Create the Girder ASGI application.
+
+    :param native_routes: Whether to serve the routes in ``NATIVE_ROUTES``
+        directly rather than through the WSGI bridge.
+    :type native_routes: bool
+    """
+    return Starlette(
+        lifespan=lifespan,
+        routes=[
+            WebSocketRoute('/notifications/me', UserNotificationsSocket),
+            *(_native_routes(wsgi_app) if native_routes else []),
+            Mount('/', app=_WSGIBridge(wsgi_app)),
+        ],
+    )
+
+
+app = create_app()
@@ -0,0 +1,38 @@
+import sys
+
+import cherrypy
+import click
+
+from girder.models.folder import Folder
+
+
+@click.command(
+    'rebuild-ancestors', short_help='Rebuild the folder ancestors index.',
+    help='Compute the ancestors index of every folder and item.  This must be '
+    'run once on databases created before the index existed, and may be rerun '
+    'at any time to repair it.')
+@click.option(
+    '-d', '--database', default=cherrypy.config['database']['uri'],
+    show_default=True,
+    help='The database URI to connect to.  If this does not include a ://, '
+         'the default database will be used.')
+@click.option(
+    '--check', is_flag=True, default=False,
+    help='Only report folders and items whose ancestors index is incorrect; '
+    'exit with a non-zero status if there are any.')
+def main(database, check):
+    if database and '://' in database:
+        cherrypy.config['database']['uri'] = database
+
+    folderModel = Folder()
+    if check:
+        errors = 0
+        for error in folderModel.checkAncestors():
+            errors += 1
+            click.echo('%s %s: ancestors are %s, expected %s' % (
+                error['model'], error['_id'], error['ancestors'], error['expected']))
+        click.echo('Found %d inconsistent documents.' % errors)
+        sys.exit(1 if errors else 0)
+
+    count = folderModel.rebuildAncestors()
+    click.echo('Rebuilt the ancestors index of %d folders.' % count)
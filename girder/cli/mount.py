@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import concurrent.futures
 import errno
 import functools
 import hashlib
@@ -76,6 +77,27 @@ class ServerFuse(fuse.Operations):
         self.cache = cachetools.TTLCache(maxsize=10000, ttl=int(options.pop('stat_cache_ttl', 1)))
         self.cacheLock = threading.Lock()
         self.diskcache = None
+        # Sequential readers have this many chunks fetched ahead of them into
+        # the diskcache by this many threads
+        self._prefetchChunks = int(options.pop('prefetch', 8))
+        self._prefetchThreads = int(options.pop('prefetch_threads', 4))
+        self._prefetchPool = None
+        self._prefetching = {}
+        self._prefetchLock = threading.Lock()
+        # Whole directory listings are cached by the directory's model and id
+        # for this many seconds, up to this many entries in all listings
+        dircacheTTL = float(options.pop('dircache_ttl', 10))
+        self._dircache = cachetools.TTLCache(
+            maxsize=int(options.pop('dircache_size', 100000)), ttl=dircacheTTL,
+            getsizeof=lambda listing: len(listing['names']) + 1) if dircacheTTL > 0 else None
+        self._dircacheLock = threading.Lock()
+        self._eventName = 'server_fuse_%d' % id(self)
+        if self._dircache is not None:
+            for model in ('folder', 'item', 'file'):
+                events.bind('model.%s.save.after' % model, self._eventName,
+                            self._invalidateDirectories)
+                events.bind('model.%s.remove' % model, self._eventName,
+                            self._invalidateDirectories)
         self._mount_stats = {
             'open': 0,
             'read': 0,
@@ -84,6 +106,8 @@ class ServerFuse(fuse.Operations):
             'bytesread': 0,
             'pathlookups': 0,
             'directpathchecks': 0,
+            'dircachehits': 0,
+            'dircachelookups': 0,
         }
         self._configure_disk_cache(options)
 
@@ -132,6 +156,9 @@ class ServerFuse(fuse.Operations):
                 'hits': 0,
                 'miss': 0,
                 'bytesread': 0,
+                'prefetched': 0,
+                'prefetchhits': 0,
+                'prefetchwaits': 0,
             }
 
     def __call__(self, op, path, *args, **kwargs):
@@ -178,6 +205,11 @@ class ServerFuse(fuse.Operations):
         flat = path.startswith('/flat')
         if flat:
             path = path[5:]
+        resource = self._lookUpInDirectory(path.rstrip('/'))
+        if resource is not None:
+            if flat and resource['model'] == 'item':
+                resource = self._flatResource(resource['document'])
+            return resource
         try:
             # We can't filter the resource, since that removes files'
             # assetstore information and users' size information.
@@ -191,15 +223,53 @@ class ServerFuse(fuse.Operations):
             logger.exception('ServerFuse server internal error')
             raise fuse.FuseOSError(errno.EROFS)
         if flat and resource['model'] == 'item':
-            file = self._flatItemFile(resource['document'])
-            if file is not None:
-                file['name'] = resource['document']['name']
-                resource = {
-                    'model': 'file',
-                    'document': file,
-                }
+            resource = self._flatResource(resource['document'])
         return resource   # {model, document}
 
+    def _lookUpInDirectory(self, path):
+        """
+        Look up a resource in the cached listing of its parent directory.
+
+        :param path: path within the fuse, without the /flat prefix.
+        :returns: a resource dictionary with the model, document, and stat
+            results of the resource, or None if the listing of its parent is
+            not cached.  An exception is raised if the listing is cached and
+            the resource is not in it.
+        """
+        if self._dircache is None:
+            return None
+        parentPath, name = path.rsplit('/', 1)
+        # Users and collections aren't cached
+        if parentPath.count('/') < 2:
+            return None
+        try:
+            parent = self._get_path(parentPath)
+        except fuse.FuseOSError:
+            return None
+        with self._dircacheLock:
+            listing = self._dircache.get((parent['model'], str(parent['document']['_id'])))
+        self._mount_stats['dircachelookups'] += 1
+        if listing is None:
+            return None
+        self._mount_stats['dircachehits'] += 1
+        if name not in listing['entries']:
+            raise fuse.FuseOSError(errno.ENOENT)
+        return dict(listing['entries'][name])
+
+    def _flatResource(self, item):
+        """
+        Get the resource that an item is shown as in the flat hierarchy.  This
+        is the item's file that has its name, or its first file.
+
+        :param item: the item document.
+        :returns: a resource dictionary.
+        """
+        file = self._flatItemFile(item)
+        if file is None:
+            return {'model': 'item', 'document': item}
+        file['name'] = item['name']
+        return {'model': 'file', 'document': file}
+
     def _flatItemFile(self, item):
         return next(File().collection.aggregate([
             {'$match': {'itemId': item['_id']}},
@@ -268,21 +338,83 @@ class ServerFuse(fuse.Operations):
         :returns: a list of the names of resources within the specified
         document.
         """
-        entries = []
+        return list(self._listing(doc, model)['names'])
+
+    def _listing(self, doc, model):
+        """
+        Get the entries in a Girder user, collection, folder, or item with
+        their stat results.  Listings are kept in the directory cache until
+        they expire or a change to one of their entries is saved.
+
+        :param doc: the girder resource document.
+        :param model: the girder model.
+        :returns: a dictionary with ``names``, the list of entry names,
+            ``entries``, a dictionary of resource dictionaries with stat
+            results by name, and ``ids``, the set of the entries' ids.
+        """
+        key = (model, str(doc['_id']))
+        if self._dircache is not None:
+            with self._dircacheLock:
+                listing = self._dircache.get(key)
+            self._mount_stats['dircachelookups'] += 1
+            if listing is not None:
+                self._mount_stats['dircachehits'] += 1
+                return listing
+        children = []
         if model in ('collection', 'user', 'folder'):
-            folderList = Folder().find({
+            children.extend(('folder', folder) for folder in Folder().find({
                 'parentId': doc['_id'],
                 'parentCollection': model.lower()
-            })
-            for folder in folderList:
-                entries.append(self._name(folder, 'folder'))
+            }))
         if model == 'folder':
-            for item in Folder().childItems(doc):
-                entries.append(self._name(item, 'item'))
+            children.extend(('item', item) for item in Folder().childItems(doc))
         elif model == 'item':
-            for file in Item().childFiles(doc):
-                entries.append(self._name(file, 'file'))
-        return entries
+            children.extend(('file', file) for file in Item().childFiles(doc))
+        listing = {'names': [], 'entries': {}, 'ids': set()}
+        for childModel, child in children:
+            name = self._name(child, childModel)
+            listing['names'].append(name)
+            listing['ids'].add(child['_id'])
+            listing['entries'].setdefault(name, {
+                'model': childModel,
+                'document': child,
+                'stat': self._stat(child, childModel),
+            })
+        if self._dircache is not None:
+            with self._dircacheLock:
+                try:
+                    self._dircache[key] = listing
+                except ValueError:
+                    # The listing is larger than the whole cache
+                    pass
+        return listing
+
+    def _invalidateDirectories(self, event):
+        """
+        When a folder, item, or file is saved or removed, drop the cached
+        listings of the directory it is in and of its own contents.  Cached
+        paths and stat results are dropped, too.
+
+        :param event: the model event.
+        """
+        doc = event.info
+        if not isinstance(doc, dict):
+            return
+        keys = {
+            (doc.get('parentCollection'), str(doc.get('parentId'))),
+            ('folder', str(doc.get('folderId'))),
+            ('item', str(doc.get('itemId'))),
+        }
+        if '_id' in doc:
+            keys.update({('folder', str(doc['_id'])), ('item', str(doc['_id']))})
+        with self._dircacheLock:
+            for key in list(self._dircache.keys()):
+                listing = self._dircache.get(key)
+                # A moved resource is still in the listing of its old parent
+                if key in keys or (listing is not None and doc.get('_id') in listing['ids']):
+                    self._dircache.pop(key, None)
+        with self.cacheLock:
+            self.cache.clear()
 
     def _mount_stats_repr(self):
         import json
@@ -296,6 +428,9 @@ class ServerFuse(fuse.Operations):
                 pass
         if self.diskcache:
             curstats['diskcache'] = {k: v for k, v in self.diskcache.items() if k != 'cache'}
+            curstats['diskcache']['prefetchhitrate'] = (
+                self.diskcache['prefetchhits'] / self.diskcache['prefetched']
+                if self.diskcache['prefetched'] else None)
         return (json.dumps(curstats, indent=2) + '\n').encode()
 
     # We don't handle extended attributes or ioctl.
@@ -361,7 +496,8 @@ class ServerFuse(fuse.Operations):
             attr['st_size'] = len(self._mount_stats_repr())
         else:
             resource = self._get_path(path)
-            attr = self._stat(resource['document'], resource['model'])
+            attr = (dict(resource['stat']) if 'stat' in resource else
+                    self._stat(resource['document'], resource['model']))
         if attr.get('st_blksize') and attr.get('st_size'):
             attr['st_blocks'] = int(
                 (attr['st_size'] + attr['st_blksize'] - 1) / attr['st_blksize'])
@@ -388,39 +524,7 @@ class ServerFuse(fuse.Operations):
             info = self.openFiles[fh]
         self._mount_stats['read'] += 1
         if self.diskcache and info.get('allowcache'):
-            result = b''
-            for idx in range(
-                    offset // self.diskcache['chunk'],
-                    (offset + size + self.diskcache['chunk'] - 1) // self.diskcache['chunk']):
-                idxoffset = idx * self.diskcache['chunk']
-                idxlen = min(self.diskcache['chunk'], info['size'] - idxoffset)
-                key = '%s-%d-%d' % (info['hash'], idxoffset, idxlen)
-                try:
-                    data = self.diskcache['cache'].get(key, None, read=True)
-                    if data is not None:
-                        self.diskcache['hits'] += 1
-                except Exception:
-                    logger.exception('diskcache threw an exception in get')
-                    data = None
-                if data is None:
-                    with info['lock']:
-                        if 'handle' not in info:
-                            info['handle'] = File().open(info['document'])
-                        handle = info['handle']
-                        handle.seek(idxoffset)
-                        data = handle.read(idxlen)
-                        self.diskcache['miss'] += 1
-                        self.diskcache['bytesread'] += len(data)
-                    try:
-                        self.diskcache['cache'][key] = data
-                    except Exception:
-                        logger.exception('diskcache threw an exception in set')
-                if isinstance(data, bytes):
-                    result += data[max(0, offset - idxoffset):
-                                   min(len(data), offset + size - idxoffset)]
-                else:
-                    data.seek(max(0, offset - idxoffset))
-                    result += data.read(size - len(result))
+            result = self._readCached(info, size, offset)
             self._mount_stats['bytesread'] += len(result)
             return result
         with info['lock']:
@@ -434,6 +538,143 @@ class ServerFuse(fuse.Operations):
             self._mount_stats['bytesread'] += size
             return handle.read(size)
 
+    def _chunk(self, info, idx):
+        """
+        Get the diskcache key, offset, and length of a chunk of an open file.
+
+        :param info: the open file information.
+        :param idx: the index of the chunk.
+        :returns: the key, offset, and length of the chunk.
+        """
+        idxoffset = idx * self.diskcache['chunk']
+        idxlen = min(self.diskcache['chunk'], info['size'] - idxoffset)
+        return '%s-%d-%d' % (info['hash'], idxoffset, idxlen), idxoffset, idxlen
+
+    def _cacheGet(self, key):
+        try:
+            return self.diskcache['cache'].get(key, None, read=True)
+        except Exception:
+            logger.exception('diskcache threw an exception in get')
+            return None
+
+    def _cacheSet(self, key, data):
+        try:
+            self.diskcache['cache'][key] = data
+        except Exception:
+            logger.exception('diskcache threw an exception in set')
+
+    def _readCached(self, info, size, offset):
+        """
+        Read a block of bytes from an open file through the diskcache.  Chunks
+        that are not cached are read from Girder, and when the file is being
+        read sequentially, the chunks after the block are fetched into the
+        diskcache in the background.
+
+        :param info: the open file information.
+        :param size: maximum number of bytes to read.
+        :param offset: the offset within the file to read.
+        :returns: a block of up to <size> bytes.
+        """
+        chunk = self.diskcache['chunk']
+        size = max(0, min(size, info['size'] - offset))
+        result = bytearray(size)
+        view = memoryview(result)
+        length = 0
+        lastIdx = (offset + size + chunk - 1) // chunk
+        for idx in range(offset // chunk, lastIdx):
+            key, idxoffset, idxlen = self._chunk(info, idx)
+            data = self._cacheGet(key)
+            if data is not None:
+                self.diskcache['hits'] += 1
+            else:
+                with self._prefetchLock:
+                    future = self._prefetching.get(key)
+                if future is not None:
+                    try:
+                        data = future.result()
+                        self.diskcache['prefetchwaits'] += 1
+                    except Exception:
+                        data = None
+            if idx in info['prefetched'] and data is not None:
+                info['prefetched'].discard(idx)
+                self.diskcache['prefetchhits'] += 1
+            if data is None:
+                with info['lock']:
+                    if 'handle' not in info:
+                        info['handle'] = File().open(info['document'])
+                    handle = info['handle']
+                    handle.seek(idxoffset)
+                    data = handle.read(idxlen)
+                    self.diskcache['miss'] += 1
+                    self.diskcache['bytesread'] += len(data)
+                self._cacheSet(key, data)
+            start = max(0, offset - idxoffset)
+            if isinstance(data, bytes):
+                data = data[start:start + size - length]
+            else:
+                data.seek(start)
+                data = data.read(size - length)
+            view[length:length + len(data)] = data
+            length += len(data)
+        if info.get('nextOffset', 0) == offset:
+            self._prefetch(info, lastIdx)
+        info['nextOffset'] = offset + length
+        return bytes(view[:length])
+
+    def _prefetch(self, info, firstIdx):
+        """
+        Fetch chunks of an open file into the diskcache on a thread pool,
+        unless they are already cached or being fetched.
+
+        :param info: the open file information.
+        :param firstIdx: the index of the first chunk to fetch.
+        """
+        lastIdx = min(firstIdx + self._prefetchChunks,
+                      (info['size'] + self.diskcache['chunk'] - 1) // self.diskcache['chunk'])
+        for idx in range(firstIdx, lastIdx):
+            key, idxoffset, idxlen = self._chunk(info, idx)
+            with self._prefetchLock:
+                if key in self._prefetching:
+                    continue
+            try:
+                if key in self.diskcache['cache']:
+                    continue
+            except Exception:
+                logger.exception('diskcache threw an exception in contains')
+                continue
+            with self._prefetchLock:
+                if key in self._prefetching:
+                    continue
+                if self._prefetchPool is None:
+                    self._prefetchPool = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self._prefetchThreads,
+                        thread_name_prefix='girder-mount-prefetch')
+                self._prefetching[key] = self._prefetchPool.submit(
+                    self._fetchChunk, info['document'], key, idxoffset, idxlen)
+            info['prefetched'].add(idx)
+
+    def _fetchChunk(self, document, key, idxoffset, idxlen):
+        """
+        Read a chunk of a file from Girder into the diskcache.  This runs on
+        the prefetch thread pool, so it uses its own file handle.
+
+        :returns: the chunk data.
+        """
+        try:
+            with File().open(document) as handle:
+                handle.seek(idxoffset)
+                data = handle.read(idxlen)
+            self.diskcache['prefetched'] += 1
+            self.diskcache['bytesread'] += len(data)
+            self._cacheSet(key, data)
+            return data
+        except Exception:
+            logger.exception('Failed to prefetch %s', key)
+            raise
+        finally:
+            with self._prefetchLock:
+                self._prefetching.pop(key, None)
+
     def readdir(self, path, fh):
         """
         Get a list of names within a directory.
@@ -462,7 +703,7 @@ class ServerFuse(fuse.Operations):
                 result.append(self._name(doc, model))
         else:
             resource = self._get_path(path)
-            result.extend(self._list(resource['document'], resource['model']))
+            result.extend(self._listing(resource['document'], resource['model'])['names'])
         return result
 
     @cachetools.cachedmethod(lambda self: self.cache, key=functools.partial(
@@ -506,6 +747,7 @@ class ServerFuse(fuse.Operations):
             'size': resource['document']['size'],
             'allowcache': True,
             'lock': threading.Lock(),
+            'prefetched': set(),
         }
         directpath = self._get_direct_path(path, resource['document'])
         if directpath:
@@ -546,6 +788,12 @@ class ServerFuse(fuse.Operations):
         """
         Setting().unset(SettingKey.GIRDER_MOUNT_INFORMATION)
         events.trigger('server_fuse.destroy')
+        if self._dircache is not None:
+            for model in ('folder', 'item', 'file'):
+                events.unbind('model.%s.save.after' % model, self._eventName)
+                events.unbind('model.%s.remove' % model, self._eventName)
+        if self._prefetchPool is not None:
+            self._prefetchPool.shutdown(wait=False, cancel_futures=True)
         return super().destroy(path)
 
 
@@ -615,7 +863,14 @@ def unmountServer(path, lazy=False, quiet=False):
     'with the "diskcache" prefix removed.  diskcache by itself will enable '
     'the default diskcache.  diskcache_directory and diskcache_size_limit (in '
     'bytes) are the most common.  The directory defaults to '
-    '~/.cache/girder-mount.  stat_cache_ttl specifies how long in seconds '
+    '~/.cache/girder-mount.  With a diskcache, prefetch is the number of '
+    'chunks fetched ahead of sequential readers (default 8, 0 to disable) and '
+    'prefetch_threads is the number of threads that fetch them (default 4).  '
+    'dircache_ttl specifies how long in seconds whole directory listings '
+    'are cached (default 10, 0 to disable) and dircache_size the most entries '
+    'in all cached listings (default 100000).  Changes made by this process '
+    'drop affected listings immediately.  '
+    'stat_cache_ttl specifies how long in seconds '
     'attributes are cached for girder documents.  A longer time reduces '
     'network access but could result in stale permissions or miss updates.')
 @click.option(
@@ -14,6 +14,8 @@ ACCESS_FLAGS = {}
 # Setting this too high causes mongodb to use too many resources for searches
 # that yield lots of results.
 TEXT_SCORE_SORT_MAX = 200
+# Maximum number of documents counted for an estimated Girder-Total-Count header.
+TOTAL_COUNT_ESTIMATE_MAX = 10000
 VERSION = {
     'release': girder.__version__
 }
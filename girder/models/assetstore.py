@@ -200,6 +200,7 @@ class Assetstore(Model):
             'user': user,
             'kwargs': kwargs,
             'pre_event': pre_event,
+            'result': result,
         })
         if post_event.responses:
             return post_event.responses[-1]
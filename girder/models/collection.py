@@ -302,7 +302,8 @@ class Collection(AccessControlledModel):
         return count
 
     def setAccessList(self, doc, access, save=False, recurse=False, user=None,
-                      progress=noProgress, setPublic=None, publicFlags=None, force=False):
+                      progress=noProgress, setPublic=None, publicFlags=None, force=False,
+                      bulk=False):
         """
         Overrides AccessControlledModel.setAccessList to add a recursive
         option. When `recurse=True`, this will set the access list on all
@@ -331,6 +332,9 @@ class Collection(AccessControlledModel):
         :param force: Set this to True to set the flags regardless of the passed in
             user's permissions.
         :type force: bool
+        :param bulk: Whether to update folders in batches when `recurse=True`.
+            See :py:meth:`girder.models.folder.Folder.setAccessList`.
+        :type bulk: bool
         """
         progress.update(increment=1, message='Updating ' + doc['name'])
         if setPublic is not None:
@@ -354,7 +358,8 @@ class Collection(AccessControlledModel):
             for folder in folders:
                 folderModel.setAccessList(
                     folder, access, save=True, recurse=True, user=user,
-                    progress=progress, setPublic=setPublic, publicFlags=publicFlags)
+                    progress=progress, setPublic=setPublic, publicFlags=publicFlags,
+                    bulk=bulk)
 
         return doc
 
@@ -93,6 +93,8 @@ class File(acl_mixin.AccessControlMixin, Model):
         :type contentDisposition: str or None
         :type extraParameters: dict or None
         """
+        from girder.api.rest import afterFileSent
+
         events.trigger('model.file.download.request', info={
             'file': file,
             'startByte': offset,
@@ -117,11 +119,13 @@ class File(acl_mixin.AccessControlMixin, Model):
                 def downloadGenerator():
                     yield from fileDownload()
                     if endByte is None or endByte >= file['size']:
-                        events.trigger('model.file.download.complete', info={
-                            'file': file,
-                            'startByte': offset,
-                            'endByte': endByte,
-                            'redirect': False})
+                        # The server may still be sending the file
+                        afterFileSent(lambda: events.trigger(
+                            'model.file.download.complete', info={
+                                'file': file,
+                                'startByte': offset,
+                                'endByte': endByte,
+                                'redirect': False}))
                 return downloadGenerator
             except cherrypy.HTTPRedirect:
                 events.trigger('model.file.download.complete', info={
@@ -3,10 +3,11 @@ import datetime
 import json
 import os
 
+import pymongo
 from bson.objectid import ObjectId
 
 from girder import events
-from girder.constants import AccessType
+from girder.constants import AccessType, SortDir
 from girder.exceptions import GirderException, ValidationException
 from girder.utility.model_importer import ModelImporter
 from girder.utility.progress import noProgress
@@ -21,12 +22,21 @@ class Folder(AccessControlledModel):
     its own set of access control policies, but by default the access
     control list is inherited from the folder's parent folder, if it has one.
     Top-level folders are ones whose parent is a user or a collection.
+
+    Each folder records the ids of all of its ancestors, from the root user or
+    collection down to its parent, in its ``ancestors`` field, so that subtree
+    operations can be done with a single query.
     """
 
+    _ANCESTOR_BATCH_SIZE = 1000
+    _FILE_LIST_BATCH_SIZE = 1000
+
     def initialize(self):
         self.name = 'folder'
-        self.ensureIndices(('parentId', 'name', 'lowerName',
-                            ([('parentId', 1), ('name', 1)], {})))
+        self.ensureIndices(('parentId', 'name', 'lowerName', 'ancestors',
+                            ([('parentId', 1), ('name', 1)], {}),
+                            ([('parentId', 1), ('lowerName', 1), ('_id', 1)], {}),
+                            ([('parentId', 1), ('_id', 1)], {})))
         self.ensureTextIndex({
             'name': 10,
             'description': 1
@@ -159,6 +169,13 @@ class Folder(AccessControlledModel):
         """
         size = folder['size']
 
+        if 'ancestors' in folder:
+            result = list(self.collection.aggregate([
+                {'$match': {'ancestors': folder['_id']}},
+                {'$group': {'_id': None, 'size': {'$sum': '$size'}}}
+            ]))
+            return size + (result[0]['size'] if result else 0)
+
         q = {
             'parentId': folder['_id'],
             'parentCollection': 'folder'
@@ -241,6 +258,11 @@ class Folder(AccessControlledModel):
         """
         from .item import Item
 
+        if self.findOne({'_id': folderId, 'ancestors': {'$exists': True}}, fields=['_id']):
+            self.update(query={'ancestors': folderId}, update=updateQuery, multi=True)
+            Item().update(query={'ancestors': folderId}, update=updateQuery, multi=True)
+            return
+
         self.update(query={
             'parentId': folderId,
             'parentCollection': 'folder'
@@ -272,6 +294,9 @@ class Folder(AccessControlledModel):
         if descendant['parentCollection'] != 'folder':
             return False
 
+        if 'ancestors' in descendant:
+            return ancestor['_id'] in descendant['ancestors']
+
         descendant = self.load(descendant['parentId'], force=True)
 
         if descendant is None:
@@ -279,6 +304,61 @@ class Folder(AccessControlledModel):
 
         return self._isAncestor(ancestor, descendant)
 
+    def _childAncestors(self, parent, parentType):
+        """
+        Return the ``ancestors`` list for a folder or item created directly
+        underneath the given parent. If the parent predates the ancestors
+        index, its own ancestors are computed by walking up the hierarchy.
+
+        :param parent: The parent document.
+        :type parent: dict
+        :param parentType: The type of the parent ('folder', 'user', or
+            'collection').
+        :type parentType: str
+        :returns: a list of ids ordered from the root of the hierarchy to the
+            parent.
+        """
+        if parentType != 'folder':
+            return [parent['_id']]
+        if 'ancestors' in parent:
+            return parent['ancestors'] + [parent['_id']]
+        doc = self.findOne({'_id': parent['_id']}, fields=[
+            'parentId', 'parentCollection', 'baseParentType', 'ancestors'])
+        if 'ancestors' in doc:
+            ancestors = doc['ancestors']
+        else:
+            ancestors = [entry['object']['_id'] for entry in self.parentsToRoot(doc, force=True)]
+        return ancestors + [parent['_id']]
+
+    def _moveAncestors(self, folder, ancestors):
+        """
+        Set the ancestors list of a folder that is being moved and rewrite the
+        ancestors of every folder and item in its subtree to match.
+
+        :param folder: The folder being moved.
+        :type folder: dict
+        :param ancestors: The new ancestors of the folder.
+        :type ancestors: list
+        """
+        from .item import Item
+
+        if 'ancestors' not in folder:
+            # The subtree predates the index, so it can't be updated in place.
+            folder['ancestors'] = ancestors
+            self.rebuildAncestors(root=folder)
+            return
+
+        oldAncestors = folder['ancestors']
+        folder['ancestors'] = ancestors
+        if oldAncestors == ancestors:
+            return
+        for model in (self, Item()):
+            if oldAncestors:
+                model.update({'ancestors': folder['_id']}, {
+                    '$pull': {'ancestors': {'$in': oldAncestors}}})
+            model.update({'ancestors': folder['_id']}, {
+                '$push': {'ancestors': {'$each': ancestors, '$position': 0}}})
+
     def move(self, folder, parent, parentType):
         """
         Move the given folder from its current parent to another parent object.
@@ -323,6 +403,8 @@ class Folder(AccessControlledModel):
                 }
             })
 
+        self._moveAncestors(folder, self._childAncestors(parent, parentType))
+
         return self.save(folder)
 
     def clean(self, folder, progress=None, **kwargs):
@@ -516,6 +598,7 @@ class Folder(AccessControlledModel):
             'baseParentId': parent['baseParentId'],
             'baseParentType': parent['baseParentType'],
             'parentId': ObjectId(parent['_id']),
+            'ancestors': self._childAncestors(parent, parentType),
             'creatorId': creatorId,
             'created': now,
             'updated': now,
@@ -573,6 +656,11 @@ class Folder(AccessControlledModel):
         :returns: an ordered list of dictionaries from root to the current folder
         """
         curPath = curPath or []
+        if folder.get('ancestors'):
+            path = self._ancestorsToRoot(folder, user=user, force=force, level=level)
+            if path is not None:
+                return path + curPath
+
         curParentId = folder['parentId']
         curParentType = folder['parentCollection']
 
@@ -598,6 +686,144 @@ class Folder(AccessControlledModel):
 
             return self.parentsToRoot(curParentObject, curPath, user=user, force=force)
 
+    def _ancestorsToRoot(self, folder, user=None, force=False, level=AccessType.READ):
+        """
+        Build the result of :py:meth:`parentsToRoot` from the ancestors index
+        of a folder, loading all of the ancestor folders in a single query.
+
+        :param folder: The folder whose root to find.  It must have an
+            ``ancestors`` field.
+        :type folder: dict
+        :returns: an ordered list of dictionaries from root to the current
+            folder, or None if the ancestors index is inconsistent with the
+            database.
+        """
+        ancestors = folder['ancestors']
+        if folder['parentCollection'] != 'folder':
+            rootType = folder['parentCollection']
+        else:
+            rootType = folder.get('baseParentType')
+        if rootType not in ('user', 'collection'):
+            return None
+
+        parents = {doc['_id']: doc for doc in self.find({'_id': {'$in': ancestors[1:]}})}
+        if len(parents) != len(ancestors) - 1:
+            return None
+
+        path = []
+        # Check access from the nearest parent upwards, as the recursive
+        # implementation does.
+        for parentId in reversed(ancestors[1:]):
+            parent = parents[parentId]
+            if not force:
+                self.requireAccess(parent, user, level)
+            path.insert(0, {
+                'type': 'folder',
+                'object': parent if force else self.filter(parent, user)
+            })
+
+        rootModel = ModelImporter.model(rootType)
+        root = rootModel.load(ancestors[0], user=user, level=level, force=force)
+        path.insert(0, {
+            'type': rootType,
+            'object': root if force else rootModel.filter(root, user)
+        })
+        return path
+
+    def rebuildAncestors(self, root=None, progress=noProgress):
+        """
+        Compute and store the ``ancestors`` index of folders and items.  This
+        walks the hierarchy one level at a time, issuing one bulk update per
+        level, and is used to backfill databases that predate the index.
+
+        :param root: If specified, only rebuild the subtree underneath this
+            folder.  The folder itself must already have a correct
+            ``ancestors`` value.  If None, rebuild the entire hierarchy.
+        :type root: dict or None
+        :param progress: Progress context to update.
+        :type progress: :py:class:`girder.utility.progress.ProgressContext`
+        :returns: the number of folders whose ``ancestors`` were rebuilt, not
+            counting ``root``.  Items are updated too but are not counted.
+        """
+        from .item import Item
+
+        itemModel = Item()
+        count = 0
+        if root is not None:
+            level = [(root['_id'], 'folder', root['ancestors'] + [root['_id']])]
+        else:
+            level = [
+                (parentId, parentType, [parentId])
+                for parentType in ('user', 'collection')
+                for parentId in self.collection.distinct(
+                    'parentId', {'parentCollection': parentType})]
+        while level:
+            folderOps = []
+            itemOps = []
+            nextLevel = []
+            for parentId, parentType, ancestors in level:
+                query = {'parentId': parentId, 'parentCollection': parentType}
+                folderOps.append(pymongo.UpdateMany(query, {'$set': {'ancestors': ancestors}}))
+                if parentType == 'folder':
+                    itemOps.append(pymongo.UpdateMany(
+                        {'folderId': parentId}, {'$set': {'ancestors': ancestors}}))
+                for child in self.find(query, fields=['_id']):
+                    nextLevel.append((child['_id'], 'folder', ancestors + [child['_id']]))
+            for model, ops in ((self, folderOps), (itemModel, itemOps)):
+                for idx in range(0, len(ops), self._ANCESTOR_BATCH_SIZE):
+                    model.collection.bulk_write(
+                        ops[idx:idx + self._ANCESTOR_BATCH_SIZE], ordered=False)
+            count += len(nextLevel)
+            progress.update(increment=len(level), message='Indexed %d folders' % count)
+            level = nextLevel
+        return count
+
+    def checkAncestors(self):
+        """
+        Verify the ``ancestors`` index of every folder and item.  A folder's
+        ancestors must be its parent's ancestors followed by its parent, and an
+        item's ancestors must be its folder's ancestors followed by its folder.
+
+        :returns: a generator of dictionaries describing each inconsistent
+            document, with ``model``, ``_id``, ``ancestors`` (the stored value)
+            and ``expected`` keys.  ``expected`` is None if it cannot be
+            determined because the parent folder is missing or is not indexed.
+        """
+        from .item import Item
+
+        for model, parentKey in ((self, 'parentId'), (Item(), 'folderId')):
+            cursor = model.find(fields=[parentKey, 'parentCollection', 'ancestors'])
+            batch = []
+            for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= self._ANCESTOR_BATCH_SIZE:
+                    yield from self._checkAncestorBatch(model, parentKey, batch)
+                    batch = []
+            yield from self._checkAncestorBatch(model, parentKey, batch)
+
+    def _checkAncestorBatch(self, model, parentKey, batch):
+        parentIds = [
+            doc[parentKey] for doc in batch
+            if model is not self or doc.get('parentCollection') == 'folder']
+        parents = {
+            parent['_id']: parent.get('ancestors')
+            for parent in self.find({'_id': {'$in': parentIds}}, fields=['ancestors'])
+        } if parentIds else {}
+        for doc in batch:
+            if model is self and doc.get('parentCollection') != 'folder':
+                expected = [doc['parentId']]
+            elif parents.get(doc[parentKey]) is not None:
+                expected = parents[doc[parentKey]] + [doc[parentKey]]
+            else:
+                expected = None
+            if expected is None or doc.get('ancestors') != expected:
+                yield {
+                    'model': model.name,
+                    '_id': doc['_id'],
+                    'ancestors': doc.get('ancestors'),
+                    'expected': expected
+                }
+
     def countItems(self, folder):
         """
         Returns the number of items within the given folder.
@@ -639,8 +865,25 @@ class Folder(AccessControlledModel):
         :param level: If filtering by permission, the required permission level.
         :type level: AccessLevel
         """
+        from .item import Item
+
         count = 1
 
+        if 'ancestors' in folder:
+            if level is None:
+                count += self.find({'ancestors': folder['_id']}, fields=()).count()
+                if includeItems:
+                    count += Item().find({'ancestors': folder['_id']}, fields=()).count()
+                return count
+            folderIds = self._permittedDescendantIds(folder, user=user, level=level)
+            count += len(folderIds)
+            if includeItems:
+                folderIds.append(folder['_id'])
+                for idx in range(0, len(folderIds), self._ANCESTOR_BATCH_SIZE):
+                    count += Item().find({'folderId': {
+                        '$in': folderIds[idx:idx + self._ANCESTOR_BATCH_SIZE]}}, fields=()).count()
+            return count
+
         if includeItems:
             count += self.countItems(folder)
 
@@ -655,6 +898,30 @@ class Folder(AccessControlledModel):
 
         return count
 
+    def _permittedDescendantIds(self, folder, user=None, level=None):
+        """
+        Return the ids of the descendant folders that a recursive traversal
+        filtered by permission would visit, i.e., those that the user has the
+        given access level on and that are only reached through folders that
+        the user also has that access level on.
+
+        :param folder: The root of the subtree.  It must have an ``ancestors``
+            value.
+        :type folder: dict
+        :param user: The user to filter against.
+        :param level: The required permission level, or None to include all
+            descendants.
+        :type level: AccessLevel
+        :returns: a list of folder ids.
+        """
+        depth = len(folder['ancestors']) + 1
+        candidates = [
+            (doc['_id'], doc['ancestors'][depth:])
+            for doc in self.findWithPermissions(
+                {'ancestors': folder['_id']}, fields=['ancestors'], user=user, level=level)]
+        permitted = {id for id, _ in candidates}
+        return [id for id, path in candidates if all(parentId in permitted for parentId in path)]
+
     def fileList(self, doc, user=None, path='', includeMetadata=False,
                  subpath=True, mimeFilter=None, data=True):
         """
@@ -688,40 +955,63 @@ class Folder(AccessControlledModel):
                   data or file object).
         :rtype: generator(str, func)
         """
+        from .file import File
         from .item import Item
 
         itemModel = Item()
         if subpath:
             path = os.path.join(path, doc['name'])
         metadataFile = 'girder-folder-metadata.json'
-
-        # Eagerly evaluate this list, as the MongoDB cursor can time out on long requests
-        childFolders = list(self.childFolders(
-            parentType='folder', parent=doc, user=user,
-            fields=['name'] + (['meta'] if includeMetadata else [])
-        ))
-        for sub in childFolders:
-            if sub['name'] == metadataFile:
-                metadataFile = None
-            yield from self.fileList(
-                sub, user, path, includeMetadata, subpath=True,
-                mimeFilter=mimeFilter, data=data)
-
-        # Eagerly evaluate this list, as the MongoDB cursor can time out on long requests
-        childItems = list(self.childItems(
-            folder=doc, fields=['name'] + (['meta'] if includeMetadata else [])
-        ))
-        for item in childItems:
-            if item['name'] == metadataFile:
-                metadataFile = None
-            yield from itemModel.fileList(
-                item, user, path, includeMetadata, mimeFilter=mimeFilter, data=data)
+        fields = ['name'] + (['meta'] if includeMetadata else [])
+
+        # Children are fetched in batches rather than through one cursor, as
+        # the MongoDB cursor can time out on long requests
+        for childFolders in self._batchesById(
+                self.childFolders, parentType='folder', parent=doc, user=user, fields=fields):
+            for sub in childFolders:
+                if sub['name'] == metadataFile:
+                    metadataFile = None
+                yield from self.fileList(
+                    sub, user, path, includeMetadata, subpath=True,
+                    mimeFilter=mimeFilter, data=data)
+
+        for childItems in self._batchesById(self.childItems, folder=doc, fields=fields):
+            # Fetch the files of the whole batch of items at once
+            childFiles = {item['_id']: [] for item in childItems}
+            for file in File().find({'itemId': {'$in': list(childFiles)}}):
+                childFiles[file['itemId']].append(file)
+            for item in childItems:
+                if item['name'] == metadataFile:
+                    metadataFile = None
+                yield from itemModel._listFiles(
+                    item, childFiles[item['_id']], path, includeMetadata, True, mimeFilter, data)
 
         if includeMetadata and metadataFile and doc.get('meta', {}):
             def stream():
                 yield json.dumps(doc['meta'], default=str)
             yield (os.path.join(path, metadataFile), stream)
 
+    def _batchesById(self, find, **kwargs):
+        """
+        Generate lists of the children returned by childFolders or childItems
+        in order of their ids.  Each list is fetched with its own query
+        starting after the last id of the previous one, so that no cursor is
+        kept open between batches.
+
+        :param find: childFolders or childItems.
+        :param kwargs: Additional arguments for the find function.
+        """
+        lastId = None
+        while True:
+            batch = list(find(
+                filters={'_id': {'$gt': lastId}} if lastId is not None else None,
+                sort=[('_id', SortDir.ASCENDING)], limit=self._FILE_LIST_BATCH_SIZE, **kwargs))
+            if batch:
+                yield batch
+            if len(batch) < self._FILE_LIST_BATCH_SIZE:
+                return
+            lastId = batch[-1]['_id']
+
     def copyFolder(self, srcFolder, parent=None, name=None, description=None,
                    parentType=None, public=None, creator=None, progress=None,
                    firstFolder=None):
@@ -829,7 +1119,8 @@ class Folder(AccessControlledModel):
         return self.load(newFolder['_id'], force=True)
 
     def setAccessList(self, doc, access, save=False, recurse=False, user=None,
-                      progress=noProgress, setPublic=None, publicFlags=None, force=False):
+                      progress=noProgress, setPublic=None, publicFlags=None, force=False,
+                      bulk=False):
         """
         Overrides AccessControlledModel.setAccessList to add a recursive
         option. When `recurse=True`, this will set the access list on all
@@ -837,6 +1128,10 @@ class Folder(AccessControlledModel):
         subfolders that the given user does not have ADMIN access on will be
         skipped.
 
+        In bulk mode, the subfolders to update are determined with a single
+        query and updated in batches, without validating each subfolder or
+        triggering its save events.
+
         :param doc: The folder to set access settings on.
         :type doc: girder.models.folder
         :param access: The access control list.
@@ -858,6 +1153,8 @@ class Folder(AccessControlledModel):
         :param force: Set this to True to set the flags regardless of the passed in
             user's permissions.
         :type force: bool
+        :param bulk: Whether to update subfolders in batches when `recurse=True`.
+        :type bulk: bool
         """
         progress.update(increment=1, message='Updating ' + doc['name'])
         if setPublic is not None:
@@ -869,7 +1166,11 @@ class Folder(AccessControlledModel):
         doc = AccessControlledModel.setAccessList(
             self, doc, access, user=user, save=save, force=force)
 
-        if recurse:
+        if recurse and bulk and 'ancestors' in doc:
+            self._setAccessListBulk(
+                doc, access, user=user, progress=progress, setPublic=setPublic,
+                publicFlags=publicFlags, force=force)
+        elif recurse:
             subfolders = self.findWithPermissions({
                 'parentId': doc['_id'],
                 'parentCollection': 'folder'
@@ -882,6 +1183,38 @@ class Folder(AccessControlledModel):
 
         return doc
 
+    def _setAccessListBulk(self, doc, access, user=None, progress=noProgress, setPublic=None,
+                           publicFlags=None, force=False):
+        """
+        Propagate an access list to the subfolders of a folder in batches.  See
+        :py:meth:`setAccessList` for the parameters.
+        """
+        folderIds = self._permittedDescendantIds(doc, user=user, level=AccessType.ADMIN)
+        fields = ['access', 'public', 'publicFlags']
+        for idx in range(0, len(folderIds), self._ANCESTOR_BATCH_SIZE):
+            batch = folderIds[idx:idx + self._ANCESTOR_BATCH_SIZE]
+            # The resulting access list usually only differs between folders
+            # in which admin-only flags were already enabled, so group folders
+            # with identical updates into a single operation.
+            updates = {}
+            for folder in self.find({'_id': {'$in': batch}}, fields=fields):
+                if setPublic is not None:
+                    self.setPublic(folder, setPublic, save=False)
+                if publicFlags is not None:
+                    folder = self.setPublicFlags(
+                        folder, publicFlags, user=user, save=False, force=force)
+                folder = AccessControlledModel.setAccessList(
+                    self, folder, access, user=user, save=False, force=force)
+                update = {key: folder[key] for key in fields if key in folder}
+                key = json.dumps(update, sort_keys=True, default=str)
+                updates.setdefault(key, (update, []))[1].append(folder['_id'])
+            if updates:
+                self.collection.bulk_write([
+                    pymongo.UpdateMany({'_id': {'$in': ids}}, {'$set': update})
+                    for update, ids in updates.values()], ordered=False)
+            progress.update(increment=len(batch), message='Updated %d of %d subfolders' % (
+                idx + len(batch), len(folderIds)))
+
     def isOrphan(self, folder):
         """
         Returns True if this folder is orphaned (its parent is missing).
@@ -897,6 +1230,31 @@ class Folder(AccessControlledModel):
         Recursively recomputes the size of this folder and its underlying
         folders and fixes the sizes as needed.
 
+        :param doc: The folder.
+        :type doc: dict
+        """
+        fixes = 0
+        # fix child folders but don't include their size
+        if 'ancestors' in doc:
+            for child in self.find({'ancestors': doc['_id']}):
+                _, f = self._updateOwnSize(child)
+                fixes += f
+        else:
+            children = self.find({
+                'parentId': doc['_id'],
+                'parentCollection': 'folder'
+            })
+            for child in children:
+                _, f = self.updateSize(child)
+                fixes += f
+        size, f = self._updateOwnSize(doc)
+        return size, fixes + f
+
+    def _updateOwnSize(self, doc):
+        """
+        Recompute the size of a folder from its child items, without
+        descending into its subfolders.
+
         :param doc: The folder.
         :type doc: dict
         """
@@ -904,14 +1262,6 @@ class Folder(AccessControlledModel):
 
         size = 0
         fixes = 0
-        # recursively fix child folders but don't include their size
-        children = self.find({
-            'parentId': doc['_id'],
-            'parentCollection': 'folder'
-        })
-        for child in children:
-            _, f = self.updateSize(child)
-            fixes += f
         # get correct size from child items
         itemModel = Item()
         for item in self.childItems(doc):
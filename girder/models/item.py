@@ -25,8 +25,10 @@ class Item(acl_mixin.AccessControlMixin, Model):
 
     def initialize(self):
         self.name = 'item'
-        self.ensureIndices(('folderId', 'name', 'lowerName',
-                            ([('folderId', 1), ('name', 1)], {})))
+        self.ensureIndices(('folderId', 'name', 'lowerName', 'ancestors',
+                            ([('folderId', 1), ('name', 1)], {}),
+                            ([('folderId', 1), ('lowerName', 1), ('_id', 1)], {}),
+                            ([('folderId', 1), ('_id', 1)], {})))
         self.ensureTextIndex({
             'name': 10,
             'description': 1
@@ -150,11 +152,14 @@ class Item(acl_mixin.AccessControlMixin, Model):
         :param folder: The folder to move the item into.
         :type folder: dict.
         """
+        from .folder import Folder
+
         self.propagateSizeChange(item, -item['size'])
 
         item['folderId'] = folder['_id']
         item['baseParentType'] = folder['baseParentType']
         item['baseParentId'] = folder['baseParentId']
+        item['ancestors'] = Folder()._childAncestors(folder, 'folder')
 
         self.propagateSizeChange(item, item['size'])
 
@@ -270,6 +275,8 @@ class Item(acl_mixin.AccessControlMixin, Model):
             if existing:
                 return existing
 
+        from .folder import Folder
+
         now = datetime.datetime.now(datetime.timezone.utc)
 
         if not isinstance(creator, dict) or '_id' not in creator:
@@ -290,6 +297,7 @@ class Item(acl_mixin.AccessControlMixin, Model):
             'creatorId': creator['_id'],
             'baseParentType': folder['baseParentType'],
             'baseParentId': folder['baseParentId'],
+            'ancestors': Folder()._childAncestors(folder, 'folder'),
             'created': now,
             'updated': now,
             'size': 0,
@@ -496,20 +504,30 @@ class Item(acl_mixin.AccessControlMixin, Model):
                   data or file object).
         :rtype: generator(str, func)
         """
+        # Eagerly evaluate this list, as the MongoDB cursor can time out on long requests
+        # Don't use a "filter" projection here, since returning the full file document is promised
+        # by this function, and file objects tend to not have large fields present
+        childFiles = list(self.childFiles(item=doc))
+        yield from self._listFiles(
+            doc, childFiles, path, includeMetadata, subpath, mimeFilter, data)
+
+    def _listFiles(self, doc, childFiles, path, includeMetadata, subpath, mimeFilter, data):
+        """
+        Generate the results of fileList for an item whose files have already
+        been fetched.  See fileList for the parameters.
+
+        :param childFiles: All of the files of the item.
+        :type childFiles: list
+        """
         from .file import File
 
         if subpath:
-            files = list(self.childFiles(item=doc, limit=2))
-            if (len(files) != 1 or files[0]['name'] != doc['name']
+            if (len(childFiles) != 1 or childFiles[0]['name'] != doc['name']
                     or (includeMetadata and doc.get('meta', {}))):
                 path = os.path.join(path, doc['name'])
         metadataFile = 'girder-item-metadata.json'
 
         fileModel = File()
-        # Eagerly evaluate this list, as the MongoDB cursor can time out on long requests
-        # Don't use a "filter" projection here, since returning the full file document is promised
-        # by this function, and file objects tend to not have large fields present
-        childFiles = list(self.childFiles(item=doc))
         for file in childFiles:
             if not self._mimeFilter(file, mimeFilter):
                 continue
@@ -32,6 +32,33 @@ else:
     _MAX_CURSOR_TIMEOUT_MS = None
 
 
+def countResults(results, limit=None, estimate=False):
+    """
+    Count the documents matched by the results of a find or findWithPermissions
+    call, regardless of their offset and limit.
+
+    :param results: A cursor or other iterable returned by find or
+        findWithPermissions.
+    :param limit: If set, stop counting at this many documents, which is much
+        faster than an exact count of a large result set.
+    :type limit: int or None
+    :param estimate: If True and the results are from a query without any
+        filter, use the estimated document count of the collection, which is
+        read from its metadata.
+    :type estimate: bool
+    :returns: The count, or None if the results can't be counted.
+    """
+    spec = getattr(results, '_spec', getattr(results, '_Cursor__spec', None))
+    collection = getattr(results, 'collection', None)
+    if spec is not None and collection is not None:
+        if estimate and not spec:
+            return collection.estimated_document_count()
+        return collection.count_documents(spec, **({'limit': limit} if limit else {}))
+    if callable(getattr(results, 'count', None)):
+        return results.count(limit=limit) if limit else results.count()
+    return None
+
+
 def _permissionClauses(user=None, level=None, prefix=''):
     """
     Given a user and access level, return a list of clauses that can be used as
@@ -422,7 +449,7 @@ class Model(metaclass=_ModelSingleton):
         # Sort by meta text score, but only if result count is below a certain
         # threshold. The text score is not a real index, so we cannot always
         # sort by it if there is a high number of matching documents.
-        if sort is None and cursor.count() < TEXT_SCORE_SORT_MAX:
+        if sort is None and countResults(cursor, TEXT_SCORE_SORT_MAX) < TEXT_SCORE_SORT_MAX:
             cursor.sort([('_textScore', {'$meta': 'textScore'})])
 
         return cursor
@@ -1469,7 +1496,7 @@ class AccessControlledModel(Model):
 
         return doc
 
-    def list(self, user=None, limit=0, offset=0, sort=None):
+    def list(self, user=None, limit=0, offset=0, sort=None, filters=None):
         """
         Return a list of documents that are visible to a user.
 
@@ -1481,9 +1508,11 @@ class AccessControlledModel(Model):
         :type offset: int
         :param sort: The sort order
         :type sort: List of (key, order) tuples
+        :param filters: Any additional query operators to apply.
+        :type filters: dict
         """
         return self.findWithPermissions(
-            {}, sort=sort, user=user, level=AccessType.READ, limit=limit,
+            filters or {}, sort=sort, user=user, level=AccessType.READ, limit=limit,
             offset=offset)
 
     def copyAccessPolicies(self, src, dest, save=False):
@@ -1579,7 +1608,7 @@ class AccessControlledModel(Model):
         # Sort by meta text score, but only if result count is below a certain
         # threshold. The text score is not a real index, so we cannot always
         # sort by it if there is a high number of matching documents.
-        if sort is None and cursor.count() < TEXT_SCORE_SORT_MAX:
+        if sort is None and countResults(cursor, TEXT_SCORE_SORT_MAX) < TEXT_SCORE_SORT_MAX:
             cursor.sort([('_textScore', {'$meta': 'textScore'})])
 
         return cursor
@@ -4,6 +4,7 @@ from girder.constants import AccessType, TokenScope
 from girder.exceptions import AccessException
 from girder.settings import SettingKey
 from girder.utility import genToken
+from girder.utility._cache import authCache
 
 from .model_base import AccessControlledModel
 
@@ -23,6 +24,35 @@ class Token(AccessControlledModel):
         doc['scope'] = list(set(doc['scope']))
         return doc
 
+    def save(self, document, *args, **kwargs):
+        document = super().save(document, *args, **kwargs)
+        self.loadCached.invalidate(self, document['_id'])
+        return document
+
+    def remove(self, document, **kwargs):
+        result = super().remove(document, **kwargs)
+        self.loadCached.invalidate(self, document['_id'])
+        return result
+
+    def removeWithQuery(self, query):
+        ids = [token['_id'] for token in self.find(query, fields=['_id'])]
+        result = super().removeWithQuery(query)
+        for id in ids:
+            self.loadCached.invalidate(self, id)
+        return result
+
+    @authCache.cache_on_arguments(should_cache_fn=lambda token: token is not None)
+    def loadCached(self, id):
+        """
+        Load a token by its value, without access checks, using the
+        authentication cache.  Tokens that do not exist are not cached.
+
+        :param id: The token value.
+        :type id: str
+        :returns: The token document, or None.
+        """
+        return self.load(id, force=True, objectId=False)
+
     def createToken(self, user=None, days=None, scope=None, apiKey=None):
         """
         Creates a new token. You can create an anonymous token
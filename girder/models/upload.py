@@ -21,7 +21,8 @@ class Upload(Model):
     """
     This model stores temporary records for uploads that have been approved
     but are not yet complete, so that they can be uploaded in chunks of
-    arbitrary size. The chunks must be uploaded in order.
+    arbitrary size. The chunks must be uploaded in order, unless the
+    assetstore supports otherwise.
     """
 
     def initialize(self):
@@ -111,7 +112,8 @@ class Upload(Model):
 
         return doc
 
-    def handleChunk(self, upload, chunk, filter=False, user=None, uploadExtraParameters=None):
+    def handleChunk(self, upload, chunk, filter=False, user=None, uploadExtraParameters=None,
+                    offset=None):
         """
         When a chunk is uploaded, this should be called to process the chunk.
         If this is the final chunk of the upload, this method will finalize
@@ -134,6 +136,10 @@ class Upload(Model):
         :param uploadExtraParameters: A dict of parameters that will be given to the assetstore
             adapter for customization of the upload request.
         :type uploadExtraParameters: Optional[dict]
+        :param offset: The offset of the chunk within the file, as sent by the
+            client.  If this is set, the assetstore may accept chunks out of
+            order; otherwise the chunk is appended to the received data.
+        :type offset: int or None
         """
         from girder.utility import assetstore_utilities
 
@@ -143,13 +149,28 @@ class Upload(Model):
         assetstore = Assetstore().load(upload['assetstoreId'])
         adapter = assetstore_utilities.getAssetstoreAdapter(assetstore)
 
-        upload = adapter.uploadChunk(upload, chunk, uploadExtraParameters)
-        if '_id' in upload or upload['received'] != upload['size']:
+        if offset is None:
+            upload = adapter.uploadChunk(upload, chunk, uploadExtraParameters)
+        else:
+            upload = adapter.uploadChunkAt(upload, chunk, offset, uploadExtraParameters)
+        if upload.get('concurrentChunks'):
+            # The adapter has recorded the chunk; saving the whole document
+            # could undo changes made by concurrent chunks.
+            if upload['received'] == upload['size'] and not self._claimFinalization(upload):
+                return upload
+        elif '_id' in upload or upload['received'] != upload['size']:
             upload = self.save(upload)
 
         # If upload is finished, we finalize it
         if upload['received'] == upload['size']:
-            file = self.finalizeUpload(upload, assetstore)
+            try:
+                file = self.finalizeUpload(upload, assetstore)
+            except Exception:
+                if upload.get('concurrentChunks'):
+                    # Let a resent chunk finalize the upload again
+                    self.collection.update_one(
+                        {'_id': upload['_id']}, {'$unset': {'finalizing': True}})
+                raise
             if filter:
                 return File().filter(file, user=user)
             else:
@@ -157,6 +178,17 @@ class Upload(Model):
         else:
             return upload
 
+    def _claimFinalization(self, upload):
+        """
+        Make sure that only one of the requests that see an upload with
+        concurrent chunks as complete finalizes it.
+
+        :returns: True if the caller should finalize the upload.
+        """
+        return self.collection.update_one(
+            {'_id': upload['_id'], 'finalizing': {'$exists': False}},
+            {'$set': {'finalizing': True}}).modified_count == 1
+
     def requestOffset(self, upload):
         """
         Requests the offset that should be used to resume uploading. This
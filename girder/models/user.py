@@ -11,7 +11,7 @@ from girder.constants import AccessType, CoreEventHandler, TokenScope
 from girder.exceptions import AccessException, ValidationException
 from girder.settings import SettingKey
 from girder.utility import mail_utils
-from girder.utility._cache import rateLimitBuffer
+from girder.utility._cache import authCache, rateLimitBuffer
 
 from .model_base import AccessControlledModel
 from .setting import Setting
@@ -133,6 +133,33 @@ class User(AccessControlledModel):
 
         return doc
 
+    def save(self, document, *args, **kwargs):
+        document = super().save(document, *args, **kwargs)
+        self.loadCached.invalidate(self, document['_id'])
+        return document
+
+    def update(self, query, update, multi=True):
+        if set(query) == {'_id'} and not isinstance(query['_id'], dict):
+            ids = [query['_id']]
+        else:
+            ids = [user['_id'] for user in self.find(query, fields=['_id'])]
+        result = super().update(query, update, multi=multi)
+        for id in ids:
+            self.loadCached.invalidate(self, id)
+        return result
+
+    @authCache.cache_on_arguments(should_cache_fn=lambda user: user is not None)
+    def loadCached(self, id):
+        """
+        Load a user by id, without access checks, using the authentication
+        cache.  Users that do not exist are not cached.
+
+        :param id: The user id.
+        :type id: str or ObjectId
+        :returns: The user document, or None.
+        """
+        return self.load(id, force=True)
+
     def _validateLogin(self, login):
         if '@' in login:
             # Hard-code this constraint so we can always easily distinguish
@@ -257,6 +284,7 @@ class User(AccessControlledModel):
 
         # Finally, delete the user document itself
         super().remove(user)
+        self.loadCached.invalidate(self, user['_id'])
         if progress:
             progress.update(increment=1, message='Deleted user ' + user['login'])
 
@@ -268,7 +296,7 @@ class User(AccessControlledModel):
         """
         return self.find({'admin': True})
 
-    def search(self, text=None, user=None, limit=0, offset=0, sort=None):
+    def search(self, text=None, user=None, limit=0, offset=0, sort=None, filters=None):
         """
         List all users. Since users are access-controlled, this will filter
         them by access policy.
@@ -279,14 +307,15 @@ class User(AccessControlledModel):
         :param limit: Result limit.
         :param offset: Result offset.
         :param sort: The sort structure to pass to pymongo.
+        :param filters: Additional query operators.
         :returns: Iterable of users.
         """
         # Perform the find; we'll do access-based filtering of the result set
         # afterward.
         if text is not None:
-            cursor = self.textSearch(text, sort=sort)
+            cursor = self.textSearch(text, sort=sort, filters=filters)
         else:
-            cursor = self.find({}, sort=sort)
+            cursor = self.find(filters or {}, sort=sort)
 
         return self.filterResultsByPermission(
             cursor=cursor, user=user, level=AccessType.READ, limit=limit,
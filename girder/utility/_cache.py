@@ -1,6 +1,15 @@
+import collections
+import threading
+
 import cherrypy
 from dogpile.cache import make_region, register_backend
-from dogpile.cache.backends.memory import MemoryBackend
+from dogpile.cache.api import NO_VALUE
+from dogpile.cache.backends.memory import MemoryBackend, MemoryPickleBackend
+from dogpile.cache.backends.redis import RedisBackend as _DogpileRedisBackend
+from dogpile.cache.proxy import ProxyBackend
+
+_cacheStats = collections.defaultdict(lambda: {'hits': 0, 'misses': 0})
+_cacheStatsLock = threading.Lock()
 
 
 def _setupCache(curConfig: dict):
@@ -13,29 +22,87 @@ def _setupCache(curConfig: dict):
     from girder.models.setting import Setting
     from girder.settings import SettingKey
 
+    # The values here can be overridden by the CACHE_CONFIG setting object.
+    cacheConfig = {
+        'cache.global.replace_existing_backend': True,
+        'cache.request.replace_existing_backend': True,
+        'cache.rate_limit.replace_existing_backend': True,
+        'cache.auth.replace_existing_backend': True,
+        'cache.global.backend': 'dogpile.cache.memory',
+        'cache.request.backend': 'cherrypy_request',
+        'cache.rate_limit.backend': 'dogpile.cache.memory',
+        'cache.auth.expiration_time': 10,
+    }
+    userConfig = Setting().get(SettingKey.CACHE_CONFIG)
+    if userConfig.get('cache.auth.backend') == 'girder.memory_bounded':
+        cacheConfig['cache.auth.arguments.max_size'] = 10000
+    cacheConfig.update(userConfig)
+
     if Setting().get(SettingKey.CACHE_ENABLED):
         # Replace existing backend. This is necessary
         # because they're initially configured with the null backend.
-        # The other values here can be overridden by the CACHE_CONFIG setting object.
-        cacheConfig = {
-            'cache.global.replace_existing_backend': True,
-            'cache.request.replace_existing_backend': True,
-            'cache.global.backend': 'dogpile.cache.memory',
-            'cache.request.backend': 'cherrypy_request',
-        }
-
-        cacheConfig.update(Setting().get(SettingKey.CACHE_CONFIG))
-
         cache.configure_from_config(cacheConfig, 'cache.global.')
         requestCache.configure_from_config(cacheConfig, 'cache.request.')
+        if 'cache.auth.backend' in cacheConfig:
+            authCache.configure_from_config(cacheConfig, 'cache.auth.')
+        else:
+            # Entries are only invalidated in the process that changes a token or user, so the
+            # authentication cache is only used with a backend that is chosen explicitly.
+            authCache.configure(backend='dogpile.cache.null', replace_existing_backend=True)
     else:
         # Reset caches back to null cache (in the case of server teardown)
         cache.configure(backend='dogpile.cache.null', replace_existing_backend=True)
         requestCache.configure(backend='dogpile.cache.null', replace_existing_backend=True)
+        authCache.configure(backend='dogpile.cache.null', replace_existing_backend=True)
 
     # Although the rateLimitBuffer has no pre-existing backend, this method may be called multiple
     # times in testing (where caches were already configured)
-    rateLimitBuffer.configure(backend='dogpile.cache.memory', replace_existing_backend=True)
+    rateLimitBuffer.configure_from_config(cacheConfig, 'cache.rate_limit.')
+
+    for region in (cache, requestCache, authCache, rateLimitBuffer):
+        region.wrap(_StatsProxy(region.name))
+
+
+def getCacheStats():
+    """
+    Get the number of cache hits and misses of each cache region in this
+    process since it started.
+
+    :returns: a dictionary keyed by region name whose values are dictionaries
+        with ``hits`` and ``misses`` counts.
+    """
+    with _cacheStatsLock:
+        return {name: dict(stats) for name, stats in _cacheStats.items()}
+
+
+class _StatsProxy(ProxyBackend):
+    """
+    A proxy backend that counts the hits and misses of a cache region.
+    """
+
+    def __init__(self, regionName):
+        super().__init__()
+        self._regionName = regionName
+
+    def _record(self, values):
+        misses = sum(1 for value in values if value is NO_VALUE)
+        with _cacheStatsLock:
+            stats = _cacheStats[self._regionName]
+            stats['hits'] += len(values) - misses
+            stats['misses'] += misses
+        return values
+
+    def get(self, key):
+        return self._record([self.proxied.get(key)])[0]
+
+    def get_serialized(self, key):
+        return self._record([self.proxied.get_serialized(key)])[0]
+
+    def get_multi(self, keys):
+        return self._record(self.proxied.get_multi(keys))
+
+    def get_serialized_multi(self, keys):
+        return self._record(self.proxied.get_serialized_multi(keys))
 
 
 class CherrypyRequestBackend(MemoryBackend):
@@ -58,20 +125,108 @@ class CherrypyRequestBackend(MemoryBackend):
         return cherrypy.request._girderCache
 
 
+class BoundedMemoryBackend(MemoryPickleBackend):
+    """
+    A pickling memory backend which holds at most ``max_size`` values.
+
+    When full, the least recently used values are discarded first.  Since values
+    are pickled, callers may modify the documents they get from it.
+    """
+
+    def __init__(self, arguments):
+        self._maxSize = int(arguments.get('max_size', 10000))
+        self._lock = threading.Lock()
+        super().__init__({'cache_dict': collections.OrderedDict()})
+
+    def get(self, key):
+        with self._lock:
+            value = self._cache.get(key, NO_VALUE)
+            if value is not NO_VALUE:
+                self._cache.move_to_end(key)
+        return value
+
+    def get_multi(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._maxSize:
+                self._cache.popitem(last=False)
+
+    def set_multi(self, mapping):
+        for key, value in mapping.items():
+            self.set(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def delete_multi(self, keys):
+        for key in keys:
+            self.delete(key)
+
+
+class RedisBackend(_DogpileRedisBackend):
+    """
+    A Redis cache backend shared by all Girder processes.
+
+    This accepts the same arguments as ``dogpile.cache.redis``.  If no
+    connection arguments are given, it reuses the Redis connection of
+    :py:mod:`girder.notification`, which is configured with the
+    ``GIRDER_NOTIFICATION_REDIS_URL`` environment variable.  Keys are prefixed
+    with the ``key_prefix`` argument, which defaults to ``girder.cache:``.
+    """
+
+    _connectionArguments = ('url', 'host', 'port', 'db', 'connection_pool')
+
+    def __init__(self, arguments):
+        arguments = dict(arguments)
+        keyPrefix = arguments.pop('key_prefix', 'girder.cache:')
+        self._sharedConnection = not any(key in arguments for key in self._connectionArguments)
+        super().__init__(arguments)
+        self.key_mangler = lambda key: keyPrefix + key
+
+    def _create_client(self):
+        if not self._sharedConnection:
+            return super()._create_client()
+
+        from girder.notification import _redis_client_sync
+
+        self.writer_client = _redis_client_sync()
+        self.reader_client = self.writer_client
+
+
 register_backend('cherrypy_request', 'girder.utility._cache', 'CherrypyRequestBackend')
+register_backend('girder.memory_bounded', 'girder.utility._cache', 'BoundedMemoryBackend')
+register_backend('girder.redis', 'girder.utility._cache', 'RedisBackend')
 
 # These caches must be configured with the null backend upon creation due to the fact
 # that user-based configuration of the regions doesn't happen until server start, which
 # doesn't occur when using Girder as a library.
-cache = make_region(name='girder.cache').configure(backend='dogpile.cache.null')
-requestCache = make_region(name='girder.request').configure(backend='dogpile.cache.null')
+cache = make_region(name='girder.cache').configure(
+    backend='dogpile.cache.null', wrap=[_StatsProxy('girder.cache')])
+requestCache = make_region(name='girder.request').configure(
+    backend='dogpile.cache.null', wrap=[_StatsProxy('girder.request')])
+
+# This caches the tokens and users used to authenticate requests across requests. Its entries are
+# deleted when those documents are changed through their models; with a per-process backend, other
+# server processes may use a stale entry until it expires.  It is only enabled when a backend is
+# configured with the "cache.auth.backend" key, which should be a shared backend such as
+# girder.redis when running multiple server processes.  Writes that bypass the models are only
+# seen once entries expire, so the default expiration is short.
+authCache = make_region(name='girder.auth').configure(
+    backend='dogpile.cache.null', wrap=[_StatsProxy('girder.auth')])
 
 # This is a one hour TTL cache; it is not set to be reconfigured
 hourCache = make_region(name='girder.hour_cache').configure(
-    backend='dogpile.cache.memory', expiration_time=3600)
-
-# This cache is not configurable by the user, and will always be configured when the server is.
-# It holds data for rate limiting, which is ephemeral, but must be persisted (i.e. it's not optional
-# or best-effort).
-# TODO we need to make this configurable to be share-nothing in a multi-process environment
-rateLimitBuffer = make_region(name='girder.rate_limit').configure(backend='dogpile.cache.memory')
+    backend='dogpile.cache.memory', expiration_time=3600,
+    wrap=[_StatsProxy('girder.hour_cache')])
+
+# This cache is always configured when the server is, and is not disabled along with the other
+# caches. It holds data for rate limiting, which is ephemeral, but must be persisted (i.e. it's not
+# optional or best-effort). When running multiple server processes, it should be configured with a
+# shared backend such as girder.redis via the "cache.rate_limit." keys of the cache config setting.
+rateLimitBuffer = make_region(name='girder.rate_limit').configure(
+    backend='dogpile.cache.memory', wrap=[_StatsProxy('girder.rate_limit')])
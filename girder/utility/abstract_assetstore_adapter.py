@@ -1,18 +1,96 @@
+import collections
 import io
 import itertools
 import os
 import re
+import threading
 
 import cherrypy
 from cherrypy._cpreqbody import Part
 
 from girder.api.rest import setContentDisposition, setResponseHeader
-from girder.exceptions import FilePathException, GirderException, ValidationException
+from girder.exceptions import (
+    FilePathException, GirderException, RestException, ValidationException)
 from girder.models.setting import Setting
 from girder.settings import SettingKey
 from girder.utility import RequestBodyStream, progress
 
 
+# File handles read files in blocks of this many bytes and keep recently read
+# blocks in a cache shared by every handle in the process, so that seeking
+# back to data that was already read does not download it again.
+FILEHANDLE_BLOCK_SIZE = int(os.environ.get('GIRDER_FILEHANDLE_BLOCK_SIZE', 256 * 1024))
+# The most memory, in bytes, that cached blocks may use.  If this is 0, file
+# handles stream each read from the assetstore without caching.
+FILEHANDLE_CACHE_SIZE = int(os.environ.get('GIRDER_FILEHANDLE_CACHE_SIZE', 256 * 1024 * 1024))
+# The most blocks read ahead of a handle that is reading sequentially
+_MAX_READAHEAD_BLOCKS = 32
+
+
+class _BlockCache:
+    """
+    A least-recently-used cache of blocks of file data, bounded by the total
+    size of the blocks.
+
+    :param maxSize: The most bytes to keep.
+    :type maxSize: int
+    """
+
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self._blocks = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._blocks.get(key)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._blocks.move_to_end(key)
+            return data
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._blocks
+
+    def put(self, key, data):
+        if len(data) > self.maxSize:
+            return
+        with self._lock:
+            old = self._blocks.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._blocks[key] = data
+            self._size += len(data)
+            while self._size > self.maxSize:
+                self._size -= len(self._blocks.popitem(last=False)[1])
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self._size = 0
+
+    def stats(self):
+        """
+        Report how the cache is being used.
+
+        :returns: A dict of the ``hits`` and ``misses`` of block lookups and
+            the number of ``blocks`` and ``bytes`` cached.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits, 'misses': self.misses,
+                'blocks': len(self._blocks), 'bytes': self._size}
+
+
+_blockCache = _BlockCache(FILEHANDLE_CACHE_SIZE)
+
+
 class FileHandle:
     """
     This is the base class that is returned for the file-like API into
@@ -25,6 +103,13 @@ class FileHandle:
     These file handles are stateful, and therefore not safe for concurrent
     access. If used by multiple threads, mutexes should be used.
 
+    Reads are made in blocks of :data:`FILEHANDLE_BLOCK_SIZE` bytes that are
+    cached for all handles of the same file.  A handle that reads
+    sequentially downloads an increasing number of blocks ahead of its
+    position with each request, so that random access such as reading tiles
+    of an image does not download the file again on every seek, while
+    streaming a whole file still takes few requests.
+
     :param file: The file object to which this file-like object corresponds.
     :type file: dict
     :param adapter: The assetstore adapter corresponding to this file.
@@ -38,6 +123,12 @@ class FileHandle:
         # If a read is requested that is longer than the specified size, raise
         # an exception.  This prevents unbounded memory use.
         self._maximumReadSize = Setting().get(SettingKey.FILEHANDLE_MAX_SIZE)
+        self._readahead = 0
+        self._lastReadEnd = None
+        self._cacheKey = (
+            (str(file['_id']), str(file.get('assetstoreId')), file.get('size'),
+             file.get('created'), file.get('updated'))
+            if '_id' in file else ('handle', id(self)))
 
         self.seek(0)
 
@@ -67,6 +158,8 @@ class FileHandle:
             size = self._file['size'] - self._pos
         if size > self._maximumReadSize:
             raise GirderException('Read exceeds maximum allowed size.')
+        if _blockCache.maxSize >= FILEHANDLE_BLOCK_SIZE > 0:
+            return self._readBlocks(size)
         data = io.BytesIO()
         length = 0
         if self._stream is None:
@@ -94,6 +187,94 @@ class FileHandle:
         self._pos += length
         return data.getvalue()
 
+    def _readBlocks(self, size):
+        """
+        Read *size* bytes from the current position through the block cache.
+        """
+        blockSize = FILEHANDLE_BLOCK_SIZE
+        end = min(self._pos + size, self._file['size'])
+        if self._pos >= end:
+            return b''
+        first, last = self._pos // blockSize, (end - 1) // blockSize
+
+        # Read further ahead the longer the handle keeps reading sequentially
+        if self._pos == self._lastReadEnd:
+            self._readahead = min(max(self._readahead * 2, 1), _MAX_READAHEAD_BLOCKS)
+        else:
+            self._readahead = 0
+        self._lastReadEnd = end
+
+        blocks = {}
+        missing = []
+        for index in range(first, last + 1):
+            blocks[index] = _blockCache.get((self._cacheKey, index))
+            if blocks[index] is None:
+                missing.append(index)
+        if missing:
+            lastBlock = (self._file['size'] - 1) // blockSize
+            ahead = range(last + 1, min(last + self._readahead, lastBlock) + 1)
+            # Blocks from the first missing one through the read-ahead are
+            # fetched in one request, stopping at a cached read-ahead block
+            fetchEnd = last
+            for index in ahead:
+                if (self._cacheKey, index) in _blockCache:
+                    break
+                fetchEnd = index
+            blocks.update(self._fetchBlocks(missing[0], fetchEnd))
+
+        data = bytearray(end - self._pos)
+        view = memoryview(data)
+        length = 0
+        for index in range(first, last + 1):
+            block = blocks.get(index)
+            if not block:
+                break
+            start = self._pos + length - index * blockSize
+            chunk = block[start:start + len(data) - length]
+            view[length:length + len(chunk)] = chunk
+            length += len(chunk)
+            if start + len(chunk) < len(block) or len(block) < blockSize:
+                break
+        self._pos += length
+        return bytes(view[:length])
+
+    def _fetchBlocks(self, first, last):
+        """
+        Download a range of blocks and add them to the cache.
+
+        :param first: The index of the first block to download.
+        :type first: int
+        :param last: The index of the last block to download.
+        :type last: int
+        :returns: A dict of the downloaded blocks by index.
+        """
+        blockSize = FILEHANDLE_BLOCK_SIZE
+        offset = first * blockSize
+        endByte = min((last + 1) * blockSize, self._file['size'])
+        stream = self._adapter.downloadFile(
+            self._file, offset=offset, endByte=endByte, headers=False)()
+        data = bytearray()
+        try:
+            for chunk in stream:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf8')
+                data += chunk
+                if len(data) >= endByte - offset:
+                    break
+        finally:
+            if hasattr(stream, 'close'):
+                stream.close()
+        data = bytes(data[:endByte - offset])
+        blocks = {}
+        for index in range(first, last + 1):
+            start = (index - first) * blockSize
+            block = data[start:start + blockSize]
+            if not block:
+                break
+            blocks[index] = block
+            _blockCache.put((self._cacheKey, index), block)
+        return blocks
+
     def tell(self):
         return self._pos
 
@@ -186,6 +367,33 @@ class AbstractAssetstoreAdapter:
         raise NotImplementedError('Must override processChunk in %s.' %
                                   self.__class__.__name__)
 
+    def uploadChunkAt(self, upload, chunk, offset, uploadExtraParameters):
+        """
+        Process a chunk that the client sent for a given offset of the upload.
+        By default, chunks must be sent in order, so the offset must be the
+        number of bytes received so far.  Adapters that can store chunks out of
+        order, and concurrently, may override this.  Such adapters must record
+        each chunk in the database themselves, and set ``concurrentChunks`` in
+        the upload document they return, so that it is not saved over the
+        changes made by other chunks.
+
+        :param upload: The upload document to update.
+        :type upload: dict
+        :param chunk: The file object representing the chunk that was uploaded.
+        :type chunk: file
+        :param offset: The offset of the chunk within the file.
+        :type offset: int
+        :param uploadExtraParameters: A dict of parameters that will be given to the assetstore
+            adapter for customization of the upload request.
+        :type uploadExtraParameters: Optional[dict]
+        :returns: Must return the upload document with any optional changes.
+        """
+        if upload['received'] != offset:
+            raise RestException(
+                'Server has received %s bytes, but client sent offset %s.' % (
+                    upload['received'], offset))
+        return self.uploadChunk(upload, chunk, uploadExtraParameters)
+
     def finalizeUpload(self, upload, file):
         """
         Call this once the last chunk has been processed. This method does not
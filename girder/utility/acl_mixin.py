@@ -4,7 +4,7 @@ from collections import abc
 
 from ..constants import TEXT_SCORE_SORT_MAX, AccessType
 from ..exceptions import AccessException
-from ..models.model_base import AccessControlledModel, Model, _permissionClauses
+from ..models.model_base import AccessControlledModel, Model, _permissionClauses, countResults
 from ..utility.model_importer import ModelImporter
 
 
@@ -175,9 +175,11 @@ class AccessControlMixin:
         cursor = self.findWithPermissions(
             filters, offset=offset, limit=limit, sort=sort, fields=fields,
             user=user, level=level, aggregateSort=defaultSort)
-        if (sort is None and not getattr(cursor, 'fromAggregate', False)
-                and callable(getattr(cursor, 'count', None))
-                and cursor.count() < TEXT_SCORE_SORT_MAX):
+        if sort is None and not getattr(cursor, 'fromAggregate', False):
+            count = countResults(cursor, TEXT_SCORE_SORT_MAX)
+        else:
+            count = None
+        if count is not None and count < TEXT_SCORE_SORT_MAX:
             cursor = self.findWithPermissions(
                 filters, offset=offset, limit=limit, sort=defaultSort, fields=fields,
                 user=user, level=level)
@@ -228,13 +230,13 @@ class AccessControlMixin:
             origResult, origSelf = result, self
 
             class ResultWithCount:
-                def count(self):
+                def count(self, limit=None):
                     cursor = origSelf.find(
                         query, timeout=timeout, fields=fields, sort=sort, **kwargs)
                     result = origSelf.filterResultsByPermission(
-                        cursor=cursor, user=user, level=level, limit=limit, offset=offset,
+                        cursor=cursor, user=user, level=level, limit=limit or 0,
                         removeKeys=removeKeys)
-                    return len(list(result))
+                    return sum(1 for _ in result)
 
                 def __iter__(self):
                     return self
@@ -307,9 +309,6 @@ class AccessControlMixin:
                 }},
                 {'$match': self.permissionClauses(user, level, '__parent.')},
             ]
-            countPipeline = initialPipeline + [
-                {'$count': 'count'},
-            ]
             fullPipeline = initialPipeline + [
                 {'$project': {'__parent': False}},
             ]
@@ -352,9 +351,11 @@ class AccessControlMixin:
                 options['maxTimeMS'] = timeout
             result = self.collection.aggregate(fullPipeline, **options)
 
-            def count():
+            def count(limit=None):
+                pipeline = initialPipeline + ([{'$limit': limit}] if limit else []) + [
+                    {'$count': 'count'}]
                 try:
-                    return next(iter(self.collection.aggregate(countPipeline, **options)))['count']
+                    return next(iter(self.collection.aggregate(pipeline, **options)))['count']
                 except StopIteration:
                     # If there are no values, this won't return the count, in
                     # which case it is zero.
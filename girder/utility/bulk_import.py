@@ -0,0 +1,488 @@
+"""
+Batched creation of the folders, items and files found when importing data
+from an assetstore.
+
+Creating each document through the models costs a lookup, a validation that
+queries for name collisions, an insert and a size propagation per document.
+:py:class:`BulkImporter` instead resolves existing documents with one query
+per batch, inserts the new ones with ``insert_many``, and propagates sizes
+once per item, folder and root.  Documents are inserted directly, so only the
+``model.<name>.validate`` events are triggered for them; the save events are
+not.  Names that collide with a sibling of the other type are handed to the
+models, which rename or reject them as usual.
+
+Imported files record a fingerprint of the data they refer to, such as its
+size and modification time.  An incremental import compares fingerprints to
+skip the files that have not changed, and can mark the files that were not
+seen at all as vanished.  ``model.file.import.changed`` is triggered with each
+file that an incremental import found to have changed, so that what was
+derived from its old data, such as checksums, can be discarded.
+"""
+import collections
+import datetime
+import logging
+
+import pymongo
+
+from girder import auditLogger, events
+from girder.constants import AccessType
+from girder.models.file import File
+from girder.models.folder import Folder
+from girder.models.item import Item
+from girder.utility.model_importer import ModelImporter
+
+BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class BulkImporter:
+    """
+    Accumulate the items and files of an import and create them in batches.
+    This is a context manager; anything pending is written when it exits
+    without an error.
+
+    :param assetstore: The assetstore the files are imported into.
+    :type assetstore: dict
+    :param user: The user listed as the creator of the documents.
+    :type user: dict
+    :param eventName: The event triggered for every imported folder and item,
+        e.g. ``'filesystem_assetstore_imported'``.
+    :type eventName: str
+    :param batchEvents: If True, ``eventName + '.batch'`` is triggered once per
+        batch with the list of event infos rather than ``eventName`` once per
+        document.
+    :type batchEvents: bool
+    :param batchSize: The number of files to accumulate before writing them.
+    :type batchSize: int
+    :param incremental: If True, files whose fingerprint has not changed are
+        left alone, files whose fingerprint has changed are updated, and the
+        imported events are only triggered for new or changed folders and
+        items.
+    :type incremental: bool
+    :param markVanished: If True, every file that is seen is stamped with the
+        start time of the import, so that :py:meth:`markVanished` can find the
+        ones that were not.
+    :type markVanished: bool
+    """
+
+    def __init__(self, assetstore, user, eventName, batchEvents=False, batchSize=BATCH_SIZE,
+                 incremental=False, markVanished=False):
+        self.assetstore = assetstore
+        self.user = user
+        self.eventName = eventName
+        self.batchEvents = batchEvents
+        self.batchSize = batchSize
+        self.incremental = incremental
+        self.trackSeen = markVanished
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self.stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'vanished': 0}
+        self._items = {}
+        self._fileCount = 0
+        self._events = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.flush()
+
+    def folders(self, parent, parentType, entries):
+        """
+        Load or create folders underneath a parent.  Unlike items and files,
+        folders are written right away, since their contents need their ids.
+
+        :param parent: The parent folder, user or collection.
+        :type parent: dict
+        :param parentType: The type of the parent.
+        :type parentType: str
+        :param entries: The name and import path of each folder.
+        :type entries: list of (str, str) tuples
+        :returns: The folder documents, in the same order as ``entries``.
+        """
+        folders = []
+        for start in range(0, len(entries), self.batchSize):
+            folders.extend(self._folders(
+                parent, parentType, entries[start:start + self.batchSize]))
+        self._triggerEvents()
+        return folders
+
+    def _folders(self, parent, parentType, entries):
+        names = list({name.strip() for name, _ in entries})
+        existing = {}
+        for folder in Folder().find({
+            'parentId': parent['_id'],
+            'parentCollection': parentType,
+            'name': {'$in': names}
+        }):
+            existing.setdefault(folder['name'], folder)
+        conflicts = set()
+        if parentType == 'folder':
+            conflicts = {item['name'] for item in Item().find({
+                'folderId': parent['_id'],
+                'name': {'$in': [name for name in names if name not in existing]}
+            }, fields=['name'])}
+
+        created = {}
+        results = []
+        for name, importPath in entries:
+            name = name.strip()
+            folder = existing.get(name) or created.get(name)
+            if folder is None:
+                if name in conflicts or not name:
+                    folder = Folder().createFolder(
+                        parent=parent, name=name, parentType=parentType, creator=self.user,
+                        reuseExisting=True)
+                else:
+                    folder = created[name] = self._newFolder(parent, parentType, name)
+            elif self.incremental:
+                results.append(folder)
+                continue
+            results.append(folder)
+            self._events.append({'id': folder, 'type': 'folder', 'importPath': importPath})
+        self._insert(Folder(), list(created.values()))
+        return results
+
+    def _newFolder(self, parent, parentType, name):
+        if parentType == 'folder':
+            if 'baseParentId' not in parent:
+                pathFromRoot = Folder().parentsToRoot(parent, user=self.user, force=True)
+                parent['baseParentId'] = pathFromRoot[0]['object']['_id']
+                parent['baseParentType'] = pathFromRoot[0]['type']
+        else:
+            parent['baseParentId'] = parent['_id']
+            parent['baseParentType'] = parentType
+        now = datetime.datetime.now(datetime.timezone.utc)
+        folder = {
+            'name': name,
+            'lowerName': name.lower(),
+            'description': '',
+            'parentCollection': parentType,
+            'baseParentId': parent['baseParentId'],
+            'baseParentType': parent['baseParentType'],
+            'parentId': parent['_id'],
+            'ancestors': Folder()._childAncestors(parent, parentType),
+            'creatorId': self.user['_id'],
+            'created': now,
+            'updated': now,
+            'size': 0,
+            'meta': {}
+        }
+        if parentType in ('folder', 'collection'):
+            Folder().copyAccessPolicies(src=parent, dest=folder, save=False)
+        Folder().setUserAccess(folder, user=self.user, level=AccessType.ADMIN, save=False)
+        events.trigger('model.folder.validate', folder)
+        return folder
+
+    def addItem(self, folder, name, importPath):
+        """
+        Queue an item to be loaded or created in a folder.
+
+        :param folder: The parent folder.
+        :type folder: dict
+        :param name: The name of the item.
+        :type name: str
+        :param importPath: The import path reported in the imported event.
+        :type importPath: str
+        :returns: An opaque handle to pass to :py:meth:`addFile`.
+        """
+        key = (folder['_id'], name)
+        if key not in self._items:
+            self._items[key] = {
+                'folder': folder, 'name': name, 'importPath': importPath, 'files': {}}
+        return self._items[key]
+
+    def addFile(self, item, name, size, mimeType=None, fingerprint=None, **fields):
+        """
+        Queue a file to be loaded or created in a queued item.  If the item
+        already has a file of that name, the extra fields are set on it.  In an
+        incremental import, this only happens if its fingerprint has changed,
+        in which case its size is updated as well.
+
+        :param item: The handle returned by :py:meth:`addItem`.
+        :param name: The name of the file.
+        :type name: str
+        :param size: The size of the file in bytes.
+        :type size: int
+        :param mimeType: The MIME type of the file.
+        :type mimeType: str or None
+        :param fingerprint: Values that change whenever the underlying data
+            does, stored as the file's ``importFingerprint``.
+        :type fingerprint: dict or None
+        :param fields: Additional fields to set on the file document, such as
+            its path in the assetstore.
+        """
+        key = (item['folder']['_id'], item['name'])
+        if self._items.get(key) is not item:
+            # The item was written by an earlier batch
+            item['files'] = {}
+            self._items[key] = item
+        if name in item['files']:
+            item['files'][name]['fields'].update(fields)
+        else:
+            if fingerprint is not None:
+                fields['importFingerprint'] = fingerprint
+            item['files'][name] = {
+                'name': name, 'size': size, 'mimeType': mimeType, 'fields': fields}
+            self._fileCount += 1
+        if self._fileCount >= self.batchSize:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the queued items and files.
+        """
+        entries = list(self._items.values())
+        self._items = {}
+        self._fileCount = 0
+        if not entries:
+            return
+        self._resolveItems(entries)
+        self._importFiles(entries)
+        self._triggerEvents()
+        logger.debug('Imported %d items to assetstore %s', len(entries), self.assetstore['_id'])
+
+    def _resolveItems(self, entries):
+        pending = [entry for entry in entries if 'doc' not in entry]
+        for entry in entries:
+            if 'doc' in entry:
+                entry['new'] = False
+        if not pending:
+            return
+        folderIds = list({entry['folder']['_id'] for entry in pending})
+        names = list({entry['name'] for entry in pending})
+        existing = {}
+        for item in Item().find({'folderId': {'$in': folderIds}, 'name': {'$in': names}}):
+            existing.setdefault((item['folderId'], item['name']), item)
+        conflicts = {(folder['parentId'], folder['name']) for folder in Folder().find({
+            'parentId': {'$in': folderIds},
+            'parentCollection': 'folder',
+            'name': {'$in': names}
+        }, fields=['parentId', 'name'])}
+
+        created = []
+        for entry in pending:
+            key = (entry['folder']['_id'], entry['name'])
+            entry['new'] = False
+            if key in existing:
+                entry['doc'] = existing[key]
+            elif key in conflicts or not entry['name'].strip():
+                entry['doc'] = Item().createItem(
+                    name=entry['name'], creator=self.user, folder=entry['folder'],
+                    reuseExisting=True)
+            else:
+                entry['doc'] = self._newItem(entry)
+                entry['new'] = True
+                created.append(entry['doc'])
+        self._insert(Item(), created)
+
+    def _newItem(self, entry):
+        folder = entry['folder']
+        if 'baseParentType' not in folder:
+            pathFromRoot = Item().parentsToRoot(
+                {'folderId': folder['_id']}, self.user, force=True)
+            folder['baseParentType'] = pathFromRoot[0]['type']
+            folder['baseParentId'] = pathFromRoot[0]['object']['_id']
+        now = datetime.datetime.now(datetime.timezone.utc)
+        name = entry['name'].strip()
+        item = {
+            'name': name,
+            'lowerName': name.lower(),
+            'description': '',
+            'folderId': folder['_id'],
+            'creatorId': self.user['_id'],
+            'baseParentType': folder['baseParentType'],
+            'baseParentId': folder['baseParentId'],
+            'ancestors': Folder()._childAncestors(folder, 'folder'),
+            'created': now,
+            'updated': now,
+            # New items only get new files
+            'size': sum(file['size'] for file in entry['files'].values()),
+            'meta': {}
+        }
+        events.trigger('model.item.validate', item)
+        return item
+
+    def _importFiles(self, entries):
+        reused = [entry for entry in entries if not entry['new'] and entry['files']]
+        existing = {}
+        if reused:
+            for file in File().find({
+                'itemId': {'$in': [entry['doc']['_id'] for entry in reused]},
+                'name': {'$in': list({name for entry in reused for name in entry['files']})}
+            }):
+                existing.setdefault((file['itemId'], file['name']), file)
+
+        writes = {'created': [], 'updates': [], 'seen': []}
+        sizes = collections.defaultdict(collections.Counter)
+        for entry in entries:
+            item = entry['doc']
+            changed = entry['new']
+            for info in entry['files'].values():
+                delta = self._importFile(
+                    existing.get((item['_id'], info['name'])), item, info, writes)
+                if delta is None:
+                    continue
+                changed = True
+                if not entry['new']:
+                    sizes['item'][item['_id']] += delta
+                sizes['folder'][item['folderId']] += delta
+                sizes[item['baseParentType']][item['baseParentId']] += delta
+            if changed or not self.incremental:
+                self._events.append({'id': item, 'type': 'item',
+                                     'importPath': entry['importPath']})
+        self._insert(File(), writes['created'])
+        if writes['updates']:
+            File().collection.bulk_write(writes['updates'], ordered=False)
+        if writes['seen']:
+            File().update({'_id': {'$in': writes['seen']}}, {
+                '$set': {'importSeen': self.started}, '$unset': {'vanished': True}})
+
+        for modelType, counts in sizes.items():
+            self._increment(ModelImporter.model(modelType).collection, counts)
+
+    def _importFile(self, file, item, info, writes):
+        """
+        Decide what to do with a queued file.
+
+        :param file: The existing file of the same name in the item, if any.
+        :param item: The item document.
+        :param info: The queued file.
+        :param writes: Lists of the pending writes, which this adds to.
+        :returns: the change in size of the item if the file was created or
+            changed, otherwise None.
+        """
+        if self.trackSeen:
+            info['fields']['importSeen'] = self.started
+        if file is None:
+            writes['created'].append(self._newFile(item, info))
+            self.stats['created'] += 1
+            return info['size']
+        if not self.incremental:
+            fields = info['fields']
+            if file.get('size') != info['size']:
+                # Leave the file marked as changed for incremental imports
+                fields = {k: v for k, v in fields.items() if k != 'importFingerprint'}
+            if fields:
+                writes['updates'].append(pymongo.UpdateMany(
+                    {'_id': file['_id']}, {'$set': fields}))
+            return None
+        if file.get('importFingerprint') == info['fields'].get('importFingerprint'):
+            self.stats['unchanged'] += 1
+            if self.trackSeen:
+                writes['seen'].append(file['_id'])
+            return None
+        return self._updateFile(file, info)
+
+    def _newFile(self, item, info):
+        file = {
+            'created': datetime.datetime.now(datetime.timezone.utc),
+            'creatorId': self.user['_id'],
+            'assetstoreId': self.assetstore['_id'],
+            'name': info['name'],
+            'mimeType': info['mimeType'],
+            'size': info['size'],
+            'itemId': item['_id'],
+            'exts': [ext.lower() for ext in info['name'].split('.')[1:]],
+        }
+        file.update(info['fields'])
+        events.trigger('model.file.validate', file)
+        return file
+
+    def _updateFile(self, file, info):
+        """
+        Update a file whose data has changed since it was imported.
+
+        :returns: the change in size of the file.
+        """
+        delta = info['size'] - file.get('size', 0)
+        file.update(info['fields'])
+        file['size'] = info['size']
+        file.pop('vanished', None)
+        file = File().updateFile(file)
+        events.trigger('model.file.import.changed', file)
+        self.stats['updated'] += 1
+        return delta
+
+    def markVanished(self, parent, parentType, query):
+        """
+        Mark the imported files underneath a parent that were not seen by this
+        import with ``vanished: True``.  The importer must have been created
+        with ``markVanished=True``.
+
+        :param parent: The folder, user or collection that was imported into.
+        :type parent: dict
+        :param parentType: The type of the parent.
+        :type parentType: str
+        :param query: A query matching the files imported from the same place
+            as this import, e.g. by path prefix.
+        :type query: dict
+        :returns: the number of files that were marked.
+        """
+        self.flush()
+        candidates = File().find(dict(query, **{
+            'assetstoreId': self.assetstore['_id'],
+            'imported': True,
+            'importSeen': {'$ne': self.started},
+            'vanished': {'$ne': True},
+        }), fields=['itemId'])
+        count = 0
+        for batch in self._batches(candidates):
+            itemIds = list({file['itemId'] for file in batch})
+            inside = {item['_id'] for item in Item().find({
+                '_id': {'$in': itemIds},
+                '$or': [{'folderId': parent['_id']}, {'ancestors': parent['_id']}]
+                if parentType == 'folder' else [{'baseParentId': parent['_id']}]
+            }, fields=['_id'])}
+            ids = [file['_id'] for file in batch if file['itemId'] in inside]
+            if ids:
+                File().update({'_id': {'$in': ids}}, {'$set': {'vanished': True}})
+                count += len(ids)
+        self.stats['vanished'] += count
+        return count
+
+    def _batches(self, cursor):
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.batchSize:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def _increment(collection, sizes):
+        # Documents that grow by the same amount share an update
+        byAmount = collections.defaultdict(list)
+        for docId, size in sizes.items():
+            if size:
+                byAmount[size].append(docId)
+        if byAmount:
+            collection.bulk_write([
+                pymongo.UpdateMany({'_id': {'$in': ids}}, {'$inc': {'size': size}})
+                for size, ids in byAmount.items()], ordered=False)
+
+    @staticmethod
+    def _insert(model, docs):
+        if not docs:
+            return
+        model.collection.insert_many(docs)
+        for doc in docs:
+            auditLogger.info('document.create', extra={
+                'details': {
+                    'collection': model.name,
+                    'id': doc['_id']
+                }
+            })
+
+    def _triggerEvents(self):
+        infos = [dict(info, id=info['id']['_id']) for info in self._events]
+        self._events = []
+        if self.batchEvents:
+            if infos:
+                events.trigger(self.eventName + '.batch', infos)
+            return
+        for info in infos:
+            events.trigger(self.eventName, info)
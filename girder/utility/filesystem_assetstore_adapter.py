@@ -1,23 +1,24 @@
+import concurrent.futures
 import io
 import logging
 import mimetypes
 import os
+import re
 import shutil
 import stat
 import tempfile
+import time
 from hashlib import sha512
 
 import filelock
 import psutil
 
-from girder import events
-from girder.api.rest import setResponseHeader
+from girder.api.rest import sendFile, setResponseHeader
 from girder.exceptions import GirderException, ValidationException
 from girder.models.file import File
-from girder.models.folder import Folder
-from girder.models.item import Item
 from girder.models.upload import Upload
 from girder.utility import mkdir, progress
+from girder.utility.bulk_import import BulkImporter
 
 from . import _hash_state
 from .abstract_assetstore_adapter import AbstractAssetstoreAdapter
@@ -30,6 +31,90 @@ DEFAULT_PERMS = stat.S_IRUSR | stat.S_IWUSR
 logger = logging.getLogger(__name__)
 
 
+# The number of threads that list directories during an import
+IMPORT_WALK_THREADS = int(os.environ.get('GIRDER_IMPORT_WALK_THREADS', 8))
+# How many directories each thread may list ahead of the import
+_IMPORT_PREFETCH_PER_THREAD = 16
+
+
+class _ScanEntry:
+    """
+    A directory entry along with the information about it that the import
+    needs, so that it can be gathered on another thread.
+    """
+
+    __slots__ = ('name', 'path', 'isDir', 'isFile', 'stat')
+
+    def __init__(self, entry):
+        self.name = entry.name
+        self.path = entry.path
+        self.stat = None
+        try:
+            self.isDir = entry.is_dir()
+            if not self.isDir:
+                # Like os.stat, this follows symlinks, but for regular files
+                # scandir may already know the type.
+                self.stat = entry.stat()
+        except OSError:
+            self.isDir = False
+        self.isFile = self.stat is not None and stat.S_ISREG(self.stat.st_mode)
+
+
+def _scanDirectory(path):
+    with os.scandir(path) as it:
+        return [_ScanEntry(entry) for entry in it]
+
+
+class _DirectoryScanner:
+    """
+    Lists directories with :py:func:`os.scandir`, optionally ahead of when
+    they are needed on a pool of threads, and keeps count of the entries
+    listed.
+
+    :param threads: The number of threads to list directories on.  If this
+        is 1 or less, directories are listed when they are needed.
+    :type threads: int
+    """
+
+    def __init__(self, threads):
+        self._pool = concurrent.futures.ThreadPoolExecutor(threads) if threads > 1 else None
+        self._limit = threads * _IMPORT_PREFETCH_PER_THREAD
+        self._pending = {}
+        self.entries = 0
+        self.started = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    def prefetch(self, path):
+        """
+        Start listing a directory in the background, unless too many are
+        already waiting to be used.
+        """
+        if self._pool is not None and path not in self._pending and (
+                len(self._pending) < self._limit):
+            self._pending[path] = self._pool.submit(_scanDirectory, path)
+
+    def scan(self, path):
+        """
+        List a directory.
+
+        :returns: a list of :py:class:`_ScanEntry`.
+        """
+        future = self._pending.pop(path, None)
+        entries = future.result() if future is not None else _scanDirectory(path)
+        self.entries += len(entries)
+        return entries
+
+    def status(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return '%d entries, %d/s' % (self.entries, self.entries / elapsed)
+
+
 class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
     """
     This assetstore type stores files on the filesystem underneath a root
@@ -291,11 +376,16 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
                 'girder.utility.filesystem_assetstore_adapter.'
                 'file-does-not-exist')
 
+        useSendFile = False
         if headers:
             setResponseHeader('Accept-Ranges', 'bytes')
             self.setContentHeaders(file, offset, endByte, contentDisposition)
+            # Unreadable files are streamed so that the error is reported
+            useSendFile = os.access(path, os.R_OK) and sendFile(path)
 
         def stream():
+            if useSendFile:
+                return
             bytesRead = offset
             with open(path, 'rb') as f:
                 if offset > 0:
@@ -380,84 +470,120 @@ class FilesystemAssetstoreAdapter(AbstractAssetstoreAdapter):
                      path, item['_id'], self.assetstore['_id'])
         return file
 
-    def _importDataAsItem(self, name, user, folder, path, files, reuseExisting=True, params=None):
+    def _importDataAsItem(self, name, user, folder, path, entries, params=None, batch=None):
         params = params or {}
-        item = Item().createItem(
-            name=self.safeName(name), creator=user, folder=folder, reuseExisting=reuseExisting)
-        events.trigger('filesystem_assetstore_imported',
-                       {'id': item['_id'], 'type': 'item',
-                        'importPath': path})
-        for fname in files:
-            fpath = os.path.join(path, fname)
-            if self.shouldImportFile(fpath, params):
-                self.importFile(item, fpath, user, name=fname)
-
-    def _hasOnlyFiles(self, path, files):
-        return all(os.path.isfile(os.path.join(path, name)) for name in files)
-
-    def _importFileToFolder(self, name, user, parent, parentType, path):
+        item = batch.addItem(folder, self.safeName(name), path)
+        for entry in entries:
+            if self.shouldImportFile(entry.path, params):
+                self._queueFile(batch, item, entry.path, entry.name, entry.stat)
+
+    def _queueFile(self, batch, item, path, name, stat=None):
+        stat = stat or os.stat(path)
+        batch.addFile(
+            item, name, stat.st_size, mimetypes.guess_type(name)[0],
+            fingerprint={'size': stat.st_size, 'mtime': stat.st_mtime, 'inode': stat.st_ino},
+            path=os.path.abspath(os.path.expanduser(path)), mtime=stat.st_mtime, imported=True)
+
+    def _importFileToFolder(self, name, user, parent, parentType, path, batch, stat=None):
         if parentType != 'folder':
             raise ValidationException(
                 'Files cannot be imported directly underneath a %s.' % parentType)
 
-        item = Item().createItem(name=self.safeName(name), creator=user,
-                                 folder=parent, reuseExisting=True)
-        events.trigger('filesystem_assetstore_imported', {
-            'id': item['_id'],
-            'type': 'item',
-            'importPath': path
-        })
-        self.importFile(item, path, user, name=name)
+        item = batch.addItem(parent, self.safeName(name), path)
+        self._queueFile(batch, item, path, name, stat)
 
     def importData(self, parent, parentType, params, progress, user, leafFoldersAsItems):
+        """
+        Import a file or directory tree.  Directories are listed ahead of the
+        import by as many threads as the ``concurrency`` param, or
+        ``GIRDER_IMPORT_WALK_THREADS`` if it is not set, while the documents
+        are written in order from the calling thread.
+
+        If the ``incremental`` param is set, files whose size, modification
+        time and inode have not changed since they were last imported are
+        skipped.  If ``markVanished`` is set, files previously imported from
+        underneath the import path that no longer exist are marked
+        ``vanished``.
+
+        :returns: the number of files that were created, updated, unchanged
+            and marked vanished.
+        """
         importPath = params['importPath']
 
         if not os.path.exists(importPath):
             raise ValidationException('Not found: %s.' % importPath)
-        if not os.path.isdir(importPath):
-            name = os.path.basename(importPath)
-            progress.update(message=name)
-            self._importFileToFolder(name, user, parent, parentType, importPath)
-            return
-
-        listDir = os.listdir(importPath)
+        with BulkImporter(self.assetstore, user, 'filesystem_assetstore_imported',
+                          batchEvents=params.get('batchEvents'),
+                          incremental=params.get('incremental'),
+                          markVanished=params.get('markVanished')) as batch:
+            absPath = os.path.abspath(os.path.expanduser(importPath))
+            if not os.path.isdir(importPath):
+                name = os.path.basename(importPath)
+                progress.update(message=name)
+                self._importFileToFolder(name, user, parent, parentType, importPath, batch)
+                pathQuery = absPath
+            else:
+                threads = params.get('concurrency') or IMPORT_WALK_THREADS
+                with _DirectoryScanner(threads) as scanner:
+                    self._importDirectory(
+                        parent, parentType, params, progress, user, leafFoldersAsItems, batch,
+                        scanner, scanner.scan(importPath))
+                pathQuery = {'$regex': '^' + re.escape(os.path.join(absPath, ''))}
+            if params.get('markVanished'):
+                batch.markVanished(parent, parentType, {'path': pathQuery})
+        return batch.stats
+
+    def _importDirectory(self, parent, parentType, params, progress, user, leafFoldersAsItems,
+                         batch, scanner, entries):
+        importPath = params['importPath']
 
-        if parentType != 'folder' and any(
-                os.path.isfile(os.path.join(importPath, val)) for val in listDir):
+        if parentType != 'folder' and any(entry.isFile for entry in entries):
             raise ValidationException(
                 'Files cannot be imported directly underneath a %s.' % parentType)
 
-        if leafFoldersAsItems and self._hasOnlyFiles(importPath, listDir):
+        if leafFoldersAsItems and all(entry.isFile for entry in entries):
             self._importDataAsItem(
                 os.path.basename(importPath.rstrip(os.sep)), user, parent, importPath,
-                listDir, params=params)
+                entries, params=params, batch=batch)
             return
 
-        for name in listDir:
-            progress.update(message=name)
-            path = os.path.join(importPath, name)
-
-            if os.path.isdir(path):
-                localListDir = os.listdir(path)
-                if leafFoldersAsItems and self._hasOnlyFiles(path, localListDir):
-                    self._importDataAsItem(name, user, parent, path, localListDir, params=params)
-                else:
-                    folder = Folder().createFolder(
-                        parent=parent, name=self.safeName(name),
-                        parentType=parentType, creator=user, reuseExisting=True)
-                    events.trigger(
-                        'filesystem_assetstore_imported', {
-                            'id': folder['_id'],
-                            'type': 'folder',
-                            'importPath': path
-                        })
-                    nextPath = os.path.join(importPath, name)
-                    self.importData(
-                        folder, 'folder', params=dict(params, importPath=nextPath),
-                        progress=progress, user=user, leafFoldersAsItems=leafFoldersAsItems)
-            else:
-                if self.shouldImportFile(path, params):
-                    self._importFileToFolder(name, user, parent, parentType, path)
+        for entry in entries:
+            if entry.isDir:
+                scanner.prefetch(entry.path)
+
+        folders = []
+        for entry in entries:
+            progress.update(message='%s (%s)' % (entry.name, scanner.status()))
+
+            if entry.isDir:
+                if not leafFoldersAsItems or not self._importLeafDirectory(
+                        entry, user, parent, params, batch, scanner):
+                    folders.append((self.safeName(entry.name), entry.path))
+            elif self.shouldImportFile(entry.path, params):
+                self._importFileToFolder(
+                    entry.name, user, parent, parentType, entry.path, batch, entry.stat)
+
+        folderDocs = batch.folders(parent, parentType, folders)
+        for folder, (_, path) in zip(folderDocs, folders):
+            self._importDirectory(
+                folder, 'folder', dict(params, importPath=path), progress, user,
+                leafFoldersAsItems, batch, scanner, scanner.scan(path))
+
+    def _importLeafDirectory(self, entry, user, parent, params, batch, scanner):
+        """
+        Import a directory as an item if it only contains files.  Otherwise,
+        its listing is dropped and it is listed again when it is imported as
+        a folder, so that the listings of a whole subtree are not held at once.
+
+        :returns: whether the directory was imported as an item.
+        """
+        subEntries = scanner.scan(entry.path)
+        if not all(sub.isFile for sub in subEntries):
+            scanner.prefetch(entry.path)
+            return False
+        self._importDataAsItem(
+            entry.name, user, parent, entry.path, subEntries, params=params, batch=batch)
+        return True
 
     def findInvalidFiles(self, progress=progress.noProgress, filters=None,
                          checkSize=True, **kwargs):
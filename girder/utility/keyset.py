@@ -0,0 +1,123 @@
+"""
+Helpers for keyset (cursor) pagination.
+
+Rather than skipping ``offset`` documents, a keyset page is requested with a
+query that only matches documents that sort after the last document of the
+previous page.  The sort keys of that document are passed between pages as an
+opaque cursor string.  Since the sort must be total for this to work, ``_id``
+is always used as the final sort key.
+"""
+import base64
+
+from bson import json_util
+
+from girder.constants import SortDir
+from girder.exceptions import ValidationException
+
+
+def normalizeSort(sort):
+    """
+    Make a sort order total by appending ``_id`` to it if it is not already
+    present.
+
+    :param sort: The sort order.
+    :type sort: List of (key, order) tuples, or None.
+    :returns: The total sort order as a list of (key, order) tuples.
+    """
+    sort = [(key, direction) for key, direction in (sort or [])]
+    if '_id' not in (key for key, _ in sort):
+        sort.append(('_id', sort[-1][1] if sort else SortDir.ASCENDING))
+    return sort
+
+
+def _getValue(doc, key):
+    for part in key.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def encodeCursor(doc, sort):
+    """
+    Encode the cursor that continues a listing after a document.
+
+    :param doc: The last document of a page.
+    :type doc: dict
+    :param sort: The total sort order of the listing, see :py:func:`normalizeSort`.
+    :type sort: List of (key, order) tuples.
+    :returns: An opaque cursor string.
+    """
+    value = {
+        'sort': [[key, direction] for key, direction in sort],
+        'values': [_getValue(doc, key) for key, _ in sort]
+    }
+    return base64.urlsafe_b64encode(json_util.dumps(value).encode('utf8')).decode('ascii')
+
+
+def decodeCursor(cursor, sort):
+    """
+    Decode a cursor created by :py:func:`encodeCursor`.
+
+    :param cursor: The cursor string.
+    :type cursor: str
+    :param sort: The total sort order of the listing, which must be the same
+        as the one the cursor was created with.
+    :type sort: List of (key, order) tuples.
+    :returns: The sort key values of the last document of the previous page.
+    :raises ValidationException: If the cursor is invalid or was created for
+        another sort order.
+    """
+    try:
+        value = json_util.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        cursorSort = [(key, direction) for key, direction in value['sort']]
+        values = value['values']
+    except (KeyError, TypeError, ValueError):
+        raise ValidationException('Invalid cursor.', 'cursor')
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise ValidationException('Invalid cursor.', 'cursor')
+    if cursorSort != [(key, direction) for key, direction in sort]:
+        raise ValidationException(
+            'The cursor was created for a different sort order.', 'cursor')
+    return values
+
+
+def _afterClause(key, value, direction):
+    # Missing and null values sort before all other values, but MongoDB
+    # comparison operators never match them, so they are handled explicitly.
+    if direction == SortDir.ASCENDING:
+        if value is None:
+            return {key: {'$ne': None}}
+        return {key: {'$gt': value}}
+    if value is None:
+        return None
+    return {'$or': [{key: {'$lt': value}}, {key: None}]}
+
+
+def cursorQuery(sort, values):
+    """
+    Build a query matching the documents that sort after a given document.
+
+    :param sort: The total sort order of the listing.
+    :type sort: List of (key, order) tuples.
+    :param values: The sort key values of the document, as returned by
+        :py:func:`decodeCursor`.
+    :type values: list
+    :returns: A MongoDB query.
+    """
+    clauses = []
+    for idx, (key, direction) in enumerate(sort):
+        after = _afterClause(key, values[idx], direction)
+        if after is None:
+            continue
+        equal = [{prevKey: prevValue} for (prevKey, _), prevValue in zip(sort[:idx], values[:idx])]
+        clauses.append({'$and': equal + [after]} if equal else after)
+    if not clauses:
+        # Nothing sorts after this document
+        return {'_id': {'$in': []}}
+    query = {'$or': clauses}
+    key, direction = sort[0]
+    if direction == SortDir.ASCENDING and values[0] is not None:
+        # This is implied by the clauses, but lets MongoDB bound its index scan
+        query = {'$and': [{key: {'$gte': values[0]}}, query]}
+    return query
@@ -1,9 +1,13 @@
+import collections
+import concurrent.futures
 import datetime
 import errno
 import json
 import logging
 import os
 import re
+import threading
+import time
 import urllib.parse
 import uuid
 
@@ -13,19 +17,180 @@ import cherrypy
 import pymongo
 import requests
 
-from girder import events
 from girder.api.rest import setContentDisposition
 from girder.exceptions import GirderException, RestException, ValidationException
 from girder.models.file import File
-from girder.models.folder import Folder
 from girder.models.item import Item
+from girder.utility.bulk_import import BulkImporter
 
 from .abstract_assetstore_adapter import AbstractAssetstoreAdapter
 
 BUF_LEN = 65536  # Buffer size for download stream
 DEFAULT_REGION = 'us-east-1'
+# The maximum number of parts this process sends to S3 at once when proxying uploads
+PART_UPLOAD_CONCURRENCY = int(os.environ.get('GIRDER_S3_PART_UPLOAD_CONCURRENCY', 8))
+# The number of prefixes listed at once by an import, unless the import says otherwise
+IMPORT_LIST_CONCURRENCY = int(os.environ.get('GIRDER_S3_IMPORT_LIST_CONCURRENCY', 8))
+# How many prefixes each listing thread may list ahead of the import
+_IMPORT_PREFETCH_PER_THREAD = 16
+# The most connections kept open to S3 per assetstore for proxied downloads.
+# If this is 0, each proxied download opens its own connection.
+DOWNLOAD_POOL_SIZE = int(os.environ.get('GIRDER_S3_DOWNLOAD_POOL_SIZE', 16))
+# Presigned URLs for proxied downloads are reused for this many seconds
+_DOWNLOAD_URL_TTL = 600
+_DOWNLOAD_URL_CACHE_SIZE = 1024
 logger = logging.getLogger(__name__)
 
+_partUploadSlots = threading.BoundedSemaphore(PART_UPLOAD_CONCURRENCY)
+# Connections to S3 are reused by proxied uploads
+_uploadSession = requests.Session()
+_uploadSession.mount('http://', requests.adapters.HTTPAdapter(
+    pool_maxsize=PART_UPLOAD_CONCURRENCY))
+_uploadSession.mount('https://', requests.adapters.HTTPAdapter(
+    pool_maxsize=PART_UPLOAD_CONCURRENCY))
+
+
+class _AssetstoreConnections:
+    """
+    The boto3 clients, pooled download connections, and recently presigned
+    URLs that the adapters of one assetstore share, so that reading many
+    files or ranges of files does not create a client, connect to S3, or
+    presign a URL for every read.
+
+    :param poolSize: The most download connections to keep open.
+    :type poolSize: int
+    """
+
+    def __init__(self, poolSize):
+        self.session = requests.Session()
+        for scheme in ('http://', 'https://'):
+            self.session.mount(scheme, requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=max(poolSize, 1)))
+        self._clients = {}
+        self._urls = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def client(self, accelerated, create):
+        """
+        Get a boto3 client, creating it if it does not exist yet.
+
+        :param accelerated: Whether this is the client for accelerated transfers.
+        :type accelerated: bool
+        :param create: A function that creates the client.
+        """
+        with self._lock:
+            if accelerated not in self._clients:
+                self._clients[accelerated] = create()
+            return self._clients[accelerated]
+
+    def url(self, key, presign):
+        """
+        Get a presigned URL, presigning it if it is not cached.
+
+        :param key: What the URL is cached by.
+        :param presign: A function that presigns the URL.
+        """
+        now = time.monotonic()
+        with self._lock:
+            url, expires = self._urls.get(key, (None, 0))
+            if expires > now:
+                self._urls.move_to_end(key)
+                return url
+        url = presign()
+        with self._lock:
+            self._urls[key] = (url, now + _DOWNLOAD_URL_TTL)
+            self._urls.move_to_end(key)
+            while len(self._urls) > _DOWNLOAD_URL_CACHE_SIZE:
+                self._urls.popitem(last=False)
+        return url
+
+
+_connections = {}
+_connectionsLock = threading.Lock()
+
+
+def _getConnections(assetstore):
+    """
+    Get the shared connections of an assetstore.  Assetstores whose
+    connection settings change get new ones, so clients and URLs using old
+    credentials are not reused.
+
+    :param assetstore: The assetstore document.
+    :type assetstore: dict
+    :rtype: _AssetstoreConnections
+    """
+    key = (str(assetstore['_id']),) + tuple(assetstore.get(field) for field in (
+        'bucket', 'accessKeyId', 'secret', 'service', 'region', 'inferCredentials',
+        'allowS3AcceleratedTransfer'))
+    with _connectionsLock:
+        connections = _connections.get(key)
+        if connections is None:
+            for oldKey in [k for k in _connections if k[0] == key[0]]:
+                _connections.pop(oldKey).session.close()
+            connections = _connections[key] = _AssetstoreConnections(DOWNLOAD_POOL_SIZE)
+        return connections
+
+
+class _PrefixLister:
+    """
+    Lists the objects and common prefixes directly underneath prefixes of a
+    bucket, optionally ahead of when they are needed on a pool of threads.
+
+    :param client: The boto3 S3 client to list with.
+    :param bucket: The bucket to list.
+    :type bucket: str
+    :param threads: The number of threads to list on.  If this is 1 or less,
+        prefixes are listed when they are needed.
+    :type threads: int
+    """
+
+    def __init__(self, client, bucket, threads):
+        self._client = client
+        self._bucket = bucket
+        self._pool = concurrent.futures.ThreadPoolExecutor(threads) if threads > 1 else None
+        self._limit = threads * _IMPORT_PREFETCH_PER_THREAD
+        self._pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    def _list(self, prefix, token=None):
+        kwargs = {'Bucket': self._bucket, 'Prefix': prefix, 'Delimiter': '/'}
+        if token:
+            kwargs['ContinuationToken'] = token
+        return self._client.list_objects_v2(**kwargs)
+
+    def prefetch(self, prefix):
+        """
+        Start listing the first page of a prefix in the background, unless
+        too many are already waiting to be used.
+        """
+        if self._pool is not None and prefix not in self._pending and (
+                len(self._pending) < self._limit):
+            self._pending[prefix] = self._pool.submit(self._list, prefix)
+
+    def pages(self, prefix):
+        """
+        Yield the pages of the listing of a prefix.  While a page is being
+        used, the next one is fetched in the background.
+        """
+        future = self._pending.pop(prefix, None)
+        resp = future.result() if future is not None else self._list(prefix)
+        while True:
+            nextPage = None
+            if resp.get('IsTruncated'):
+                token = resp['NextContinuationToken']
+                if self._pool is not None:
+                    nextPage = self._pool.submit(self._list, prefix, token)
+            yield resp
+            if not resp.get('IsTruncated'):
+                return
+            resp = nextPage.result() if nextPage is not None else self._list(prefix, token)
+
 
 class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
     """
@@ -130,11 +295,16 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
                 self.assetstore['accessKeyId'], self.assetstore['secret'],
                 self.assetstore['service'], self.assetstore.get('region'),
                 self.assetstore.get('inferCredentials'))
-            self.client = S3AssetstoreAdapter._s3Client(self.connectParams)
+            # Clients are shared by the adapters of a saved assetstore
+            getClient = _getConnections(self.assetstore).client if '_id' in self.assetstore \
+                else lambda accelerated, create: create()
+            self.client = getClient(
+                False, lambda: S3AssetstoreAdapter._s3Client(self.connectParams))
             if self.assetstore.get('allowS3AcceleratedTransfer', False):
                 acceleratedConnectParams = self.connectParams.copy()
                 acceleratedConnectParams['config'].s3 = {'use_accelerate_endpoint': True}
-                self.acceleratedClient = S3AssetstoreAdapter._s3Client(acceleratedConnectParams)
+                self.acceleratedClient = getClient(
+                    True, lambda: S3AssetstoreAdapter._s3Client(acceleratedConnectParams))
 
     def _getClient(self, useAcceleratedTransfer):
         if useAcceleratedTransfer:
@@ -257,6 +427,28 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
         else:
             return self._proxiedUploadChunk(upload, chunk, useS3TransferAcceleration)
 
+    def uploadChunkAt(self, upload, chunk, offset, uploadExtraParameters):
+        """
+        Chunks of proxied multipart uploads that cover exactly one part, i.e.
+        that start at a multiple of the upload's ``chunkLength`` and are that
+        long or reach the end of the file, may be sent in any order and
+        concurrently.  Each such part is recorded in the ``s3.parts`` field of
+        the upload document.  Other chunks must be sent in order.
+        """
+        if not isinstance(chunk, str) and self._isPart(upload, chunk.getSize(), offset):
+            useS3TransferAcceleration = self._getS3TransferAccelerationParam(
+                uploadExtraParameters)
+            return self._proxiedUploadPart(upload, chunk, offset, useS3TransferAcceleration)
+        return super().uploadChunkAt(upload, chunk, offset, uploadExtraParameters)
+
+    @staticmethod
+    def _isPart(upload, size, offset):
+        partSize = upload['s3']['chunkLength']
+        return (
+            upload['s3']['chunked'] and 'partNumber' not in upload['s3']
+            and 0 <= offset < upload['size'] and offset % partSize == 0
+            and size == min(partSize, upload['size'] - offset))
+
     def _clientUploadChunk(self, upload, chunk, useS3TransferAcceleration):
         """
         Clients that support direct-to-S3 upload behavior will go through this
@@ -299,45 +491,21 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
         assetstore types. Girder will send the data to S3 on behalf of the client.
         """
         if upload['s3']['chunked']:
+            if 'parts' in upload['s3']:
+                raise ValidationException(
+                    'Chunks of this upload must start at a multiple of %d bytes.' %
+                    upload['s3']['chunkLength'])
             if 'uploadId' not in upload['s3']:
                 # Initiate a new multipart upload if this is the first chunk
-                disp = 'attachment; filename="%s"' % upload['name']
-                mime = upload.get('mimeType', '')
-                mp = self.client.create_multipart_upload(
-                    Bucket=self.assetstore['bucket'], Key=upload['s3']['key'],
-                    ACL='private', ContentDisposition=disp, ContentType=mime,
-                    Metadata={
-                        'uploader-id': str(upload['userId']),
-                        'uploader-ip': str(cherrypy.request.remote.ip)
-                    })
+                mp = self._createMultipartUpload(upload)
                 upload['s3']['uploadId'] = mp['UploadId']
                 upload['s3']['keyName'] = mp['Key']
                 upload['s3']['partNumber'] = 0
 
             upload['s3']['partNumber'] += 1
             size = chunk.getSize()
-            headers = {
-                'Content-Length': str(size)
-            }
-
-            # We can't just call upload_part directly because they require a
-            # seekable file object, and ours isn't.
-            url = self._generatePresignedUrl(ClientMethod='upload_part', Params={
-                'Bucket': self.assetstore['bucket'],
-                'Key': upload['s3']['key'],
-                'ContentLength': size,
-                'UploadId': upload['s3']['uploadId'],
-                'PartNumber': upload['s3']['partNumber']
-            }, useS3TransferAcceleration=useS3TransferAcceleration)
-
-            resp = requests.request(method='PUT', url=url, data=chunk, headers=headers)
-            if resp.status_code not in (200, 201):
-                logger.error(
-                    'S3 multipart upload failure %d (uploadId=%s): %s',
-                    resp.status_code, upload['_id'], resp.text
-                )
-                raise GirderException('Upload failed (bad gateway)')
-
+            self._putPart(
+                upload, chunk, size, upload['s3']['partNumber'], useS3TransferAcceleration)
             upload['received'] += size
         else:
             size = chunk.getSize()
@@ -345,7 +513,7 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
                 raise ValidationException('Uploads of this length must be sent in a single chunk.')
 
             reqInfo = upload['s3']['request']
-            resp = requests.request(
+            resp = _uploadSession.request(
                 method=reqInfo['method'], url=reqInfo['url'], data=chunk,
                 headers=dict(reqInfo['headers'], **{'Content-Length': str(size)}))
             if resp.status_code not in (200, 201):
@@ -359,12 +527,151 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
 
         return upload
 
+    def _createMultipartUpload(self, upload):
+        disp = 'attachment; filename="%s"' % upload['name']
+        mime = upload.get('mimeType', '')
+        return self.client.create_multipart_upload(
+            Bucket=self.assetstore['bucket'], Key=upload['s3']['key'],
+            ACL='private', ContentDisposition=disp, ContentType=mime,
+            Metadata={
+                'uploader-id': str(upload['userId']),
+                'uploader-ip': str(cherrypy.request.remote.ip)
+            })
+
+    def _putPart(self, upload, chunk, size, partNumber, useS3TransferAcceleration=False):
+        """
+        Send one part of a multipart upload to S3.
+
+        :returns: the ETag of the part.
+        """
+        # We can't just call upload_part directly because they require a
+        # seekable file object, and ours isn't.
+        url = self._generatePresignedUrl(ClientMethod='upload_part', Params={
+            'Bucket': self.assetstore['bucket'],
+            'Key': upload['s3']['key'],
+            'ContentLength': size,
+            'UploadId': upload['s3']['uploadId'],
+            'PartNumber': partNumber
+        }, useS3TransferAcceleration=useS3TransferAcceleration)
+
+        with _partUploadSlots:
+            resp = _uploadSession.request(
+                method='PUT', url=url, data=chunk, headers={'Content-Length': str(size)})
+        if resp.status_code not in (200, 201):
+            logger.error(
+                'S3 multipart upload failure %d (uploadId=%s): %s',
+                resp.status_code, upload['_id'], resp.text
+            )
+            raise GirderException('Upload failed (bad gateway)')
+        return resp.headers.get('ETag')
+
+    def _proxiedUploadPart(self, upload, chunk, offset, useS3TransferAcceleration=False):
+        """
+        Send a chunk that is a whole part of a multipart upload to S3, and
+        record it in the upload document.  Since other parts of the upload may
+        be sent at the same time, the document is updated atomically.
+        """
+        from girder.models.upload import Upload
+
+        if 'uploadId' not in upload['s3']:
+            mp = self._createMultipartUpload(upload)
+            # The upload is resumed from the parts S3 has from now on, even if
+            # this part fails to be sent.
+            claimed = Upload().collection.find_one_and_update(
+                {'_id': upload['_id'], 's3.uploadId': {'$exists': False}},
+                {'$set': {
+                    's3.uploadId': mp['UploadId'],
+                    's3.keyName': mp['Key'],
+                    'concurrentChunks': True,
+                }},
+                return_document=pymongo.ReturnDocument.AFTER)
+            if claimed is None:
+                # Another part created the multipart upload first
+                self.client.abort_multipart_upload(
+                    Bucket=self.assetstore['bucket'], Key=mp['Key'], UploadId=mp['UploadId'])
+                claimed = Upload().collection.find_one({'_id': upload['_id']})
+                if claimed is None or 'uploadId' not in claimed['s3']:
+                    raise ValidationException('The upload is no longer in progress.')
+            upload = claimed
+
+        size = chunk.getSize()
+        partNumber = offset // upload['s3']['chunkLength'] + 1
+        etag = self._putPart(upload, chunk, size, partNumber, useS3TransferAcceleration)
+
+        field = 's3.parts.%d' % partNumber
+        update = {'$set': {
+            field: {'ETag': etag, 'size': size},
+            'concurrentChunks': True,
+            'updated': datetime.datetime.now(datetime.timezone.utc),
+        }}
+        # Only count the bytes of a part the first time it is received
+        result = Upload().collection.find_one_and_update(
+            {'_id': upload['_id'], field: {'$exists': False}},
+            dict(update, **{'$inc': {'received': size}}),
+            return_document=pymongo.ReturnDocument.AFTER)
+        if result is None:
+            result = Upload().collection.find_one_and_update(
+                {'_id': upload['_id']}, update, return_document=pymongo.ReturnDocument.AFTER)
+        if result is None:
+            raise ValidationException('The upload is no longer in progress.')
+        return result
+
+    def _listParts(self, upload):
+        """
+        List all parts of a multipart upload that S3 has received.
+        """
+        params = {
+            'Bucket': self.assetstore['bucket'],
+            'Key': upload['s3']['key'],
+            'UploadId': upload['s3']['uploadId'],
+        }
+        while True:
+            resp = self.client.list_parts(**params)
+            yield from resp.get('Parts', [])
+            if not resp.get('IsTruncated'):
+                break
+            params['PartNumberMarker'] = resp['NextPartNumberMarker']
+
+    def _resumeParts(self, upload):
+        """
+        Reconcile the parts recorded in an upload document with those S3 has,
+        which may differ if the server stopped while a part was being sent.
+
+        :returns: the offset of the first part that is missing, along with the
+            offsets of all missing parts.
+        """
+        from girder.models.upload import Upload
+
+        parts = {
+            str(part['PartNumber']): {'ETag': part['ETag'], 'size': part['Size']}
+            for part in self._listParts(upload)}
+        received = sum(part['size'] for part in parts.values())
+        Upload().collection.update_one(
+            {'_id': upload['_id']}, {'$set': {'s3.parts': parts, 'received': received}})
+
+        partSize = upload['s3']['chunkLength']
+        missing = [
+            offset for offset in range(0, upload['size'], partSize)
+            if str(offset // partSize + 1) not in parts]
+        return {
+            'offset': missing[0] if missing else upload['size'],
+            'missing': missing,
+            'chunkLength': partSize,
+            'received': received,
+        }
+
     def requestOffset(self, upload):
+        if upload.get('concurrentChunks'):
+            return self._resumeParts(upload)
+
         if upload['received'] > 0:
             # This is only set when we are proxying the data to S3
             return upload['received']
 
         if upload['s3']['chunked']:
+            if 'uploadId' not in upload['s3'] and 'partNumber' not in upload['s3']:
+                # No chunk has been sent yet
+                return 0
             raise ValidationException(
                 'You should not call requestOffset on a chunked direct-to-S3 upload.')
 
@@ -402,13 +709,17 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
         file['s3Key'] = upload['s3']['key']
 
         if upload['s3']['chunked']:
-            parts = self.client.list_parts(
-                Bucket=self.assetstore['bucket'], Key=file['s3Key'],
-                UploadId=upload['s3']['uploadId'])
-            parts = [{
-                'ETag': part['ETag'],
-                'PartNumber': part['PartNumber']
-            } for part in parts.get('Parts', [])]
+            if 'parts' in upload['s3']:
+                parts = [{
+                    'ETag': part['ETag'],
+                    'PartNumber': int(partNumber)
+                } for partNumber, part in sorted(
+                    upload['s3']['parts'].items(), key=lambda part: int(part[0]))]
+            else:
+                parts = [{
+                    'ETag': part['ETag'],
+                    'PartNumber': part['PartNumber']
+                } for part in self._listParts(upload)]
             self.client.complete_multipart_upload(
                 Bucket=self.assetstore['bucket'], Key=file['s3Key'],
                 UploadId=upload['s3']['uploadId'], MultipartUpload={'Parts': parts})
@@ -440,13 +751,23 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
 
         useS3TransferAcceleration = self._getS3TransferAccelerationParam(extraParameters)
 
-        url = self._generatePresignedUrl(
-            ClientMethod='get_object', Params=params,
-            useS3TransferAcceleration=useS3TransferAcceleration)
+        def presign():
+            return self._generatePresignedUrl(
+                ClientMethod='get_object', Params=params,
+                useS3TransferAcceleration=useS3TransferAcceleration)
 
         if headers:
-            raise cherrypy.HTTPRedirect(url)
+            raise cherrypy.HTTPRedirect(presign())
         else:
+            # Proxied downloads share connections and presigned URLs
+            if DOWNLOAD_POOL_SIZE > 0 and '_id' in self.assetstore:
+                connections = _getConnections(self.assetstore)
+                url = connections.url(
+                    (tuple(sorted(params.items())), useS3TransferAcceleration), presign)
+                get = connections.session.get
+            else:
+                url = presign()
+                get = requests.get
             headers = {}
             offset = offset or 0
             if endByte is None or endByte > file['size']:
@@ -466,20 +787,25 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
                 halt = False
                 while streamOffset < endByte and not halt:
                     try:
-                        pipe = requests.get(url, stream=True, headers=headers)
-                        for chunk in pipe.iter_content(chunk_size=BUF_LEN):
-                            if chunk:
-                                streamOffset += len(chunk)
-                                try:
-                                    yield chunk
-                                    # If we actually got any data, reset our
-                                    # retry count
-                                    retries = 0
-                                except Exception:
-                                    # if the exception occurred because of the
-                                    # consumer, just stop
-                                    halt = True
-                                    raise
+                        pipe = get(url, stream=True, headers=headers)
+                        try:
+                            for chunk in pipe.iter_content(chunk_size=BUF_LEN):
+                                if chunk:
+                                    streamOffset += len(chunk)
+                                    try:
+                                        yield chunk
+                                        # If we actually got any data, reset our
+                                        # retry count
+                                        retries = 0
+                                    except Exception:
+                                        # if the exception occurred because of the
+                                        # consumer, just stop
+                                        halt = True
+                                        raise
+                        finally:
+                            # Release the connection, even when the consumer
+                            # stops early
+                            pipe.close()
                         halt = True
                     except OSError as exc:
                         retries += 1
@@ -496,12 +822,39 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
 
     def importData(self, parent, parentType, params, progress,
                    user, force_recursive=True, **kwargs):
+        """
+        Import the objects underneath a prefix.  Prefixes are listed ahead of
+        the import by as many threads as the ``concurrency`` param, or
+        ``GIRDER_S3_IMPORT_LIST_CONCURRENCY`` if it is not set, while the
+        documents are written in order from the calling thread.
+
+        If the ``incremental`` param is set, objects whose size and ETag have
+        not changed since they were last imported are skipped.  If ``markVanished`` is set, files
+        previously imported from underneath the prefix whose objects no longer
+        exist are marked ``vanished``.
+
+        :returns: the number of files that were created, updated, unchanged
+            and marked vanished.
+        """
+        with BulkImporter(self.assetstore, user, 's3_assetstore_imported',
+                          batchEvents=params.get('batchEvents'),
+                          incremental=params.get('incremental'),
+                          markVanished=params.get('markVanished')) as batch, \
+                _PrefixLister(self.client, self.assetstore['bucket'],
+                              params.get('concurrency') or IMPORT_LIST_CONCURRENCY) as lister:
+            self._importPrefix(
+                parent, parentType, params, progress, user, force_recursive, batch, lister)
+            if params.get('markVanished'):
+                importPath = params.get('importPath', '').strip().lstrip('/')
+                batch.markVanished(
+                    parent, parentType, {'s3Key': {'$regex': '^' + re.escape(importPath)}})
+        return batch.stats
+
+    def _importPrefix(self, parent, parentType, params, progress, user, force_recursive,
+                      batch, lister):
         importPath = params.get('importPath', '').strip().lstrip('/')
-        bucket = self.assetstore['bucket']
         now = datetime.datetime.now(datetime.timezone.utc)
-        paginator = self.client.get_paginator('list_objects')
-        pageIterator = paginator.paginate(Bucket=bucket, Prefix=importPath, Delimiter='/')
-        for resp in pageIterator:
+        for resp in lister.pages(importPath):
             # Start with objects
             for obj in resp.get('Contents', []):
                 if progress:
@@ -516,52 +869,45 @@ class S3AssetstoreAdapter(AbstractAssetstoreAdapter):
                         'Keys cannot be imported directly underneath a %s.' % parentType)
 
                 if self.shouldImportFile(obj['Key'], params):
-                    item = Item().createItem(
-                        name=self.safeName(name), creator=user, folder=parent,
-                        reuseExisting=True)
-                    events.trigger('s3_assetstore_imported', {
-                        'id': item['_id'],
-                        'type': 'item',
-                        'importPath': obj['Key'],
-                    })
-                    # Create a file record; delay saving it until we have added
-                    # the import information.
-                    file = File().createFile(
-                        name=name, creator=user, item=item, reuseExisting=True,
-                        assetstore=self.assetstore, mimeType=None, size=obj['Size'],
-                        saveFile=False)
-                    file['s3Key'] = obj['Key']
-                    file['imported'] = True
-                    File().save(file)
-
-            for obj in resp.get('CommonPrefixes', []):
+                    item = batch.addItem(parent, self.safeName(name), obj['Key'])
+                    batch.addFile(
+                        item, name, obj['Size'],
+                        fingerprint={'size': obj['Size'], 'etag': obj.get('ETag')},
+                        s3Key=obj['Key'], imported=True)
+            # The items of this page must exist to detect their names below
+            batch.flush()
+
+            prefixes = resp.get('CommonPrefixes', [])
+            names = [self.safeName(obj['Prefix'].rstrip('/').rsplit('/', 1)[-1])
+                     for obj in prefixes]
+            # If there is already an item with the folder's name, append '/'.
+            # This is how S3 presents the names, allowing a folder and file to
+            # have the same name once stripped of the right /.
+            itemNames = set()
+            if parentType == 'folder' and names:
+                itemNames = {item['name'] for item in Item().find({
+                    'folderId': parent['_id'],
+                    'name': {'$in': names},
+                }, fields=['name'])}
+            entries = [
+                (self.safeName(name + '/') if name in itemNames else name, obj['Prefix'])
+                for name, obj in zip(names, prefixes)]
+            for obj in prefixes:
                 if progress:
                     progress.update(message=obj['Prefix'])
 
-                name = obj['Prefix'].rstrip('/').rsplit('/', 1)[-1]
-                # If there is already an item with the folder's name, append
-                # '/'.  This is how S3 presents the names, allowing a folder
-                # and file to have the same name once stripped of the right /.
-                if parentType == 'folder' and Item().findOne({
-                    'folderId': parent['_id'],
-                    'name': self.safeName(name),
-                }):
-                    name = name + '/'
-                folder = Folder().createFolder(
-                    parent=parent, name=self.safeName(name),
-                    parentType=parentType, creator=user, reuseExisting=True)
-
-                events.trigger('s3_assetstore_imported', {
-                    'id': folder['_id'],
-                    'type': 'folder',
-                    'importPath': obj['Prefix'],
-                })
-                # recurse into subdirectories if force_recursive is true
-                # or the folder was newly created.
-                if force_recursive or folder['created'] >= now:
-                    self.importData(parent=folder, parentType='folder', params={
-                        **params, 'importPath': obj['Prefix']
-                    }, progress=progress, user=user, **kwargs)
+            # recurse into subdirectories if force_recursive is true
+            # or the folder was newly created.
+            children = [
+                (folder, prefix)
+                for folder, (_, prefix) in zip(batch.folders(parent, parentType, entries), entries)
+                if force_recursive or folder['created'] >= now]
+            for _, prefix in children:
+                lister.prefetch(prefix)
+            for folder, prefix in children:
+                self._importPrefix(
+                    folder, 'folder', {**params, 'importPath': prefix}, progress, user,
+                    force_recursive, batch, lister)
 
     def deleteFile(self, file):
         """
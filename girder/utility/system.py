@@ -8,6 +8,7 @@ import psutil
 
 import girder
 from girder.models import getDbConnection
+from girder.utility._cache import getCacheStats
 
 
 def _objectToDict(obj):
@@ -123,6 +124,7 @@ def getStatus(mode='basic', user=None):
             True for threadId in cherrypy.tools.status.seenThreads
             if 'end' not in cherrypy.tools.status.seenThreads[threadId]])
         status['cherrypyThreadPoolSize'] = cherrypy.server.thread_pool
+        status['cacheStats'] = getCacheStats()
 
     if mode == 'slow' and isAdmin:
         _computeSlowStatus(process, status, db)
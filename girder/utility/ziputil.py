@@ -11,9 +11,17 @@ Example of creating and consuming a streaming zip:
         yield data
 
     yield zip.footer()
+
+To read the next files of the archive ahead of the one being written, from
+other threads, use ``addFiles`` with an iterable of (path, generator) pairs:
+
+    yield from zip.addFiles(files)
+    yield zip.footer()
 """
 
 import binascii
+import collections
+import concurrent.futures
 import os
 import struct
 import sys
@@ -31,6 +39,10 @@ Z64_LIMIT = (1 << 31) - 1
 Z_FILECOUNT_LIMIT = 1 << 16
 STORE = 0
 DEFLATE = 8
+# The number of files that addFiles reads ahead of the one being written
+PREFETCH_FILES = int(os.environ.get('GIRDER_ZIP_PREFETCH_FILES', 8))
+# The most bytes of each file that addFiles reads ahead
+PREFETCH_BYTES = int(os.environ.get('GIRDER_ZIP_PREFETCH_BYTES', 1024 * 1024))
 
 
 class ZipInfo:
@@ -93,6 +105,41 @@ class ZipInfo:
         return header + self.filename
 
 
+class _EntryData:
+    """
+    Keeps the checksum and sizes of the data of an archive entry, compressing
+    it if needed.
+    """
+
+    __slots__ = ('compressor', 'useCRC', 'crc', 'fileSize', 'compressSize')
+
+    def __init__(self, compression, useCRC):
+        if compression == DEFLATE:
+            self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        else:
+            self.compressor = None
+        self.useCRC = useCRC
+        self.crc = 0
+        self.fileSize = 0
+        self.compressSize = 0
+
+    def add(self, buf):
+        """
+        Add data to the entry.
+
+        :returns: the data to write to the archive.
+        """
+        if isinstance(buf, str):
+            buf = buf.encode('utf8')
+        self.fileSize += len(buf)
+        if self.useCRC:
+            self.crc = binascii.crc32(buf, self.crc) & 0xFFFFFFFF
+        if self.compressor:
+            buf = self.compressor.compress(buf)
+            self.compressSize += len(buf)
+        return buf
+
+
 class ZipGenerator:
     """
     This class can be used to create a streaming zip file that consumes from
@@ -132,44 +179,95 @@ class ZipGenerator:
         :param path: The path within the archive for this entry.
         :type path: str
         """
+        yield from self._writeEntry(
+            path, _EntryData(self.compression, self.useCRC), [], generator())
+
+    def addFiles(self, files, prefetch=PREFETCH_FILES, prefetchBytes=PREFETCH_BYTES):
+        """
+        Generates data to add several files to the archive.  While a file is
+        written, the beginning of each of the next files is read, and
+        compressed if the archive is compressed, on a pool of threads.  The
+        files are written in the order they are given.
+
+        :param files: An iterable of (path, generator function) pairs, as
+            would be passed to ``addFile``.
+        :param prefetch: The number of files to read ahead.  If this is 0,
+            each file is read when it is written.
+        :type prefetch: int
+        :param prefetchBytes: The most bytes of each file to read ahead.  The
+            rest of the file is read when it is written.
+        :type prefetchBytes: int
+        """
+        if prefetch < 1:
+            for path, generator in files:
+                yield from self.addFile(generator, path)
+            return
+
+        files = iter(files)
+        pending = collections.deque()
+        pool = concurrent.futures.ThreadPoolExecutor(prefetch)
+        try:
+            while True:
+                while len(pending) < prefetch:
+                    entry = next(files, None)
+                    if entry is None:
+                        break
+                    path, generator = entry
+                    pending.append((path, pool.submit(self._readAhead, generator, prefetchBytes)))
+                if not pending:
+                    break
+                path, future = pending.popleft()
+                yield from self._writeEntry(path, *future.result())
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _readAhead(self, generator, limit):
+        """
+        Read the beginning of a file.
+
+        :returns: the entry's data so far, the list of data to write to the
+            archive, and an iterator over the rest of the file or None if it
+            has been read.
+        """
+        entryData = _EntryData(self.compression, self.useCRC)
+        data = []
+        rest = iter(generator())
+        for buf in rest:
+            if not buf:
+                break
+            data.append(entryData.add(buf))
+            if entryData.fileSize >= limit:
+                return entryData, data, rest
+        return entryData, data, None
+
+    def _writeEntry(self, path, entryData, data, rest):
         fullpath = os.path.join(self.rootPath, path)
         header = ZipInfo(fullpath, time.localtime()[0:6])
         header.externalAttr = (0o100644 & 0xFFFF) << 16
         header.compressType = self.compression
         header.headerOffset = self.offset
 
-        header.crc = crc = 0
-        header.compressSize = compressSize = 0
-        header.fileSize = fileSize = 0
+        header.crc = 0
+        header.compressSize = 0
+        header.fileSize = 0
         yield self._advanceOffset(header.fileHeader())
-        if header.compressType == DEFLATE:
-            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
-                                          zlib.DEFLATED, -15)
-        else:
-            compressor = None
+        for buf in data:
+            yield self._advanceOffset(buf)
 
-        for buf in generator():
+        for buf in rest or ():
             if not buf:
                 break
-            if isinstance(buf, str):
-                buf = buf.encode('utf8')
-            fileSize += len(buf)
-            if self.useCRC:
-                crc = binascii.crc32(buf, crc) & 0xFFFFFFFF
-            if compressor:
-                buf = compressor.compress(buf)
-                compressSize += len(buf)
-            yield self._advanceOffset(buf)
+            yield self._advanceOffset(entryData.add(buf))
 
-        if compressor:
-            buf = compressor.flush()
-            compressSize += len(buf)
+        if entryData.compressor:
+            buf = entryData.compressor.flush()
+            entryData.compressSize += len(buf)
             yield self._advanceOffset(buf)
-            header.compressSize = compressSize
+            header.compressSize = entryData.compressSize
         else:
-            header.compressSize = fileSize
-        header.crc = crc
-        header.fileSize = fileSize
+            header.compressSize = entryData.fileSize
+        header.crc = entryData.crc
+        header.fileSize = entryData.fileSize
         yield self._advanceOffset(header.dataDescriptor())
         self.files.append(header)
 
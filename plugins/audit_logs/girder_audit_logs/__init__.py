@@ -1,15 +1,33 @@
 import datetime
 import logging
+import os
+import queue
+import threading
+import time
 import urllib.parse
 
 import cherrypy
 
 from girder import auditLogger
+from girder.api import access
+from girder.api.describe import Description, autoDescribeRoute
 from girder.api.rest import getCurrentUser
 from girder.constants import SortDir
 from girder.models.model_base import Model
 from girder.plugin import GirderPlugin
 
+logger = logging.getLogger(__name__)
+
+# The most records that may wait to be written
+QUEUE_SIZE = int(os.environ.get('GIRDER_AUDIT_LOG_QUEUE_SIZE', 10000))
+# The most records written at once
+BATCH_SIZE = int(os.environ.get('GIRDER_AUDIT_LOG_BATCH_SIZE', 500))
+# The longest a record waits for others to be written with, in seconds
+FLUSH_INTERVAL = float(os.environ.get('GIRDER_AUDIT_LOG_FLUSH_INTERVAL', 1))
+# Whether requests wait for room in a full queue rather than their records being dropped
+BLOCK_WHEN_FULL = os.environ.get('GIRDER_AUDIT_LOG_BLOCK_WHEN_FULL', '').lower() in (
+    'true', '1', 'yes', 'on')
+
 
 class Record(Model):
     def initialize(self):
@@ -24,7 +42,44 @@ class Record(Model):
         return doc
 
 
+class _Marker:
+    """
+    Queued after the records that a flush or close should wait for.
+    """
+
+    def __init__(self, stop=False):
+        self.stop = stop
+        self.done = threading.Event()
+
+
 class _AuditLogDatabaseHandler(logging.Handler):
+    """
+    Queues audit log records and writes them in batches from a background
+    thread, so that requests do not wait on the database.
+
+    :param queueSize: The most records that may wait to be written.
+    :type queueSize: int
+    :param batchSize: The most records written at once.
+    :type batchSize: int
+    :param flushInterval: The longest, in seconds, that a record waits for
+        others to be written with.
+    :type flushInterval: float
+    :param blockWhenFull: If the queue is full, whether to wait for room in
+        it rather than dropping the record.
+    :type blockWhenFull: bool
+    """
+
+    def __init__(self, queueSize=QUEUE_SIZE, batchSize=BATCH_SIZE,
+                 flushInterval=FLUSH_INTERVAL, blockWhenFull=BLOCK_WHEN_FULL):
+        super().__init__()
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.blockWhenFull = blockWhenFull
+        self._queue = queue.Queue(queueSize)
+        self._thread = None
+        self._threadLock = threading.Lock()
+        self._stats = {'written': 0, 'dropped': 0, 'failed': 0}
+
     def handle(self, record):
         user = getCurrentUser()
 
@@ -40,13 +95,105 @@ class _AuditLogDatabaseHandler(logging.Handler):
                 urllib.parse.quote(paramKey, safe='').replace('.', '%2E'): paramValue
                 for paramKey, paramValue in record.details['params'].items()
             }
-        Record().save({
+        self._enqueue({
             'type': record.msg,
             'details': record.details,
             'ip': cherrypy.request.remote.ip,
             'userId': user and user['_id'],
             'when': datetime.datetime.now(datetime.timezone.utc)
-        }, triggerEvents=False)
+        })
+
+    def _enqueue(self, doc):
+        self._startWriter()
+        try:
+            self._queue.put(doc, block=self.blockWhenFull)
+        except queue.Full:
+            with self._threadLock:
+                self._stats['dropped'] += 1
+                dropped = self._stats['dropped']
+            if dropped == 1 or not dropped % 1000:
+                logger.warning('The audit log queue is full; %d records dropped so far.', dropped)
+
+    def _startWriter(self):
+        with self._threadLock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._writeRecords, name='AuditLogWriter', daemon=True)
+                self._thread.start()
+
+    def _writeRecords(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flushInterval
+            while len(batch) < self.batchSize and not isinstance(batch[-1], _Marker):
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            marker = batch.pop() if isinstance(batch[-1], _Marker) else None
+            self._insert(batch)
+            if marker is not None:
+                marker.done.set()
+                if marker.stop:
+                    return
+
+    def _insert(self, docs):
+        if not docs:
+            return
+        try:
+            Record().collection.insert_many(docs, ordered=False)
+            written = len(docs)
+        except Exception:
+            logger.exception('Failed to write %d audit log records.', len(docs))
+            written = 0
+        with self._threadLock:
+            self._stats['written'] += written
+            self._stats['failed'] += len(docs) - written
+
+    def _sendMarker(self, stop=False):
+        with self._threadLock:
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        marker = _Marker(stop)
+        self._queue.put(marker)
+        while not marker.done.wait(1):
+            if not thread.is_alive():
+                return
+
+    def flush(self):
+        """
+        Write all of the records queued so far.
+        """
+        self._sendMarker()
+
+    def close(self):
+        """
+        Write all of the queued records and stop the background thread.
+        """
+        self._sendMarker(stop=True)
+        super().close()
+
+    def stats(self):
+        """
+        Get the number of records currently queued, and the number written,
+        dropped because the queue was full, and that failed to be written.
+        """
+        with self._threadLock:
+            return dict(self._stats, queued=self._queue.qsize(), queueSize=self._queue.maxsize)
+
+
+@access.admin
+@autoDescribeRoute(
+    Description('Get the state of the audit log writer.')
+    .notes('This reports the number of records waiting to be written, and the '
+           'number written, dropped and failed since the server started.')
+    .errorResponse('You are not a system administrator.', 403)
+)
+def getAuditLogStatus():
+    for handler in auditLogger.handlers:
+        if isinstance(handler, _AuditLogDatabaseHandler):
+            return handler.stats()
 
 
 class AuditLogsPlugin(GirderPlugin):
@@ -54,3 +201,4 @@ class AuditLogsPlugin(GirderPlugin):
 
     def load(self, info):
         auditLogger.addHandler(_AuditLogDatabaseHandler())
+        info['apiRoot'].system.route('GET', ('audit_logs', 'status'), getAuditLogStatus)
@@ -1,26 +1,123 @@
+import atexit
+import collections
+import logging
+import os
+import threading
+
+import pymongo
+
 from girder import events
 from girder.constants import AccessType
 from girder.models.file import File
 from girder.plugin import GirderPlugin
 
+logger = logging.getLogger(__name__)
+
+# How often accumulated download counts are written, in seconds.  If this is
+# 0, counts are written as they happen.
+FLUSH_INTERVAL = float(os.environ.get('GIRDER_DOWNLOAD_STATISTICS_FLUSH_INTERVAL', 5))
+
+
+class DownloadCounter:
+    """
+    Accumulates download counts per file in memory and periodically writes
+    them with a single bulk write, so that many range requests for the same
+    file do not each update its document.
+
+    :param flushInterval: How often to write the counts, in seconds.  If this
+        is 0, counts are written as they are added.
+    :type flushInterval: float
+    """
+
+    def __init__(self, flushInterval=FLUSH_INTERVAL):
+        self.flushInterval = flushInterval
+        self._counts = collections.defaultdict(collections.Counter)
+        self._lock = threading.Lock()
+        self._writeLock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, fileId, field, amount=1):
+        """
+        Add to a download count of a file.
+
+        :param fileId: The ID of the file.
+        :param field: The name of the count within ``downloadStatistics``.
+        :type field: str
+        :param amount: The amount to add.
+        :type amount: int
+        """
+        with self._lock:
+            self._counts[fileId]['downloadStatistics.' + field] += amount
+        if self.flushInterval <= 0:
+            self.flush()
+        else:
+            self._startWriter()
+
+    def _startWriter(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._writeCounts, name='DownloadStatisticsWriter', daemon=True)
+                self._thread.start()
+
+    def _writeCounts(self):
+        while not self._stop.wait(self.flushInterval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to write download statistics.')
+
+    def flush(self):
+        """
+        Write all of the counts accumulated so far.  If the write fails, the
+        counts are kept to be written by the next flush.
+        """
+        with self._writeLock:
+            with self._lock:
+                counts, self._counts = self._counts, collections.defaultdict(collections.Counter)
+            if not counts:
+                return
+            # Files whose counts grew by the same amounts share an update
+            byIncrement = collections.defaultdict(list)
+            for fileId, increment in counts.items():
+                byIncrement[tuple(sorted(increment.items()))].append(fileId)
+            try:
+                File().collection.bulk_write([
+                    pymongo.UpdateMany({'_id': {'$in': fileIds}}, {'$inc': dict(increment)})
+                    for increment, fileIds in byIncrement.items()], ordered=False)
+            except Exception:
+                with self._lock:
+                    for fileId, increment in counts.items():
+                        self._counts[fileId].update(increment)
+                raise
+
+    def close(self):
+        """
+        Stop the background writer and write the remaining counts.
+        """
+        self._stop.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+
+downloadCounter = DownloadCounter()
+atexit.register(downloadCounter.close)
+
 
 def _onDownloadFileRequest(event):
+    fileId = event.info['file']['_id']
     if event.info['startByte'] == 0:
-        File().increment(
-            query={'_id': event.info['file']['_id']},
-            field='downloadStatistics.started',
-            amount=1)
-    File().increment(
-        query={'_id': event.info['file']['_id']},
-        field='downloadStatistics.requested',
-        amount=1)
+        downloadCounter.add(fileId, 'started')
+    downloadCounter.add(fileId, 'requested')
 
 
 def _onDownloadFileComplete(event):
-    File().increment(
-        query={'_id': event.info['file']['_id']},
-        field='downloadStatistics.completed',
-        amount=1)
+    downloadCounter.add(event.info['file']['_id'], 'completed')
 
 
 class DownloadStatisticsPlugin(GirderPlugin):
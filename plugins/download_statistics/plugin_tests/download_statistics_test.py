@@ -1,8 +1,14 @@
+import io
 import json
 import os
+import unittest.mock
+
+import pymongo
+from girder_download_statistics import DownloadCounter, downloadCounter
 
 from girder.constants import ROOT_DIR
 from girder.models.collection import Collection
+from girder.models.file import File
 from girder.models.folder import Folder
 from girder.models.item import Item
 from girder.models.upload import Upload
@@ -68,6 +74,7 @@ class DownloadStatisticsTestCase(base.TestCase):
 
     def _checkDownloadsCount(self, fileId, started, requested, completed):
         # Downloads file info and asserts download statistics are accurate
+        downloadCounter.flush()
         path = '/file/%s' % str(fileId)
         resp = self.request(path, isJson=True)
         self.assertStatusOk(resp)
@@ -174,3 +181,90 @@ class DownloadStatisticsTestCase(base.TestCase):
 
         self._checkDownloadsCount(file1['_id'], 14, 18, 13)
         self._checkDownloadsCount(file2['_id'], 15, 19, 14)
+
+    def _createFiles(self, count):
+        folder = Folder().createFolder(self.admin, 'files', parentType='user')
+        item = Item().createItem('item', self.admin, folder)
+        return [
+            Upload().uploadFromFile(
+                io.BytesIO(b'data'), 4, 'file%d.txt' % n, parentType='item',
+                parent=item, user=self.admin)
+            for n in range(count)]
+
+    def _getStatistics(self, file):
+        return File().load(file['_id'], force=True).get('downloadStatistics')
+
+    def testCountsAreCoalesced(self):
+        file1, file2, file3 = self._createFiles(3)
+        counter = DownloadCounter(flushInterval=60)
+        try:
+            for file in (file1, file2):
+                counter.add(file['_id'], 'started')
+                counter.add(file['_id'], 'requested')
+            counter.add(file3['_id'], 'requested')
+            counter.add(file3['_id'], 'requested')
+            self.assertIsNone(self._getStatistics(file1))
+
+            # Files whose counts grew by the same amounts share an update
+            collection = File().collection
+            with unittest.mock.patch.object(
+                    collection, 'bulk_write', wraps=collection.bulk_write) as bulkWrite:
+                counter.flush()
+            bulkWrite.assert_called_once()
+            self.assertEqual(bulkWrite.call_args.args[0], [
+                pymongo.UpdateMany(
+                    {'_id': {'$in': [file1['_id'], file2['_id']]}},
+                    {'$inc': {'downloadStatistics.requested': 1,
+                              'downloadStatistics.started': 1}}),
+                pymongo.UpdateMany(
+                    {'_id': {'$in': [file3['_id']]}},
+                    {'$inc': {'downloadStatistics.requested': 2}})
+            ])
+        finally:
+            counter.close()
+        self.assertEqual(self._getStatistics(file1), {'started': 1, 'requested': 1})
+        self.assertEqual(self._getStatistics(file2), {'started': 1, 'requested': 1})
+        self.assertEqual(self._getStatistics(file3), {'requested': 2})
+
+    def testFailedWriteKeepsCounts(self):
+        file, = self._createFiles(1)
+        counter = DownloadCounter(flushInterval=60)
+        try:
+            counter.add(file['_id'], 'requested')
+            with unittest.mock.patch.object(
+                    File().collection, 'bulk_write',
+                    side_effect=pymongo.errors.PyMongoError('failed')):
+                with self.assertRaises(pymongo.errors.PyMongoError):
+                    counter.flush()
+            self.assertIsNone(self._getStatistics(file))
+
+            # The counts that failed to be written are added to by later ones
+            counter.add(file['_id'], 'requested')
+            counter.add(file['_id'], 'completed')
+            counter.flush()
+            self.assertEqual(self._getStatistics(file), {'requested': 2, 'completed': 1})
+        finally:
+            counter.close()
+
+    def testNoFlushInterval(self):
+        file, = self._createFiles(1)
+        counter = DownloadCounter(flushInterval=0)
+        counter.add(file['_id'], 'started')
+        self.assertEqual(self._getStatistics(file), {'started': 1})
+        counter.add(file['_id'], 'started')
+        self.assertEqual(self._getStatistics(file), {'started': 2})
+        # Nothing is left to be written later
+        self.assertIsNone(counter._thread)
+        counter.close()
+
+    def testCloseWritesRemainingCounts(self):
+        file, = self._createFiles(1)
+        counter = DownloadCounter(flushInterval=60)
+        counter.add(file['_id'], 'started')
+        counter.add(file['_id'], 'completed')
+        self.assertTrue(counter._thread.is_alive())
+        self.assertIsNone(self._getStatistics(file))
+
+        counter.close()
+        self.assertFalse(counter._thread.is_alive())
+        self.assertEqual(self._getStatistics(file), {'started': 1, 'completed': 1})
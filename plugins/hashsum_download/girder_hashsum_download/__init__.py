@@ -1,22 +1,40 @@
+import concurrent.futures
 import hashlib
+import logging
+import os
+import queue
+import re
+import threading
+import time
 from pathlib import Path
 
 from girder import events
 from girder.api import access
 from girder.api.describe import Description, autoDescribeRoute
-from girder.api.rest import filtermodel, setContentDisposition, setRawResponse, setResponseHeader
+from girder.api.rest import (
+    filtermodel, getCurrentUser, setContentDisposition, setRawResponse, setResponseHeader)
 from girder.api.v1.file import File
-from girder.constants import AccessType, TokenScope
+from girder.constants import AccessType, AssetstoreType, SortDir, TokenScope
 from girder.exceptions import RestException
+from girder.models.assetstore import Assetstore
 from girder.models.file import File as FileModel
 from girder.models.setting import Setting
 from girder.plugin import GirderPlugin, registerPluginStaticContent
+from girder.tasks import ensure_local_worker_available
 from girder.utility.progress import ProgressContext, noProgress
 
 from .settings import PluginSettings
+from .tasks import computeMissingHashesTask
+
+logger = logging.getLogger(__name__)
 
 SUPPORTED_ALGORITHMS = {'sha512'}
-_CHUNK_LEN = 65536
+_CHUNK_LEN = 4 * 1024 * 1024
+# The number of files hashed at once in the background after uploads
+HASH_WORKERS = int(os.environ.get('GIRDER_HASHSUM_WORKERS', 2))
+
+_hashPool = None
+_hashPoolLock = threading.Lock()
 
 
 class HashedFile(File):
@@ -144,36 +162,143 @@ def _computeHashHook(event):
     a completed upload. Only done if the AUTO_COMPUTE setting enabled.
     """
     if Setting().get(PluginSettings.AUTO_COMPUTE):
-        _computeHash(event.info['file'])
+        _scheduleHash(event.info['file'])
+
+
+def _importChangedHook(event):
+    """
+    Event hook that discards the hashes of an imported file whose data has
+    changed, and computes them again if the AUTO_COMPUTE setting is enabled.
+    """
+    file = event.info
+    FileModel().update({'_id': file['_id']}, update={
+        '$unset': {alg: True for alg in SUPPORTED_ALGORITHMS}
+    }, multi=False)
+    for alg in SUPPORTED_ALGORITHMS:
+        file.pop(alg, None)
+    if Setting().get(PluginSettings.AUTO_COMPUTE):
+        _scheduleHash(file)
+
+
+def _scheduleHash(file):
+    """
+    Compute the hashes of a file in the background.
+    """
+    global _hashPool
+
+    with _hashPoolLock:
+        if _hashPool is None:
+            _hashPool = concurrent.futures.ThreadPoolExecutor(
+                HASH_WORKERS, thread_name_prefix='hashsum')
+    _hashPool.submit(_computeHashLogged, file)
+
+
+def _computeHashLogged(file):
+    try:
+        _computeHash(file)
+    except Exception:
+        logger.exception('Failed to compute the hashes of file %s.', file['_id'])
+
+
+class _Hasher:
+    """
+    Updates several digests with the same data in a single pass.  When there
+    is more than one digest, each is updated on its own thread; hashlib
+    releases the GIL while hashing large buffers, so the digests are computed
+    in parallel with each other and with reading the data.
+
+    :param algorithms: The names of the hashlib algorithms to compute.
+    """
+
+    def __init__(self, algorithms):
+        self.digests = {alg: hashlib.new(alg) for alg in algorithms}
+        self._queues = []
+        self._threads = []
+        if len(self.digests) > 1:
+            for digest in self.digests.values():
+                chunks = queue.Queue(maxsize=2)
+                thread = threading.Thread(
+                    target=self._hash, args=(digest, chunks), name='hashsum-digest', daemon=True)
+                thread.start()
+                self._queues.append(chunks)
+                self._threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        for chunks in self._queues:
+            chunks.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    @staticmethod
+    def _hash(digest, chunks):
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            digest.update(chunk)
+
+    def update(self, chunk):
+        if self._queues:
+            for chunks in self._queues:
+                chunks.put(chunk)
+        else:
+            for digest in self.digests.values():
+                digest.update(chunk)
+
+    def hexdigests(self):
+        """
+        Get the digests.  This must be called after the hasher is closed.
+        """
+        return {alg: digest.hexdigest() for alg, digest in self.digests.items()}
+
+
+def _storedHashes(file):
+    """
+    Get the hashes of a file that are already known without reading it.
+    Files uploaded to a filesystem assetstore are stored under their sha512.
+    """
+    if (file.get('imported') or not file.get('path') or not file.get('assetstoreId')
+            or not re.fullmatch(r'[0-9a-f]{128}', os.path.basename(file['path']))):
+        return {}
+    assetstore = Assetstore().load(file['assetstoreId'])
+    if assetstore is None or assetstore['type'] != AssetstoreType.FILESYSTEM:
+        return {}
+    return {'sha512': os.path.basename(file['path'])}
 
 
 def _computeHash(file, progress=noProgress):
     """
     Computes all supported checksums on a given file. Downloads the
-    file data and stream-computes all required hashes on it, saving
-    the results in the file document.
+    file data and stream-computes all required hashes on it in a single
+    pass, saving the results in the file document.
 
     In the case of assetstore impls that already compute the sha512,
     and when sha512 is the only supported algorithm, we will not download
     the file to the server.
     """
     toCompute = SUPPORTED_ALGORITHMS - set(file)
-    toCompute = {alg: getattr(hashlib, alg)() for alg in toCompute}
 
     if not toCompute:
         return
 
+    stored = _storedHashes(file)
+    digests = {alg: stored[alg] for alg in toCompute if alg in stored}
+    toCompute -= set(digests)
+
     fileModel = FileModel()
-    with fileModel.open(file) as fh:
-        while True:
-            chunk = fh.read(_CHUNK_LEN)
-            if not chunk:
-                break
-            for digest in toCompute.values():
-                digest.update(chunk)
-            progress.update(increment=len(chunk))
+    if toCompute:
+        with _Hasher(toCompute) as hasher, fileModel.open(file) as fh:
+            while True:
+                chunk = fh.read(_CHUNK_LEN)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                progress.update(increment=len(chunk))
+        digests.update(hasher.hexdigests())
 
-    digests = {alg: digest.hexdigest() for alg, digest in toCompute.items()}
     fileModel.update({'_id': file['_id']}, update={
         '$set': digests
     }, multi=False)
@@ -181,14 +306,86 @@ def _computeHash(file, progress=noProgress):
     return digests
 
 
+def _computeMissingHashes(assetstore, progress=noProgress, batchSize=100):
+    """
+    Compute the supported checksums that are missing from the files of an
+    assetstore.
+
+    :param assetstore: The assetstore.
+    :param progress: A progress context.  Its message reports the throughput.
+    :param batchSize: The number of files to fetch at once.  Each batch is
+        fetched with its own query so that no cursor times out while files
+        are hashed.
+    :returns: the number of files hashed and that failed to be hashed, the
+        bytes hashed and the seconds it took.
+    """
+    query = {
+        'assetstoreId': assetstore['_id'],
+        '$or': [{alg: {'$exists': False}} for alg in sorted(SUPPORTED_ALGORITHMS)]
+    }
+    fileModel = FileModel()
+    total = fileModel.collection.count_documents(query)
+    stats = {'files': 0, 'failed': 0, 'bytes': 0, 'seconds': 0}
+    start = time.monotonic()
+    progress.update(total=total, current=0)
+    lastId = None
+    while True:
+        batchQuery = dict(query, _id={'$gt': lastId}) if lastId is not None else query
+        files = list(fileModel.find(batchQuery, sort=[('_id', SortDir.ASCENDING)], limit=batchSize))
+        for file in files:
+            try:
+                if _computeHash(file) is not None:
+                    stats['bytes'] += file.get('size', 0)
+                stats['files'] += 1
+            except Exception:
+                logger.exception('Failed to compute the hashes of file %s.', file['_id'])
+                stats['failed'] += 1
+            stats['seconds'] = time.monotonic() - start
+            progress.update(
+                current=stats['files'] + stats['failed'],
+                message='Hashed %d of %d files (%.1f files/s, %.1f MB/s)' % (
+                    stats['files'], total, stats['files'] / max(stats['seconds'], 1e-6),
+                    stats['bytes'] / max(stats['seconds'], 1e-6) / 1e6))
+        if len(files) < batchSize:
+            break
+        lastId = files[-1]['_id']
+    logger.info(
+        'Hashed %d files (%d bytes) of assetstore %s in %.1f s; %d failed.', stats['files'],
+        stats['bytes'], assetstore['_id'], stats['seconds'], stats['failed'])
+    return stats
+
+
+@access.admin
+@autoDescribeRoute(
+    Description('Compute the missing checksum values of all files in an assetstore.')
+    .notes('This runs in the background on the local worker.  The progress '
+           'reports the number of files hashed and the throughput.')
+    .modelParam('id', 'The ID of the assetstore.', model=Assetstore)
+    .param('progress', 'Whether to track progress of the operation', dataType='boolean',
+           default=False, required=False)
+    .errorResponse()
+    .errorResponse('You are not an administrator.', 403)
+)
+def computeMissingHashes(assetstore, progress):
+    ensure_local_worker_available()
+    computeMissingHashesTask.delay(
+        assetstoreId=str(assetstore['_id']),
+        userId=str(getCurrentUser()['_id']),
+        progress=progress,
+        girder_job_disable=True,
+    )
+
+
 class HashsumDownloadPlugin(GirderPlugin):
     DISPLAY_NAME = 'Hashsum Download'
 
     def load(self, info):
         HashedFile(info['apiRoot'].file)
+        info['apiRoot'].assetstore.route('POST', (':id', 'hashsum'), computeMissingHashes)
         FileModel().exposeFields(level=AccessType.READ, fields=SUPPORTED_ALGORITHMS)
 
         events.bind('data.process', 'hashsum_download', _computeHashHook)
+        events.bind('model.file.import.changed', 'hashsum_download', _importChangedHook)
 
         registerPluginStaticContent(
             plugin='hashsum_download',
@@ -0,0 +1,9 @@
+from girder_worker import GirderWorkerPluginABC
+
+
+class HashsumDownloadWorkerPlugin(GirderWorkerPluginABC):
+    def __init__(self, app, *args, **kwargs):
+        self.app = app
+
+    def task_imports(self):
+        return ['girder_hashsum_download.tasks']
@@ -0,0 +1,17 @@
+from girder_worker.app import app
+
+from girder.models.assetstore import Assetstore
+from girder.models.user import User
+from girder.utility.progress import ProgressContext
+
+
+@app.task(queue='local')
+def computeMissingHashesTask(assetstoreId: str, userId: str, progress: bool):
+    from . import _computeMissingHashes
+
+    user = User().load(userId, force=True)
+    assetstore = Assetstore().load(assetstoreId)
+
+    with ProgressContext(
+            progress, user=user, title='Computing hashes: %s' % assetstore['name']) as ctx:
+        return _computeMissingHashes(assetstore, progress=ctx)
@@ -1,5 +1,8 @@
 import hashlib
 import io
+import os
+import shutil
+import tempfile
 import time
 
 import girder_hashsum_download as hashsum_download
@@ -10,6 +13,8 @@ from girder.models.folder import Folder
 from girder.models.setting import Setting
 from girder.models.upload import Upload
 from girder.models.user import User
+from girder.utility.filesystem_assetstore_adapter import FilesystemAssetstoreAdapter
+from girder.utility.progress import noProgress
 from tests import base
 
 
@@ -310,6 +315,49 @@ class HashsumDownloadTest(base.TestCase):
 
         hashsum_download.SUPPORTED_ALGORITHMS = old
 
+    def testImportedFileChanged(self):
+        old = hashsum_download.SUPPORTED_ALGORITHMS
+        hashsum_download.SUPPORTED_ALGORITHMS = {'sha512', 'sha256'}
+        importDir = tempfile.mkdtemp()
+        path = os.path.join(importDir, 'data.bin')
+        params = {'importPath': importDir, 'incremental': True}
+        adapter = FilesystemAssetstoreAdapter(self.assetstore)
+        try:
+            with open(path, 'wb') as f:
+                f.write(b'old data')
+            adapter.importData(self.privateFolder, 'folder', params, noProgress, self.user, False)
+            file = File().findOne({'name': 'data.bin'})
+            hashsum_download._computeHash(file)
+            file = File().load(file['_id'], force=True)
+            self.assertEqual(file['sha256'], self._hashSum(b'old data', 'sha256'))
+
+            # The hashes of the old data are discarded when the data changes
+            with open(path, 'wb') as f:
+                f.write(b'new data!')
+            adapter.importData(self.privateFolder, 'folder', params, noProgress, self.user, False)
+            file = File().load(file['_id'], force=True)
+            self.assertEqual(file['size'], 9)
+            self.assertNotIn('sha256', file)
+            self.assertNotIn('sha512', file)
+
+            # With auto-compute, they are computed again
+            Setting().set(hashsum_download.PluginSettings.AUTO_COMPUTE, True)
+            with open(path, 'wb') as f:
+                f.write(b'newer data')
+            adapter.importData(self.privateFolder, 'folder', params, noProgress, self.user, False)
+            start = time.time()
+            while time.time() < start + 15:
+                file = File().load(file['_id'], force=True)
+                if 'sha256' in file:
+                    break
+                time.sleep(0.2)
+            self.assertEqual(file['size'], 10)
+            self.assertEqual(file['sha256'], self._hashSum(b'newer data', 'sha256'))
+            self.assertEqual(file['sha512'], self._hashSum(b'newer data', 'sha512'))
+        finally:
+            hashsum_download.SUPPORTED_ALGORITHMS = old
+            shutil.rmtree(importDir)
+
     def testGetByHash(self):
         hashAlgorithm = 'sha512'
         publicDataHash = self._hashSum(self.userData, hashAlgorithm)
@@ -345,3 +393,25 @@ class HashsumDownloadTest(base.TestCase):
             '/file/hashsum/%s/%s' % (hashAlgorithm, privateDataHash), user=self.otherUser)
         self.assertStatusOk(resp)
         self.assertEqual(len(resp.json), 0)
+
+    def testComputeMissingHashes(self):
+        old = hashsum_download.SUPPORTED_ALGORITHMS
+        hashsum_download.SUPPORTED_ALGORITHMS = {'sha512', 'sha256', 'md5'}
+
+        # The sha512 of a file stored in a filesystem assetstore is its name,
+        # so only the other hashes require reading the files.
+        File().update({'_id': self.privateFile['_id']}, {'$unset': {'sha512': True}})
+        stats = hashsum_download._computeMissingHashes(self.assetstore, batchSize=2)
+        self.assertEqual(stats['files'], 4)
+        self.assertEqual(stats['failed'], 0)
+
+        file = File().load(self.privateFile['_id'], force=True)
+        for algorithm in ('sha512', 'sha256', 'md5'):
+            self.assertEqual(file[algorithm], self._hashSum(self.userData, algorithm))
+        file = File().load(self.privateOnlyFile['_id'], force=True)
+        self.assertEqual(file['md5'], self._hashSum(self.privateOnlyData, 'md5'))
+
+        # Running again should be a no-op
+        self.assertEqual(hashsum_download._computeMissingHashes(self.assetstore)['files'], 0)
+
+        hashsum_download.SUPPORTED_ALGORITHMS = old
@@ -50,6 +50,10 @@ setup(
     entry_points={
         'girder.plugin': [
             'hashsum_download = girder_hashsum_download:HashsumDownloadPlugin'
+        ],
+        'girder_worker_plugins': [
+            'hashsum_download = '
+            'girder_hashsum_download.girder_worker_plugin:HashsumDownloadWorkerPlugin'
         ]
     }
 )
@@ -119,6 +119,11 @@ def finalizeImportRecord(event: events.Event):
             ), status=JobStatus.ERROR)
     else:
         success = True
+        stats = event.info.get('result')
+        if isinstance(stats, dict) and 'unchanged' in stats:
+            Job().updateJob(job, '%s - Created %d, updated %d, unchanged %d, vanished %d\n' % (
+                time.strftime('%Y-%m-%d %H:%M:%S'),
+                stats['created'], stats['updated'], stats['unchanged'], stats['vanished']))
         Job().updateJob(job, '%s - Finished.  Checked %d, skipped %d\n' % (
             time.strftime('%Y-%m-%d %H:%M:%S'),
             job_info['count'], job_info['skip'],
@@ -127,7 +132,10 @@ def finalizeImportRecord(event: events.Event):
     pre_event = event.info['pre_event']
     for response in pre_event.responses:
         if isinstance(response, dict) and 'importRecord' in response:
-            AssetstoreImport().markEnded(response['importRecord'], success)
+            result = event.info.get('result')
+            AssetstoreImport().markEnded(
+                response['importRecord'], success,
+                stats=result if isinstance(result, dict) else None)
             break
 
 
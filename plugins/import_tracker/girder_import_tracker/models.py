@@ -32,11 +32,13 @@ class AssetstoreImport(Model):
         )
         return record
 
-    def markEnded(self, record, success=None):
+    def markEnded(self, record, success=None, stats=None):
         now = datetime.utcnow()
         record['ended'] = now
         if success is not None:
             record['success'] = success
+        if stats is not None:
+            record['stats'] = stats
         record = self.save(record)
         return record
 
@@ -7,6 +7,7 @@ from girder.utility.model_importer import ModelImporter
 
 from . import constants, job_rest
 from .models.job import Job
+from .models.job_log import JobLog
 
 
 def scheduleLocal(event):
@@ -34,6 +35,7 @@ class JobsPlugin(GirderPlugin):
 
     def load(self, info):
         ModelImporter.registerModel('job', Job, 'jobs')
+        ModelImporter.registerModel('job_log', JobLog, 'jobs')
         info['apiRoot'].job = job_rest.Job()
         events.bind('jobs.schedule', 'jobs', scheduleLocal)
         registerPluginStaticContent(
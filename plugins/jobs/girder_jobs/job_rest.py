@@ -1,6 +1,6 @@
 from girder.api import access
 from girder.api.describe import Description, autoDescribeRoute
-from girder.api.rest import Resource, filtermodel
+from girder.api.rest import Resource, filtermodel, pageByCursor
 from girder.constants import AccessType, SortDir
 from girder.models.user import User
 
@@ -19,6 +19,7 @@ class Job(Resource):
         self.route('POST', (), self.createJob)
         self.route('GET', ('all',), self.listAllJobs)
         self.route('GET', (':id',), self.getJob)
+        self.route('GET', (':id', 'log'), self.getJobLog)
         self.route('PUT', (':id',), self.updateJob)
         self.route('PUT', (':id', 'cancel'), self.cancelJob)
         self.route('DELETE', (':id',), self.deleteJob)
@@ -38,9 +39,9 @@ class Job(Resource):
         .jsonParam('types', 'Filter for type', requireArray=True, required=False)
         .jsonParam('statuses', 'Filter for status', requireArray=True, required=False)
         .jsonParam('handlers', 'Filter for handler', requireArray=True, required=False)
-        .pagingParams(defaultSort='created', defaultSortDir=SortDir.DESCENDING)
+        .pagingParams(defaultSort='created', defaultSortDir=SortDir.DESCENDING, cursor=True)
     )
-    def listJobs(self, userId, parentJob, types, statuses, handlers, limit, offset, sort):
+    def listJobs(self, userId, parentJob, types, statuses, handlers, limit, offset, sort, cursor):
         currentUser = self.getCurrentUser()
         if not userId:
             user = currentUser
@@ -53,6 +54,14 @@ class Job(Resource):
         if parentJob:
             parent = parentJob
 
+        if cursor is not None:
+            return pageByCursor(
+                lambda sort, filters: self._model.list(
+                    user=user, limit=limit, types=types, statuses=statuses,
+                    handlers=handlers, sort=sort, currentUser=currentUser,
+                    parentJob=parent, filters=filters),
+                cursor, limit, offset, sort)
+
         return list(self._model.list(
             user=user, offset=offset, limit=limit, types=types,
             statuses=statuses, handlers=handlers,
@@ -95,10 +104,16 @@ class Job(Resource):
         .jsonParam('types', 'Filter for type', requireArray=True, required=False)
         .jsonParam('statuses', 'Filter for status', requireArray=True, required=False)
         .jsonParam('handlers', 'Filter for handler', requireArray=True, required=False)
-        .pagingParams(defaultSort='created', defaultSortDir=SortDir.DESCENDING)
+        .pagingParams(defaultSort='created', defaultSortDir=SortDir.DESCENDING, cursor=True)
     )
-    def listAllJobs(self, types, statuses, handlers, limit, offset, sort):
+    def listAllJobs(self, types, statuses, handlers, limit, offset, sort, cursor):
         currentUser = self.getCurrentUser()
+        if cursor is not None:
+            return pageByCursor(
+                lambda sort, filters: self._model.list(
+                    user='all', limit=limit, types=types, statuses=statuses,
+                    handlers=handlers, sort=sort, currentUser=currentUser, filters=filters),
+                cursor, limit, offset, sort)
         return list(self._model.list(
             user='all', offset=offset, limit=limit, types=types,
             statuses=statuses, handlers=handlers,
@@ -113,6 +128,10 @@ class Job(Resource):
         .errorResponse('Read access was denied for the job.', 403)
     )
     def getJob(self, job):
+        self._requireReadAccess(job)
+        return job
+
+    def _requireReadAccess(self, job):
         user = self.getCurrentUser()
 
         # If the job is not public check access
@@ -122,7 +141,25 @@ class Job(Resource):
             else:
                 self.ensureTokenScopes('jobs.job_' + str(job['_id']))
 
-        return job
+    @access.public
+    @autoDescribeRoute(
+        Description('Get part of the log of a job.')
+        .notes('Positions in the log only grow as entries are appended, so '
+               'the log of a running job can be followed by passing the '
+               'returned nextOffset as the offset of the next request.  If '
+               'the log was overwritten or its oldest entries were dropped, '
+               'the returned offset is after the requested one.')
+        .modelParam('id', 'The ID of the job.', model=JobModel, force=True)
+        .param('offset', 'The position of the first log entry to return.',
+               dataType='integer', required=False, default=0)
+        .param('limit', 'The maximum number of log entries to return, or 0 for all of them.',
+               dataType='integer', required=False, default=1000)
+        .errorResponse('ID was invalid.')
+        .errorResponse('Read access was denied for the job.', 403)
+    )
+    def getJobLog(self, job, offset, limit):
+        self._requireReadAccess(job)
+        return self._model.getLog(job, offset=max(offset, 0), limit=max(limit, 0))
 
     @access.token
     @filtermodel(JobModel)
@@ -1,5 +1,6 @@
 import datetime
 
+import pymongo
 from bson import json_util
 
 from girder import events
@@ -11,6 +12,7 @@ from girder.models.user import User
 from girder.notification import Notification
 
 from ..constants import JOB_HANDLER_LOCAL, JobStatus
+from .job_log import JobLog
 
 
 class Job(AccessControlledModel):
@@ -55,7 +57,7 @@ class Job(AccessControlledModel):
             raise ValidationException('Cannot overwrite the Parent Id')
 
     def list(self, user=None, types=None, statuses=None, handlers=None,
-             limit=0, offset=0, sort=None, currentUser=None, parentJob=None):
+             limit=0, offset=0, sort=None, currentUser=None, parentJob=None, filters=None):
         """
         List a page of jobs for a given user.
 
@@ -73,16 +75,17 @@ class Job(AccessControlledModel):
         :param sort: The sort field.
         :param parentJob: Parent Job.
         :param currentUser: User for access filtering.
+        :param filters: Additional query operators.
         """
         return self.findWithPermissions(
             offset=offset, limit=limit, sort=sort, user=currentUser,
             types=types, statuses=statuses, handlers=handlers,
-            jobUser=user, parentJob=parentJob)
+            jobUser=user, parentJob=parentJob, filters=filters)
 
     def findWithPermissions(self, query=None, offset=0, limit=0, timeout=None, fields=None,
                             sort=None, user=None, level=AccessType.READ,
                             types=None, statuses=None, handlers=None,
-                            jobUser=None, parentJob=None, **kwargs):
+                            jobUser=None, parentJob=None, filters=None, **kwargs):
         """
         Search the list of jobs.
         :param query: The search query (see general MongoDB docs for "find()")
@@ -113,6 +116,9 @@ class Job(AccessControlledModel):
         :param jobUser: The user who owns the job.
         :type jobUser: dict, 'all', 'none', or None.
         :param parentJob: Parent Job.
+        :param filters: Additional query operators, applied along with the
+            query.
+        :type filters: dict
         :returns: A pymongo Cursor or CommandCursor.  If a CommandCursor, it
             has been augmented with a count function.
         """
@@ -135,6 +141,8 @@ class Job(AccessControlledModel):
                 query['handler'] = {'$in': handlers}
             if parentJob:
                 query['parentId'] = parentJob['_id']
+        if filters:
+            query = {'$and': [query, filters]}
         return super().findWithPermissions(
             query, offset=offset, limit=limit, timeout=timeout, fields=fields,
             sort=sort, user=user, level=level, **kwargs)
@@ -243,6 +251,7 @@ class Job(AccessControlledModel):
             'status': JobStatus.INACTIVE,
             'progress': None,
             'log': [],
+            'logLength': 0,
             'meta': {},
             'handler': handler,
             'asynchronous': asynchronous,
@@ -283,11 +292,20 @@ class Job(AccessControlledModel):
         job['kwargs'] = json_util.loads(job['kwargs'])
         return job
 
+    def remove(self, job, *args, **kwargs):
+        """
+        Extends remove to also delete the log of the job.
+        """
+        JobLog().truncate(job)
+        return super().remove(job, *args, **kwargs)
+
     def find(self, *args, **kwargs):
         """
         Overrides the default find behavior to exclude the log by default.
 
         :param includeLog: Whether to include the log field in the documents.
+            This is only the part of the log that was stored in the job
+            document itself; use ``load`` or ``getLog`` for the full log.
         :type includeLog: bool
         """
         kwargs['fields'] = self._computeFields(kwargs)
@@ -306,12 +324,60 @@ class Job(AccessControlledModel):
 
         if job and isinstance(job.get('kwargs'), str):
             job['kwargs'] = json_util.loads(job['kwargs'])
-        if job and isinstance(job.get('log'), str):
+        if job and 'log' in job:
+            job['log'] = self._legacyLog(job) + [
+                entry['text'] for entry in JobLog().entries(job)]
+
+        return job
+
+    def _legacyLog(self, job):
+        """
+        Get the part of a job's log that is stored in the job document.  Jobs
+        created before log entries were stored separately may have a list of
+        entries, or even a single string, here.
+        """
+        log = job.get('log') or []
+        if isinstance(log, str):
             # Legacy support: log used to be just a string, but we want to
             # consistently return a list of strings now.
-            job['log'] = [job['log']]
+            log = [log]
+        return log
 
-        return job
+    def getLog(self, job, offset=0, limit=0):
+        """
+        Get part of the log of a job.  Positions in the log only grow as
+        entries are appended, so a client can follow a running job by asking
+        for the entries after the last ones it received.  When a log is
+        overwritten or its oldest entries are dropped, the first returned
+        entry may be after the requested offset.
+
+        :param job: The job document.
+        :param offset: The position of the first entry to return.
+        :type offset: int
+        :param limit: The maximum number of entries to return; 0 for no limit.
+        :type limit: int
+        :returns: a dictionary with ``log``, the list of entries, ``offset``,
+            the position of the first entry, and ``nextOffset``, the position
+            to ask for to get the entries that follow.
+        """
+        # Entries stored in the job document come first; the sequence number
+        # of each other entry is its position.
+        legacy = self._legacyLog(
+            self.collection.find_one({'_id': job['_id']}, {'log': True}) or {})
+        log = legacy[offset:offset + limit] if limit else legacy[offset:]
+        start = offset if log else None
+        nextOffset = offset + len(log)
+        if not limit or len(log) < limit:
+            for entry in JobLog().entries(job, offset, limit - len(log) if limit else 0):
+                if start is None:
+                    start = entry['seq']
+                log.append(entry['text'])
+                nextOffset = entry['seq'] + 1
+        return {
+            'log': log,
+            'offset': offset if start is None else start,
+            'nextOffset': nextOffset
+        }
 
     def scheduleJob(self, job):
         """
@@ -378,7 +444,8 @@ class Job(AccessControlledModel):
 
         updates = {
             '$push': {},
-            '$set': {}
+            '$set': {},
+            '$inc': {}
         }
 
         statusChanged = False
@@ -400,20 +467,14 @@ class Job(AccessControlledModel):
             job[k] = v
             updates['$set'][k] = v
 
-        if updates['$set'] or updates['$push']:
-            if not updates['$push']:
-                del updates['$push']
+        if updates['$set'] or updates['$push'] or updates['$inc']:
+            for op in ('$push', '$inc'):
+                if not updates[op]:
+                    del updates[op]
             job['updated'] = now
             updates['$set']['updated'] = now
 
-            updateResult = self.update(query, update=updates, multi=False)
-            # If our query didn't match anything then our state transition
-            # was not valid. So raise an exception
-            if updateResult.matched_count != 1:
-                job = self.load(job['_id'], force=True)
-                msg = "Invalid state transition to '%s', Current state is '%s'." % (
-                    status, job['status'])
-                raise ValidationException(msg, field='status')
+            self._applyUpdate(job, query, updates, status, log, overwrite)
 
             events.trigger('jobs.job.update.after', {
                 'job': job
@@ -425,19 +486,41 @@ class Job(AccessControlledModel):
 
         return job
 
+    def _applyUpdate(self, job, query, updates, status, log, overwrite):
+        """Helper for writing a job update and the log entry it adds, if any."""
+        if '$inc' in updates:
+            # The log entry is stored once the update has allocated its
+            # position in the log
+            updated = self.collection.find_one_and_update(
+                query, updates, projection={'logLength': True},
+                return_document=pymongo.ReturnDocument.AFTER)
+        else:
+            updated = self.update(query, update=updates, multi=False).matched_count == 1
+        # If our query didn't match anything then our state transition
+        # was not valid. So raise an exception
+        if not updated:
+            job = self.load(job['_id'], force=True)
+            msg = "Invalid state transition to '%s', Current state is '%s'." % (
+                status, job['status'])
+            raise ValidationException(msg, field='status')
+        if '$inc' in updates:
+            job['logLength'] = updated['logLength']
+            seq = updated['logLength'] - 1
+            JobLog().append(job, seq, log)
+            if overwrite:
+                JobLog().truncate(job, seq)
+
     def _updateLog(self, job, log, overwrite, now, notify, user, updates):
         """Helper for updating a job's log."""
+        # Entries are stored in the job log collection; the job document
+        # only keeps count of them.  Entries from before that are kept in the
+        # job document until the log is overwritten.
         if overwrite:
-            updates['$set']['log'] = [log]
-        elif log:
-            # This crudely assumes that the log messages size are vaguely
-            # similar and keeps only the end of the log as it grows large.  It
-            # can be wrong for a variety of reasons, but is better than not
-            # truncating it.
-            if not len(updates['$push']):
-                updates['$push']['log'] = {'$each': [log], '$slice': -((4 * 1024 ** 2) // len(log))}
-            else:
-                updates['$push']['log'] = log
+            updates['$set']['log'] = []
+        if overwrite or log:
+            if 'logLength' not in job:
+                self._countLegacyLog(job)
+            updates['$inc']['logLength'] = 1
         if notify and user:
             Notification(
                 type='job_log', data={
@@ -446,6 +529,19 @@ class Job(AccessControlledModel):
                     'text': log
                 }, user=user).flush()
 
+    def _countLegacyLog(self, job):
+        """
+        Start counting the entries of the log of a job that was created before
+        they were stored separately from the job document.  The entries stored
+        in the job document keep their positions, so the positions of later
+        entries follow them, even after the log is overwritten.
+        """
+        query = {'_id': job['_id'], 'logLength': {'$exists': False}}
+        doc = self.collection.find_one(query, {'log': True})
+        if doc is not None:
+            self.collection.update_one(
+                query, {'$set': {'logLength': len(self._legacyLog(doc))}})
+
     def _createUpdateStatusNotification(self, now, user, job):
         filtered = self.filter(job, user)
         filtered.pop('kwargs', None)
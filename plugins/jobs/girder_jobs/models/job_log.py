@@ -0,0 +1,81 @@
+import datetime
+import os
+
+import pymongo
+
+from girder.constants import SortDir
+from girder.models.model_base import Model
+
+#: The number of log entries kept for each job; older entries are dropped as
+#: new ones are appended.  0 keeps every entry.
+MAX_ENTRIES = int(os.environ.get('GIRDER_JOB_LOG_MAX_ENTRIES', 10000))
+# How often, in appended entries, a job's log is trimmed to MAX_ENTRIES
+_TRIM_INTERVAL = 100
+
+
+class JobLog(Model):
+    """
+    Job log entries are stored here, one document per appended message, rather
+    than in a list in the job document.  Appending is then a small insert
+    instead of a rewrite of an ever larger job document, and a log can be read
+    from any position without loading all of it.  Entries are ordered by a
+    sequence number that is allocated from the job's ``logLength`` field.
+    """
+
+    def initialize(self):
+        self.name = 'job_log'
+        self.ensureIndices([
+            ((('jobId', SortDir.ASCENDING), ('seq', SortDir.ASCENDING)), {'unique': True}),
+        ])
+
+    def validate(self, doc):
+        return doc
+
+    def append(self, job, seq, text):
+        """
+        Add an entry to the log of a job.
+
+        :param job: The job document.
+        :param seq: The sequence number of the entry, unique within the job.
+        :type seq: int
+        :param text: The message.
+        :type text: str
+        """
+        self.collection.insert_one({
+            'jobId': job['_id'],
+            'seq': seq,
+            'text': text,
+            'created': datetime.datetime.now(datetime.timezone.utc)
+        })
+        if MAX_ENTRIES and seq >= MAX_ENTRIES and not seq % _TRIM_INTERVAL:
+            self.truncate(job, seq - MAX_ENTRIES + 1)
+
+    def truncate(self, job, seq=None):
+        """
+        Remove entries from the log of a job.
+
+        :param job: The job document.
+        :param seq: Entries before this sequence number are removed.  If None,
+            all entries are removed.
+        :type seq: int or None
+        """
+        query = {'jobId': job['_id']}
+        if seq is not None:
+            query['seq'] = {'$lt': seq}
+        self.collection.delete_many(query)
+
+    def entries(self, job, seq=0, limit=0):
+        """
+        Get the entries of the log of a job in order.
+
+        :param job: The job document.
+        :param seq: The first sequence number to return.
+        :type seq: int
+        :param limit: The maximum number of entries to return; 0 for no limit.
+        :type limit: int
+        :returns: a cursor of entries with ``seq`` and ``text`` fields.
+        """
+        return self.collection.find(
+            {'jobId': job['_id'], 'seq': {'$gte': seq}},
+            projection={'_id': False, 'seq': True, 'text': True},
+            sort=[('seq', pymongo.ASCENDING)], limit=limit)
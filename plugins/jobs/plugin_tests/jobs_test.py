@@ -4,6 +4,7 @@ import time
 from bson import json_util
 from girder_jobs.constants import REST_CREATE_JOB_TOKEN_SCOPE, JobStatus
 from girder_jobs.models.job import Job
+from girder_jobs.models.job_log import JobLog
 
 from girder import events
 from girder.constants import AccessType
@@ -130,6 +131,54 @@ class JobsTestCase(base.TestCase):
         job = self.jobModel.load(job['_id'], force=True, includeLog=True)
         self.assertEqual(job['log'], ['legacy log'])
 
+    def testJobLog(self):
+        job = self.jobModel.createJob(title='log', type='t', user=self.users[1])
+        # Entries from before the log was stored separately come first
+        self.jobModel.update({'_id': job['_id']}, {
+            '$set': {'log': ['legacy\n']}, '$unset': {'logLength': True}})
+        job = self.jobModel.load(job['_id'], force=True)
+        for n in range(3):
+            job = self.jobModel.updateJob(job, log='entry %d\n' % n)
+        # Empty appends don't add entries
+        job = self.jobModel.updateJob(job, log='')
+
+        job = self.jobModel.load(job['_id'], force=True, includeLog=True)
+        self.assertEqual(job['log'], ['legacy\n', 'entry 0\n', 'entry 1\n', 'entry 2\n'])
+
+        path = '/job/%s/log' % job['_id']
+        resp = self.request(path, user=self.users[2])
+        self.assertStatus(resp, 403)
+        resp = self.request(path, user=self.users[1], params={'limit': 2})
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json, {
+            'log': ['legacy\n', 'entry 0\n'], 'offset': 0, 'nextOffset': 2})
+        resp = self.request(path, user=self.users[1], params={'offset': 2})
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json, {
+            'log': ['entry 1\n', 'entry 2\n'], 'offset': 2, 'nextOffset': 4})
+
+        # A client following the log only gets the new entries
+        job = self.jobModel.updateJob(job, log='entry 3\n')
+        token = self.jobModel.createJobToken(job)
+        resp = self.request(path, params={'offset': 4, 'token': token['_id']})
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json, {'log': ['entry 3\n'], 'offset': 4, 'nextOffset': 5})
+        resp = self.request(path, params={'offset': 5, 'token': token['_id']})
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json, {'log': [], 'offset': 5, 'nextOffset': 5})
+
+        # Overwriting replaces the whole log; positions keep growing
+        job = self.jobModel.updateJob(job, log='overwritten\n', overwrite=True)
+        resp = self.request(path, user=self.users[1])
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json, {'log': ['overwritten\n'], 'offset': 5, 'nextOffset': 6})
+        self.assertGreaterEqual(resp.json['offset'], 5)
+        self.assertEqual(JobLog().collection.count_documents({'jobId': job['_id']}), 1)
+
+        # Removing the job removes its log
+        self.jobModel.remove(job)
+        self.assertEqual(JobLog().collection.count_documents({'jobId': job['_id']}), 0)
+
     def testListJobs(self):
         job = self.jobModel.createJob(title='A job', type='t', user=self.users[1], public=False)
         anonJob = self.jobModel.createJob(title='Anon job', type='t')
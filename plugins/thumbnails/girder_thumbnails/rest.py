@@ -16,6 +16,7 @@ class Thumbnail(Resource):
         super().__init__()
         self.resourceName = 'thumbnail'
         self.route('POST', (), self.createThumbnail)
+        self.route('POST', ('batch',), self.createThumbnails)
 
     @access.user
     @filtermodel(model=Job)
@@ -51,3 +52,49 @@ class Thumbnail(Resource):
             raise RestException('You must specify a valid width, height, or both.')
 
         return utils.scheduleThumbnailJob(file, attachToType, attachToId, user, width, height, crop)
+
+    @access.user
+    @filtermodel(model=Job)
+    @autoDescribeRoute(
+        Description('Create thumbnails from many existing image files in a single job.')
+        .notes('Each thumbnail is an object with the fileId, attachToId, and '
+               'attachToType fields and the optional width, height, and crop '
+               'fields of the single thumbnail endpoint.')
+        .jsonParam('thumbnails', 'A JSON list of the thumbnails to create.',
+                   paramType='body', requireArray=True)
+        .errorResponse()
+        .errorResponse(('Write access was denied on an attach destination.',
+                        'Read access was denied on a file.'), 403)
+    )
+    def createThumbnails(self, thumbnails):
+        user = self.getCurrentUser()
+
+        specs = []
+        for thumbnail in thumbnails:
+            if not isinstance(thumbnail, dict):
+                raise RestException('Each thumbnail must be a JSON object.')
+            try:
+                width = max(int(thumbnail.get('width', 0)), 0)
+                height = max(int(thumbnail.get('height', 0)), 0)
+                fileId = thumbnail['fileId']
+                attachToId = thumbnail['attachToId']
+                attachToType = thumbnail['attachToType']
+            except (KeyError, TypeError, ValueError):
+                raise RestException(
+                    'Each thumbnail must have a fileId, attachToId, and attachToType, and '
+                    'integer width and height.')
+            if attachToType not in ('folder', 'user', 'collection', 'item'):
+                raise RestException('Invalid attachToType: %s.' % attachToType)
+            if not width and not height:
+                raise RestException('You must specify a valid width, height, or both.')
+
+            file = File().load(fileId, user=user, level=AccessType.READ, exc=True)
+            ModelImporter.model(attachToType).load(
+                attachToId, user=user, level=AccessType.WRITE, exc=True)
+            specs.append({
+                'file': file, 'attachToType': attachToType, 'attachToId': attachToId,
+                'width': width, 'height': height, 'crop': bool(thumbnail.get('crop', True))})
+
+        if not specs:
+            raise RestException('No thumbnails were requested.')
+        return utils.scheduleThumbnailsJob(specs, user)
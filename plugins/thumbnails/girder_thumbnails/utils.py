@@ -17,3 +17,31 @@ def scheduleThumbnailJob(file, attachToType, attachToId, user, width=0, height=0
         })
     Job().scheduleJob(job)
     return job
+
+
+def scheduleThumbnailsJob(thumbnails, user):
+    """
+    Schedule a single local job that creates many thumbnails and return it.
+
+    :param thumbnails: The thumbnails to create.  Each is a dict with the
+        ``file`` to create it from, the ``attachToType`` and ``attachToId`` of
+        the resource to attach it to, and optionally ``width``, ``height``,
+        and ``crop``.
+    :type thumbnails: list[dict]
+    :param user: The user creating the thumbnails.
+    :type user: dict
+    """
+    job = Job().createLocalJob(
+        title='Generate %d thumbnails' % len(thumbnails), user=user, type='thumbnails.create',
+        public=False, module='girder_thumbnails.worker', kwargs={
+            'thumbnails': [{
+                'fileId': str(spec['file']['_id']),
+                'width': spec.get('width', 0),
+                'height': spec.get('height', 0),
+                'crop': spec.get('crop', True),
+                'attachToType': spec['attachToType'],
+                'attachToId': str(spec['attachToId'])
+            } for spec in thumbnails]
+        })
+    Job().scheduleJob(job)
+    return job
@@ -1,5 +1,6 @@
 import functools
 import io
+import os
 import sys
 import traceback
 
@@ -8,29 +9,102 @@ import pydicom
 from bson.objectid import ObjectId
 from girder_jobs.constants import JobStatus
 from girder_jobs.models.job import Job
-from PIL import Image
+from PIL import Image, ImageMode
 
 from girder import events
 from girder.models.file import File
 from girder.models.upload import Upload
 from girder.utility.model_importer import ModelImporter
 
+# The largest image, in pixels, that will be decoded to create a thumbnail.
+# JPEG images are decoded at the smallest scale that is still at least the
+# size of the thumbnail, so this applies to the reduced size.
+MAX_PIXELS = int(os.environ.get('GIRDER_THUMBNAIL_MAX_PIXELS', 16384 * 16384))
+# The most memory, in bytes, that the decoded pixels of an image may use.
+MAX_BYTES = int(os.environ.get('GIRDER_THUMBNAIL_MAX_BYTES', 1024 ** 3))
+# Source files are read through a buffer of this size.
+_READ_CHUNK = 1024 * 1024
+
 
 def run(job):
     jobModel = Job()
     jobModel.updateJob(job, status=JobStatus.RUNNING)
 
+    if 'thumbnails' in job['kwargs']:
+        return _runBatch(job)
+
     try:
         newFile = createThumbnail(**job['kwargs'])
         log = 'Created thumbnail file %s.' % newFile['_id']
         jobModel.updateJob(job, status=JobStatus.SUCCESS, log=log)
     except Exception:
-        t, val, tb = sys.exc_info()
-        log = '%s: %s\n%s' % (t.__name__, repr(val), traceback.extract_tb(tb))
-        jobModel.updateJob(job, status=JobStatus.ERROR, log=log)
+        jobModel.updateJob(job, status=JobStatus.ERROR, log=_formatException())
         raise
 
 
+def _runBatch(job):
+    """
+    Create each of the thumbnails of a batch job.  A thumbnail that fails is
+    logged and the rest are still created; the job errors if any failed.
+    """
+    jobModel = Job()
+    specs = job['kwargs']['thumbnails']
+    failed = 0
+    for index, spec in enumerate(specs):
+        try:
+            newFile = createThumbnail(**spec)
+            log = 'Created thumbnail file %s from file %s.\n' % (newFile['_id'], spec['fileId'])
+        except Exception:
+            failed += 1
+            log = 'Failed to create a thumbnail from file %s.\n%s\n' % (
+                spec['fileId'], _formatException())
+        job = jobModel.updateJob(
+            job, log=log, progressTotal=len(specs), progressCurrent=index + 1,
+            progressMessage='Created %d of %d thumbnails' % (index + 1 - failed, len(specs)))
+    jobModel.updateJob(job, status=JobStatus.ERROR if failed else JobStatus.SUCCESS)
+
+
+def _formatException():
+    t, val, tb = sys.exc_info()
+    return '%s: %s\n%s' % (t.__name__, repr(val), traceback.extract_tb(tb))
+
+
+class _FileReader(io.RawIOBase):
+    """
+    Adapts a Girder file handle to a raw stream, so that it can be buffered
+    and so that large reads are made in chunks that the file handle allows.
+
+    :param handle: The file handle returned by ``File().open``.
+    :type handle: girder.utility.abstract_assetstore_adapter.FileHandle
+    """
+
+    def __init__(self, handle):
+        self._handle = handle
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        length = 0
+        while length < len(buffer):
+            data = self._handle.read(min(len(buffer) - length, _READ_CHUNK))
+            if not data:
+                break
+            buffer[length:length + len(data)] = data
+            length += len(data)
+        return length
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._handle.seek(offset, whence)
+        return self._handle.tell()
+
+    def tell(self):
+        return self._handle.tell()
+
+
 def createThumbnail(width, height, crop, fileId, attachToType, attachToId):
     """
     Creates the thumbnail. Validation and access control must be done prior
@@ -60,22 +134,16 @@ def createThumbnail(width, height, crop, fileId, attachToType, attachToId):
             return newFile
         else:
             file = newFile
-            streamFn = functools.partial(
-                fileModel.download, file, headers=False)
 
     if 'assetstoreId' not in file:
         # TODO we could thumbnail link files if we really wanted.
         raise Exception('File %s has no assetstore.' % fileId)
 
-    stream = streamFn()
-    data = b''.join(stream())
-
-    image = _getImage(file['mimeType'], file['exts'], data)
+    with fileModel.open(file) as handle:
+        image = _getImage(file['mimeType'], file['exts'], _FileReader(handle), width, height)
 
-    if not width:
-        width = int(height * image.size[0] / image.size[1])
-    elif not height:
-        height = int(width * image.size[1] / image.size[0])
+    if not width or not height:
+        width, height = _thumbnailSize(image.size, width, height)
     elif crop:
         x1 = y1 = 0
         x2, y2 = image.size
@@ -144,30 +212,94 @@ def attachThumbnail(file, thumbnail, attachToType, attachToId, width, height):
     return File().save(thumbnail)
 
 
-def _getImage(mimeType, extension, data):
+def _thumbnailSize(size, width, height):
     """
-    Check extension of image and opens it.
+    Fill in a thumbnail dimension of 0 so that the aspect ratio of the source
+    image is preserved.
+
+    :param size: The width and height of the source image.
+    :type size: tuple
+    :returns: The thumbnail width and height.
+    """
+    if not width:
+        width = int(height * size[0] / size[1])
+    elif not height:
+        height = int(width * size[1] / size[0])
+    return width, height
+
+
+def _checkBudget(width, height, bytesPerPixel):
+    """
+    Raise if decoding an image of this size would exceed :data:`MAX_PIXELS`
+    or :data:`MAX_BYTES`.
+    """
+    if width * height > MAX_PIXELS:
+        raise Exception('Image of %dx%d pixels exceeds the thumbnail limit of %d pixels.' % (
+            width, height, MAX_PIXELS))
+    if width * height * bytesPerPixel > MAX_BYTES:
+        raise Exception('Decoding a %dx%d image would exceed the thumbnail limit of %d bytes.' % (
+            width, height, MAX_BYTES))
+
+
+def _getImage(mimeType, extension, stream, width=0, height=0):
+    """
+    Check extension of image and opens it.  Images are decoded at the
+    smallest resolution the format allows that is still at least the size of
+    the thumbnail.
 
     :param extension: The extension of the image that needs to be opened.
-    :param data: The image file stream.
+    :param stream: A seekable, unbuffered stream of the image file.
+    :param width: The thumbnail width, or 0 to preserve the aspect ratio.
+    :type width: int
+    :param height: The thumbnail height, or 0 to preserve the aspect ratio.
+    :type height: int
     """
     if (extension and extension[-1] == 'dcm') or mimeType == 'application/dicom':
         # Open the dicom image
-        dicomData = pydicom.dcmread(io.BytesIO(data))
-        return scaleDicomLevels(dicomData)
+        return _getDicomImage(stream)
+
+    # Open other types of images; this only reads the header
+    image = Image.open(io.BufferedReader(stream, _READ_CHUNK))
+    if image.format == 'JPEG':
+        image.draft(None, _thumbnailSize(image.size, width, height))
+    mode = ImageMode.getmode(image.mode)
+    _checkBudget(image.size[0], image.size[1], len(mode.bands) * int(mode.typestr[-1]))
+    image.load()
+    return image
+
+
+def _getDicomImage(stream):
+    """
+    Decode the first frame of a dicom image.
+
+    :param stream: A seekable stream of the dicom file.
+    """
+    header = pydicom.dcmread(stream, stop_before_pixels=True)
+    bytesPerPixel = header.get('SamplesPerPixel', 1) * (header.BitsAllocated + 7) // 8
+    stream.seek(0)
+    if hasattr(pydicom, 'pixels'):
+        # Only the first frame is read
+        _checkBudget(header.Columns, header.Rows, bytesPerPixel)
+        pixels = pydicom.pixels.pixel_array(stream, index=0)
     else:
-        # Open other types of images
-        return Image.open(io.BytesIO(data))
+        frames = int(header.get('NumberOfFrames', 1))
+        _checkBudget(header.Columns, header.Rows, bytesPerPixel * frames)
+        pixels = pydicom.dcmread(stream).pixel_array
+    return scaleDicomLevels(header, pixels)
 
 
-def scaleDicomLevels(dicomData):
+def scaleDicomLevels(dicomData, imageData=None):
     """
     Adjust dicom levels so image is viewable.
 
     :param dicomData: The image data to be processed.
+    :param imageData: The pixels of the image, if they have already been
+        decoded from ``dicomData``.
+    :type imageData: numpy.ndarray
     """
     offset = dicomData.RescaleIntercept
-    imageData = dicomData.pixel_array
+    if imageData is None:
+        imageData = dicomData.pixel_array
     if len(imageData.shape) == 3:
         minimum = imageData[0].min() + offset
         maximum = imageData[0].max() + offset
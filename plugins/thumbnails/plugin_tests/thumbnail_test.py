@@ -351,3 +351,66 @@ class ThumbnailsTestCase(base.TestCase):
         file = File().load(item['_thumbnails'][0], force=True)
         with File().open(file) as fh:
             self.assertEqual(fh.read(2), b'\xff\xd8')  # jpeg magic number
+
+    def testBatchThumbnailCreation(self):
+        # A large JPEG is decoded at a reduced resolution
+        out = io.BytesIO()
+        Image.new('RGB', (4000, 2000), (255, 0, 0)).save(out, 'JPEG')
+        jpeg = Upload().uploadFromFile(
+            io.BytesIO(out.getvalue()), size=len(out.getvalue()), name='big.jpg',
+            parentType='folder', parent=self.publicFolder, user=self.admin,
+            mimeType='image/jpeg')
+        png = Upload().uploadFromFile(
+            io.BytesIO(self.image), size=len(self.image), name='test.png',
+            parentType='folder', parent=self.publicFolder, user=self.admin,
+            mimeType='image/png')
+
+        thumbnails = [{
+            'fileId': str(jpeg['_id']),
+            'width': 64,
+            'attachToId': str(jpeg['itemId']),
+            'attachToType': 'item'
+        }, {
+            'fileId': str(png['_id']),
+            'width': 64,
+            'height': 32,
+            'attachToId': str(png['itemId']),
+            'attachToType': 'item'
+        }]
+
+        # Write access is required on each attach destination
+        resp = self.request(
+            path='/thumbnail/batch', method='POST', user=self.user,
+            body=json.dumps(thumbnails), type='application/json')
+        self.assertStatus(resp, 403)
+
+        resp = self.request(
+            path='/thumbnail/batch', method='POST', user=self.admin,
+            body=json.dumps(thumbnails), type='application/json')
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json['status'], JobStatus.SUCCESS)
+
+        for file, size in ((jpeg, (64, 32)), (png, (64, 32))):
+            item = Item().load(file['itemId'], force=True)
+            self.assertEqual(len(item['_thumbnails']), 1)
+            thumbnail = File().load(item['_thumbnails'][0], force=True)
+            self.assertEqual(thumbnail['derivedFrom']['id'], file['_id'])
+            with File().open(thumbnail) as fh:
+                self.assertEqual(Image.open(fh).size, size)
+
+        # Images over the pixel budget fail without stopping the batch
+        from girder_thumbnails import worker
+
+        maxPixels = worker.MAX_PIXELS
+        worker.MAX_PIXELS = 1000 * 1000
+        try:
+            resp = self.request(
+                path='/thumbnail/batch', method='POST', user=self.admin,
+                body=json.dumps([dict(thumbnails[0], width=2000), thumbnails[1]]),
+                type='application/json')
+        finally:
+            worker.MAX_PIXELS = maxPixels
+        self.assertStatusOk(resp)
+        self.assertEqual(resp.json['status'], JobStatus.ERROR)
+        self.assertEqual(len(Item().load(jpeg['itemId'], force=True)['_thumbnails']), 1)
+        self.assertEqual(len(Item().load(png['itemId'], force=True)['_thumbnails']), 2)
@@ -0,0 +1,82 @@
+r"""
+Compare the throughput and latency of Girder servers, e.g. an ASGI server that
+serves the hot REST routes natively and one that sends everything through the
+WSGI bridge.  Start the two servers on different ports, for instance::
+
+    uvicorn girder.asgi:app --port 8080 --workers 1
+    GIRDER_ASGI_NATIVE_ROUTES=true uvicorn girder.asgi:app --port 8081 --workers 1
+
+and then run::
+
+    python scripts/asgi_benchmark.py --token <token> \
+        --server bridge=http://127.0.0.1:8080 --server native=http://127.0.0.1:8081 \
+        --path '/api/v1/item?folderId=<id>' --path /api/v1/file/<id>/download
+
+Each path is requested the same number of times from each server, and the
+requests per second along with the median and 99th percentile latencies are
+reported.
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def benchmark(url, headers, count, concurrency):
+    """
+    Request a URL repeatedly.
+
+    :returns: the requests per second and the sorted request latencies in seconds.
+    """
+    local = threading.local()
+
+    def fetch(_):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        session = local.session
+        start = time.perf_counter()
+        with session.get(url, headers=headers, stream=True) as resp:
+            resp.raise_for_status()
+            for _chunk in resp.iter_content(1024 * 1024):
+                pass
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        # Warm up connections and caches
+        list(pool.map(fetch, range(concurrency)))
+        start = time.perf_counter()
+        latencies = sorted(pool.map(fetch, range(count)))
+        elapsed = time.perf_counter() - start
+    return count / elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument(
+        '--server', action='append', required=True, metavar='NAME=URL',
+        help='a server to benchmark, may be repeated')
+    parser.add_argument(
+        '--path', action='append', required=True,
+        help='a path, including the query string, to request; may be repeated')
+    parser.add_argument('--token', help='a Girder token to authenticate the requests with')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per path')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent requests')
+    args = parser.parse_args()
+
+    headers = {'Girder-Token': args.token} if args.token else {}
+    print('%-10s %-50s %10s %10s %10s' % ('server', 'path', 'req/s', 'p50 ms', 'p99 ms'))
+    for path in args.path:
+        for server in args.server:
+            name, url = server.split('=', 1)
+            rate, latencies = benchmark(
+                url.rstrip('/') + path, headers, args.requests, args.concurrency)
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print('%-10s %-50s %10.1f %10.2f %10.2f' % (
+                name, path[:50], rate, statistics.median(latencies) * 1000, p99 * 1000))
+
+
+if __name__ == '__main__':
+    main()
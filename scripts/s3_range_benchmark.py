@@ -0,0 +1,99 @@
+r"""
+Compare how quickly random small ranges of a file in an S3 assetstore are
+read through the server when each read connects to S3 and presigns its own
+URL and when reads share pooled connections and presigned URLs.  By default,
+this runs a local moto server as a stand-in for S3; an S3-compatible service
+such as MinIO may be used instead::
+
+    python scripts/s3_range_benchmark.py --reads 2000 --read-size 4096 \
+        --pool 0 --pool 16
+
+    python scripts/s3_range_benchmark.py --endpoint http://127.0.0.1:9000 \
+        --bucket bench --access-key minioadmin --secret minioadmin
+
+The reads per second and the mean latency of a read are reported for each
+pool size; a pool size of 0 is the unpooled behavior.
+"""
+import argparse
+import random
+import socket
+import time
+
+import boto3
+
+from girder.utility import s3_assetstore_adapter
+
+
+def benchmark(assetstore, file, reads, readSize, pool, seed=0):
+    """
+    Read random ranges of a file.
+
+    :returns: the seconds it took to make all of the reads.
+    """
+    s3_assetstore_adapter.DOWNLOAD_POOL_SIZE = pool
+    s3_assetstore_adapter._connections.clear()
+    rand = random.Random(seed)
+    start = time.perf_counter()
+    for _ in range(reads):
+        # Each seek of a file handle starts a new download like this one
+        adapter = s3_assetstore_adapter.S3AssetstoreAdapter(assetstore)
+        offset = rand.randrange(0, file['size'] - readSize)
+        stream = adapter.downloadFile(
+            file, offset=offset, endByte=offset + readSize, headers=False)
+        data = b''.join(stream())
+        if len(data) != readSize:
+            raise Exception('Read %d bytes instead of %d' % (len(data), readSize))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--endpoint', help='an S3 endpoint to use instead of a local moto server')
+    parser.add_argument('--bucket', default='benchmark')
+    parser.add_argument('--access-key', default='access')
+    parser.add_argument('--secret', default='secret')
+    parser.add_argument('--size', type=int, default=64 * 1024 * 1024,
+                        help='the size of the file to read from')
+    parser.add_argument('--reads', type=int, default=1000, help='the number of reads')
+    parser.add_argument('--read-size', type=int, default=4096, help='the size of each read')
+    parser.add_argument(
+        '--pool', type=int, action='append',
+        help='the connection pool size, may be repeated (default: 0 and 16)')
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if not endpoint:
+        from moto.server import ThreadedMotoServer
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+        server.start()
+        endpoint = 'http://127.0.0.1:%d' % port
+    try:
+        client = boto3.client(
+            's3', endpoint_url=endpoint, region_name='us-east-1',
+            aws_access_key_id=args.access_key, aws_secret_access_key=args.secret)
+        if server:
+            client.create_bucket(Bucket=args.bucket)
+        client.put_object(Bucket=args.bucket, Key='range_benchmark', Body=bytes(args.size))
+
+        assetstore = {
+            '_id': 'benchmark', 'type': 2, 'bucket': args.bucket, 'prefix': '',
+            'accessKeyId': args.access_key, 'secret': args.secret, 'service': endpoint,
+            'region': 'us-east-1'}
+        file = {'name': 'range_benchmark', 's3Key': 'range_benchmark', 'size': args.size}
+        print('%6s %10s %10s %12s' % ('pool', 'seconds', 'reads/s', 'ms/read'))
+        for pool in args.pool or [0, 16]:
+            elapsed = benchmark(assetstore, file, args.reads, args.read_size, pool)
+            print('%6d %10.2f %10.1f %12.2f' % (
+                pool, elapsed, args.reads / elapsed, elapsed / args.reads * 1000))
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+r"""
+Compare how quickly a streaming zip archive of many small files is produced
+when each file is read as it is written and when the next files are read
+ahead on a pool of threads.  By default, this creates a folder of 10000 small
+files; a per-file latency can be added to mimic assetstores such as S3, where
+each file is a new request::
+
+    python scripts/zip_benchmark.py --files 10000 --size 4096 --latency 20 \
+        --prefetch 0 --prefetch 8 --prefetch 32 --compress
+
+The archive size and the files and megabytes per second are reported for
+each prefetch setting.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from girder.utility import ziputil
+
+
+def makeFiles(path, count, size):
+    for i in range(count):
+        with open(os.path.join(path, 'file%05d.bin' % i), 'wb') as f:
+            f.write(os.urandom(size // 2) + b'\0' * (size - size // 2))
+
+
+def fileList(path, latency):
+    def reader(filePath):
+        def stream():
+            time.sleep(latency)
+            with open(filePath, 'rb') as f:
+                while True:
+                    data = f.read(65536)
+                    if not data:
+                        break
+                    yield data
+        return stream
+
+    for name in sorted(os.listdir(path)):
+        yield name, reader(os.path.join(path, name))
+
+
+def benchmark(path, prefetch, compression, latency):
+    """
+    Produce an archive of all of the files in a directory.
+
+    :returns: the size of the archive and the seconds it took to produce.
+    """
+    start = time.perf_counter()
+    zip = ziputil.ZipGenerator('benchmark', compression=compression)
+    size = 0
+    for data in zip.addFiles(fileList(path, latency), prefetch=prefetch):
+        size += len(data)
+    size += len(zip.footer())
+    return size, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--dir', help='a directory of files to archive instead of creating one')
+    parser.add_argument('--files', type=int, default=10000, help='the number of files to create')
+    parser.add_argument('--size', type=int, default=4096, help='the size of the files to create')
+    parser.add_argument(
+        '--latency', type=float, default=0, help='milliseconds to wait before reading each file')
+    parser.add_argument(
+        '--prefetch', type=int, action='append',
+        help='the number of files to read ahead, may be repeated (default: 0 and 8)')
+    parser.add_argument('--compress', action='store_true', help='deflate the archive')
+    args = parser.parse_args()
+
+    compression = ziputil.DEFLATE if args.compress else ziputil.STORE
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.dir
+        if not path:
+            path = tmp
+            makeFiles(path, args.files, args.size)
+        count = len(os.listdir(path))
+        print('%10s %14s %10s %10s %10s' % ('prefetch', 'bytes', 'seconds', 'files/s', 'MB/s'))
+        for prefetch in args.prefetch or [0, 8]:
+            size, elapsed = benchmark(path, prefetch, compression, args.latency / 1000)
+            print('%10d %14d %10.2f %10.1f %10.2f' % (
+                prefetch, size, elapsed, count / elapsed, size / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -101,6 +101,7 @@ setup(
         'girder.cli_plugins': [
             'serve = girder.cli.serve:main',
             'mount = girder.cli.mount:main',
+            'rebuild-ancestors = girder.cli.ancestors:main',
             'shell = girder.cli.shell:main',
             'sftpd = girder.cli.sftpd:main',
         ],
@@ -1,9 +1,10 @@
 import datetime
 import io
+import time
 
 import pytest
 from click.testing import CliRunner
-from girder_audit_logs import Record, cleanup
+from girder_audit_logs import Record, _AuditLogDatabaseHandler, cleanup
 
 from girder import auditLogger
 from girder.models.file import File
@@ -12,14 +13,27 @@ from girder.models.upload import Upload
 from girder.models.user import User
 
 
+def _flush():
+    # Records are written in the background
+    for handler in auditLogger.handlers:
+        handler.flush()
+
+
 @pytest.fixture
 def freshLog():
+    _flush()
     Record().collection.drop()  # Clear existing records
 
     yield auditLogger
 
-    for handler in auditLogger.handlers:
+    for handler in list(auditLogger.handlers):
         auditLogger.removeHandler(handler)
+        handler.close()
+
+
+def _records(**kwargs):
+    _flush()
+    return Record().find(**kwargs)
 
 
 @pytest.mark.plugin('audit_logs')
@@ -27,7 +41,7 @@ def testAnonymousRestRequestLogging(server, freshLog):
     Record().collection.delete_many({})  # Clear existing records
     server.request('/user/me')
 
-    records = Record().find()
+    records = _records()
     assert records.count() == 1
     record = records[0]
 
@@ -47,7 +61,7 @@ def testFailedRestRequestLogging(server, freshLog):
         'name': 'Foo',
         'parentId': 'foo'
     })
-    records = Record().find()
+    records = _records()
 
     assert records.count() == 1
     details = records[0]['details']
@@ -64,7 +78,7 @@ def testFailedRestRequestLogging(server, freshLog):
 @pytest.mark.plugin('audit_logs')
 def testAuthenticatedRestRequestLogging(server, admin, freshLog):
     server.request('/user/me', user=admin)
-    records = Record().find()
+    records = _records()
     assert records.count() == 1
     record = records[0]
     assert record['userId'] == admin['_id']
@@ -81,7 +95,7 @@ def testAuthenticatedRestRequestLogging(server, admin, freshLog):
 def testDangerousParamsRestRequestLogging(server, admin, freshLog, requestParams, logParams):
     server.request('/folder', params=requestParams)
 
-    records = Record().find()
+    records = _records()
     assert records.count() == 1
     details = records[0]['details']
     assert details['params'] == logParams
@@ -97,11 +111,12 @@ def testDownloadLogging(server, admin, fsAssetstore, freshLog):
         io.BytesIO(b'hello'), size=5, name='test', parentType='folder', parent=folder,
         user=admin, assetstore=fsAssetstore)
 
+    _flush()
     Record().collection.delete_many({})  # Clear existing records
 
     File().download(file, headers=False, offset=2, endByte=4)
 
-    records = Record().find()
+    records = _records()
 
     assert records.count() == 1
     record = records[0]
@@ -116,7 +131,7 @@ def testDownloadLogging(server, admin, fsAssetstore, freshLog):
 @pytest.mark.plugin('audit_logs')
 def testDocumentCreationLogging(server, freshLog):
     user = User().createUser('admin', 'password', 'first', 'last', 'a@a.com')
-    records = Record().find(sort=[('when', 1)])
+    records = _records(sort=[('when', 1)])
     assert records.count() == 3
 
     assert records[0]['details']['collection'] == 'user'
@@ -134,7 +149,46 @@ def testDocumentCreationLogging(server, freshLog):
 ])
 def testCleanupScript(server, freshLog, args, expected, admin):
     server.request('/user/me', user=admin)
+    _flush()
+    # Times are stored to the millisecond, so make sure the records are older
+    # than the cutoff of --days=0
+    time.sleep(0.002)
 
     result = CliRunner().invoke(cleanup.cleanup, args)
     assert result.exit_code == 0
     assert result.output == 'Deleted %d log entries.\n' % expected
+
+
+@pytest.mark.plugin('audit_logs')
+def testBufferedWriter(server, admin, freshLog, mocker):
+    for handler in list(auditLogger.handlers):
+        auditLogger.removeHandler(handler)
+        handler.close()
+    handler = _AuditLogDatabaseHandler(queueSize=1, batchSize=10, flushInterval=60)
+    auditLogger.addHandler(handler)
+    Record().collection.delete_many({})
+
+    # Records that don't fit in the queue are dropped
+    mocker.patch.object(handler, '_startWriter')
+    server.request('/user/me', user=admin)
+    server.request('/user/me', user=admin)
+    assert handler.stats() == {
+        'written': 0, 'dropped': 1, 'failed': 0, 'queued': 1, 'queueSize': 1}
+    mocker.stopall()
+
+    # Flushing doesn't wait for the flush interval; write the queued record
+    # first so that the next one has room in the queue
+    handler._startWriter()
+    handler.flush()
+    assert handler.stats()['written'] == 1
+    server.request('/user/me', user=admin)
+    handler.flush()
+    assert handler.stats()['written'] == 2
+    assert len(list(Record().find())) == 2
+
+    resp = server.request('/system/audit_logs/status', user=admin)
+    assert resp.json['written'] == 2
+    assert resp.json['dropped'] == 1
+
+    handler.close()
+    assert len(list(Record().find())) == 3
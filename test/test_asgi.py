@@ -1,3 +1,5 @@
+import asyncio
+import json
 import os
 import stat
 import time
@@ -6,11 +8,56 @@ import psutil
 import requests
 from requests.adapters import HTTPAdapter
 
+from girder import events
 from girder.models.file import File
 from girder.models.folder import Folder
+from girder.models.token import Token
+from girder.models.upload import Upload
 from pytest_girder.utils import uploadFile
 
 
+def _asgiRequest(app, method, path, query='', headers=None, body=(b'',), onSend=None,
+                 disconnectAfter=None):
+    """
+    Send a request directly to an ASGI app; the body is sent in the given pieces.
+    The client disconnects once the response is complete, or once the app has
+    sent ``disconnectAfter`` messages.  ``onSend`` is called with each message.
+    """
+    pieces = list(body)
+    messages = []
+    closed = asyncio.Event()
+
+    async def receive():
+        if not pieces:
+            await closed.wait()
+            return {'type': 'http.disconnect'}
+        return {'type': 'http.request', 'body': pieces.pop(0), 'more_body': bool(pieces)}
+
+    async def send(message):
+        messages.append(message)
+        if onSend:
+            onSend(message)
+        if len(messages) == disconnectAfter or (
+                message['type'] == 'http.response.body' and not message.get('more_body')):
+            closed.set()
+
+    headers = dict(headers or {}, Host='127.0.0.1')
+    asyncio.run(app({
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': query.encode(),
+        'headers': [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        'client': ('127.0.0.1', 0),
+        'server': ('127.0.0.1', 80),
+    }, receive, send))
+    headers = {k.decode().lower(): v.decode() for k, v in messages[0]['headers']}
+    return messages[0]['status'], headers, b''.join(m.get('body', b'') for m in messages[1:])
+
+
 def test_download_unreadable_file(asgiBoundServer, admin, fsAssetstore):
     dest = Folder().childFolders(admin, parentType='user')[0]
     test_file = uploadFile('test.txt', b'content', admin, dest)
@@ -74,3 +121,108 @@ def test_large_file_download_memory_consumption(asgiBoundServer, admin, fsAssets
     )
     assert len(memory_usage) > 10, 'Insufficient memory samples'
     assert download_time > 0.5, 'Download too fast, may not have been throttled'
+
+
+def test_range_download_is_sent_from_file(asgiBoundServer, admin, fsAssetstore):
+    content = bytes(range(256)) * 4096
+    dest = Folder().childFolders(admin, parentType='user')[0]
+    uploaded_file = uploadFile('range.bin', content, admin, dest)
+    url = (f'http://127.0.0.1:{asgiBoundServer.boundPort}/api/v1/file/'
+           f'{uploaded_file["_id"]}/download')
+
+    resp = requests.get(url)
+    assert resp.status_code == 200
+    assert resp.content == content
+    assert 'X-Girder-Sendfile' not in resp.headers
+    assert 'range.bin' in resp.headers['Content-Disposition']
+
+    resp = requests.get(url, headers={'Range': 'bytes=1000-299999'})
+    assert resp.status_code == 206
+    assert resp.content == content[1000:300000]
+    assert resp.headers['Content-Range'] == f'bytes 1000-299999/{len(content)}'
+
+
+def test_native_routes(asgiBoundServer, admin, fsAssetstore):
+    from girder.asgi import create_app
+
+    native = create_app(native_routes=True)
+    bridged = create_app(native_routes=False)
+    headers = {'Girder-Token': str(Token().createToken(admin)['_id'])}
+    dest = Folder().childFolders(admin, parentType='user')[0]
+    content = bytes(range(256)) * 4096
+
+    upload = Upload().createUpload(admin, 'native.bin', 'folder', dest, size=len(content))
+    status, _, body = _asgiRequest(
+        native, 'POST', '/api/v1/file/chunk', f'uploadId={upload["_id"]}&offset=0',
+        dict(headers, **{'Content-Type': 'application/octet-stream',
+                         'Content-Length': str(len(content))}),
+        body=(content[:1000], content[1000:]))
+    assert status == 200
+    file = json.loads(body)
+    assert file['size'] == len(content)
+
+    url = f'/api/v1/file/{file["_id"]}/download'
+    status, respHeaders, body = _asgiRequest(
+        native, 'GET', url, headers=dict(headers, Range='bytes=1000-299999'))
+    assert status == 206
+    assert body == content[1000:300000]
+    assert 'x-girder-sendfile' not in respHeaders
+    status, respHeaders, body = _asgiRequest(native, 'HEAD', f'{url}/native.bin', headers=headers)
+    assert status == 200
+    assert respHeaders['content-length'] == str(len(content))
+    assert body == b''
+
+    for path, query in (
+            ('/api/v1/item', f'folderId={dest["_id"]}'),
+            ('/api/v1/folder', f'parentType=user&parentId={admin["_id"]}')):
+        for user in (headers, None):
+            nativeResp = _asgiRequest(native, 'GET', path, query, user)
+            bridgedResp = _asgiRequest(bridged, 'GET', path, query, user)
+            assert nativeResp[0] == bridgedResp[0]
+            assert nativeResp[2] == bridgedResp[2]
+
+
+def test_download_complete_after_file_is_sent(asgiBoundServer, admin, fsAssetstore):
+    from girder.asgi import SENDFILE_CHUNK_SIZE, create_app
+
+    headers = {'Girder-Token': str(Token().createToken(admin)['_id'])}
+    dest = Folder().childFolders(admin, parentType='user')[0]
+    content = b'x' * (SENDFILE_CHUNK_SIZE * 3)
+    file = uploadFile('complete.bin', content, admin, dest)
+    url = f'/api/v1/file/{file["_id"]}/download'
+    log = []
+
+    def onSend(message):
+        log.append('last body' if message['type'] == 'http.response.body' and not message.get(
+            'more_body') else message['type'])
+
+    with events.bound('model.file.download.complete', 'test',
+                      lambda event: log.append('complete')):
+        for nativeRoutes in (True, False):
+            app = create_app(native_routes=nativeRoutes)
+            del log[:]
+            status, _, body = _asgiRequest(app, 'GET', url, headers=headers, onSend=onSend)
+            assert status == 200
+            assert body == content
+            assert log[-2:] == ['last body', 'complete']
+
+            # Ranges that reach the end of the file are complete downloads
+            del log[:]
+            status, _, _ = _asgiRequest(app, 'GET', url, headers=dict(
+                headers, Range=f'bytes={len(content) - 10}-'), onSend=onSend)
+            assert status == 206
+            assert log == ['http.response.start', 'http.response.body', 'last body', 'complete']
+
+            del log[:]
+            status, _, _ = _asgiRequest(
+                app, 'GET', url, headers=dict(headers, Range='bytes=0-99'), onSend=onSend)
+            assert status == 206
+            assert 'complete' not in log
+
+            # Downloads that the client abandons are not complete
+            del log[:]
+            status, _, _ = _asgiRequest(
+                app, 'GET', url, headers=headers, onSend=onSend, disconnectAfter=2)
+            assert status == 200
+            assert log[-1] == 'last body'
+            assert 'complete' not in log
@@ -1,10 +1,14 @@
 import unittest.mock
 
 import pytest
+from dogpile.cache import make_region
+from dogpile.cache.api import NO_VALUE
 
 from girder.models.setting import Setting
+from girder.models.token import Token
+from girder.models.user import User
 from girder.settings import SettingKey
-from girder.utility._cache import _setupCache, cache, requestCache
+from girder.utility._cache import _setupCache, cache, getCacheStats, requestCache
 from girder.utility.config import getConfig
 
 
@@ -59,3 +63,76 @@ def testSettingsCache(db, enabledCache):
         setting.get(SettingKey.BRAND_NAME)
 
         findOneMock.assert_called_once()
+
+
+def testCacheStats(db, enabledCache):
+    stats = getCacheStats().get('girder.cache', {'hits': 0, 'misses': 0})
+
+    assert cache.get('testCacheStats') is NO_VALUE
+    cache.set('testCacheStats', 'value')
+    assert cache.get('testCacheStats') == 'value'
+
+    newStats = getCacheStats()['girder.cache']
+    assert newStats['misses'] == stats['misses'] + 1
+    assert newStats['hits'] == stats['hits'] + 1
+
+
+def testRedisBackendSharesNotificationConnection():
+    client = unittest.mock.MagicMock()
+    client.get.return_value = None
+    with unittest.mock.patch('girder.notification._redis_client_sync', return_value=client):
+        region = make_region().configure('girder.redis', arguments={'key_prefix': 'test:'})
+        region.set('key', 'value')
+        assert region.get('key') is NO_VALUE
+
+    assert client.set.call_args[0][0] == 'test:key'
+    client.get.assert_called_once_with('test:key')
+
+
+def testAuthCacheRequiresBackend(db, admin, enabledCache):
+    # Without a configured backend, every lookup reads the database
+    token = Token().createToken(admin)
+    assert Token().loadCached(token['_id'])['_id'] == token['_id']
+    with unittest.mock.patch.object(Token, 'findOne', return_value=None):
+        assert Token().loadCached(token['_id']) is None
+
+
+def testAuthCache(db, admin):
+    Setting().set(SettingKey.CACHE_CONFIG, {'cache.auth.backend': 'girder.memory_bounded'})
+    Setting().set(SettingKey.CACHE_ENABLED, True)
+    _setupCache(getConfig())
+    try:
+        _checkAuthCache(admin)
+    finally:
+        Setting().set(SettingKey.CACHE_CONFIG, {})
+        Setting().set(SettingKey.CACHE_ENABLED, False)
+        _setupCache(getConfig())
+
+
+def _checkAuthCache(admin):
+    tokenModel = Token()
+    userModel = User()
+    token = tokenModel.createToken(admin)
+
+    assert tokenModel.loadCached(token['_id'])['_id'] == token['_id']
+    assert userModel.loadCached(admin['_id'])['login'] == admin['login']
+
+    # Both should now come from the cache
+    with unittest.mock.patch.object(tokenModel, 'findOne') as tokenFindOne, \
+            unittest.mock.patch.object(userModel, 'findOne') as userFindOne:
+        assert tokenModel.loadCached(token['_id'])['_id'] == token['_id']
+        assert userModel.loadCached(admin['_id'])['login'] == admin['login']
+        tokenFindOne.assert_not_called()
+        userFindOne.assert_not_called()
+
+    # Modifying the user invalidates it
+    userModel.update({'_id': admin['_id']}, {'$set': {'firstName': 'Changed'}})
+    assert userModel.loadCached(admin['_id'])['firstName'] == 'Changed'
+    admin = userModel.load(admin['_id'], force=True)
+    admin['lastName'] = 'Changed'
+    userModel.save(admin)
+    assert userModel.loadCached(admin['_id'])['lastName'] == 'Changed'
+
+    # Deleting the token invalidates it
+    tokenModel.remove(token)
+    assert tokenModel.loadCached(token['_id']) is None
@@ -0,0 +1,93 @@
+import pytest
+
+from girder.constants import AccessType, SortDir
+from girder.exceptions import ValidationException
+from girder.models.collection import Collection
+from girder.models.folder import Folder
+from girder.models.item import Item
+from girder.utility import keyset
+from pytest_girder.assertions import assertStatus, assertStatusOk
+
+
+def _pageThrough(server, path, user, params):
+    names = []
+    cursor = ''
+    while cursor is not None:
+        resp = server.request(path, user=user, params=dict(params, cursor=cursor))
+        assertStatusOk(resp)
+        assert 'Girder-Total-Count' not in resp.headers
+        names.extend(doc.get('name', doc.get('login')) for doc in resp.json)
+        cursor = resp.headers.get('Girder-Next-Cursor')
+    return names
+
+
+@pytest.fixture
+def folder(admin):
+    folder = Folder().createFolder(admin, 'Cursor', parentType='user', creator=admin)
+    # Duplicate names make sure ties are broken by _id
+    for i in range(7):
+        Item().createItem('Item %d' % (i % 3), creator=admin, folder=folder)
+    yield folder
+
+
+@pytest.mark.parametrize('sortdir', [SortDir.ASCENDING, SortDir.DESCENDING])
+def testItemCursorPaging(server, admin, folder, sortdir):
+    params = {'folderId': str(folder['_id']), 'limit': 3, 'sortdir': sortdir}
+    expected = [item['name'] for item in Item().find(
+        {'folderId': folder['_id']}, sort=[('lowerName', sortdir), ('_id', sortdir)])]
+
+    assert len(expected) == 7
+    assert _pageThrough(server, '/item', admin, params) == expected
+
+
+def testFolderCursorPagingFiltersByPermission(server, admin, user, folder):
+    for i in range(5):
+        child = Folder().createFolder(folder, 'Folder %d' % i, creator=admin, public=False)
+        if i % 2:
+            Folder().setUserAccess(child, user, AccessType.READ, save=True)
+
+    params = {'parentType': 'folder', 'parentId': str(folder['_id']), 'limit': 1}
+    assert _pageThrough(server, '/folder', admin, params) == [
+        'Folder %d' % i for i in range(5)]
+    Folder().setUserAccess(folder, user, AccessType.READ, save=True)
+    assert _pageThrough(server, '/folder', user, params) == ['Folder 1', 'Folder 3']
+
+
+def testUserAndCollectionCursorPaging(server, admin, user):
+    for i in range(3):
+        Collection().createCollection('Collection %d' % i, creator=admin)
+
+    assert _pageThrough(server, '/collection', admin, {'limit': 2}) == [
+        'Collection 0', 'Collection 1', 'Collection 2']
+    users = _pageThrough(server, '/user', admin, {'limit': 1, 'sort': 'login'})
+    assert users == [admin['login'], user['login']]
+
+
+def testCursorErrors(server, admin, folder):
+    params = {'folderId': str(folder['_id']), 'limit': 3, 'cursor': ''}
+    resp = server.request('/item', user=admin, params=dict(params, offset=3))
+    assertStatus(resp, 400)
+
+    resp = server.request('/item', user=admin, params=dict(params, cursor='invalid'))
+    assertStatus(resp, 400)
+
+    resp = server.request('/item', user=admin, params=params)
+    resp = server.request('/item', user=admin, params=dict(
+        params, sort='name', cursor=resp.headers['Girder-Next-Cursor']))
+    assertStatus(resp, 400)
+    assert resp.json['message'] == 'The cursor was created for a different sort order.'
+
+
+def testCursorQueryWithMissingValues(db):
+    collection = Item().collection
+    collection.insert_many([{'a': a} for a in (None, 2, None, 1, 2)] + [{}])
+    for direction in (SortDir.ASCENDING, SortDir.DESCENDING):
+        sort = keyset.normalizeSort([('a', direction)])
+        docs = list(collection.find({}, sort=sort))
+        for idx, doc in enumerate(docs):
+            values = keyset.decodeCursor(keyset.encodeCursor(doc, sort), sort)
+            after = list(collection.find(keyset.cursorQuery(sort, values), sort=sort))
+            assert after == docs[idx + 1:]
+
+    with pytest.raises(ValidationException, match='Invalid cursor'):
+        keyset.decodeCursor(keyset.encodeCursor(docs[0], sort)[:-4], sort)
@@ -0,0 +1,94 @@
+import io
+import os
+import random
+
+import pytest
+
+from girder.models.file import File
+from girder.models.folder import Folder
+from girder.models.upload import Upload
+from girder.utility import abstract_assetstore_adapter
+from girder.utility.filesystem_assetstore_adapter import FilesystemAssetstoreAdapter
+
+BLOCK_SIZE = 1024
+
+
+@pytest.fixture
+def blockCache(mocker):
+    mocker.patch.object(abstract_assetstore_adapter, 'FILEHANDLE_BLOCK_SIZE', BLOCK_SIZE)
+    cache = abstract_assetstore_adapter._BlockCache(64 * BLOCK_SIZE)
+    mocker.patch.object(abstract_assetstore_adapter, '_blockCache', cache)
+    yield cache
+
+
+@pytest.fixture
+def dataFile(admin, fsAssetstore):
+    data = os.urandom(BLOCK_SIZE * 40 + 100)
+    folder = Folder().createFolder(admin, 'Data', parentType='user', creator=admin)
+    file = Upload().uploadFromFile(
+        io.BytesIO(data), size=len(data), name='data.bin', parentType='folder',
+        parent=folder, user=admin)
+    yield file, data
+
+
+def testRandomReads(blockCache, dataFile):
+    file, data = dataFile
+    rand = random.Random(1)
+    with File().open(file) as handle:
+        for _ in range(200):
+            offset = rand.randrange(0, len(data) + 10)
+            length = rand.randrange(0, BLOCK_SIZE * 3)
+            handle.seek(offset)
+            assert handle.read(length) == data[offset:offset + length]
+            assert handle.tell() == min(offset + length, max(offset, len(data)))
+        handle.seek(-5, os.SEEK_END)
+        assert handle.read() == data[-5:]
+
+
+def testBlocksAreSharedByHandles(blockCache, dataFile, mocker):
+    file, data = dataFile
+    download = mocker.spy(FilesystemAssetstoreAdapter, 'downloadFile')
+    with File().open(file) as handle:
+        handle.seek(BLOCK_SIZE * 10 + 5)
+        assert handle.read(10) == data[BLOCK_SIZE * 10 + 5:BLOCK_SIZE * 10 + 15]
+    assert download.call_count == 1
+
+    # Another handle reads the cached block without downloading it again
+    with File().open(file) as handle:
+        handle.seek(BLOCK_SIZE * 10)
+        assert handle.read(BLOCK_SIZE) == data[BLOCK_SIZE * 10:BLOCK_SIZE * 11]
+        handle.seek(0)
+        assert handle.read(BLOCK_SIZE) == data[:BLOCK_SIZE]
+    assert download.call_count == 2
+    assert blockCache.stats()['blocks'] == 2
+
+
+def testSequentialReadAhead(blockCache, dataFile, mocker):
+    file, data = dataFile
+    download = mocker.spy(FilesystemAssetstoreAdapter, 'downloadFile')
+    with File().open(file) as handle:
+        chunks = []
+        while True:
+            chunk = handle.read(BLOCK_SIZE // 2)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    assert b''.join(chunks) == data
+    # The read-ahead doubles with each request, so 41 blocks take few requests
+    assert download.call_count <= 7
+
+
+def testCacheIsBounded(blockCache, dataFile, mocker):
+    file, data = dataFile
+    blockCache.maxSize = 4 * BLOCK_SIZE
+    with File().open(file) as handle:
+        assert handle.read() == data
+        assert blockCache.stats()['bytes'] <= 4 * BLOCK_SIZE
+
+    # Without a cache, reads are streamed
+    blockCache.maxSize = 0
+    blockCache.clear()
+    with File().open(file) as handle:
+        handle.seek(5)
+        assert handle.read(BLOCK_SIZE * 2) == data[5:5 + BLOCK_SIZE * 2]
+    assert blockCache.stats()['blocks'] == 0
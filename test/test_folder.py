@@ -1,8 +1,11 @@
 import pytest
 from bson.objectid import ObjectId
 
+from girder.constants import AccessType
 from girder.exceptions import AccessException
+from girder.models.file import File
 from girder.models.folder import Folder
+from girder.models.item import Item
 from pytest_girder.assertions import assertStatus, assertStatusOk
 
 
@@ -130,3 +133,104 @@ def testGetResourcePathForNoneUser(server, parentChain):
                           method='GET', user=None,
                           params={'type': 'folder'})
     assertStatus(resp, 401)
+
+
+def testAncestorsOnCreate(parentChain, admin):
+    item = Item().createItem('item', creator=admin, folder=parentChain['folder4'])
+    assert parentChain['folder1']['ancestors'] == [admin['_id']]
+    assert parentChain['folder4']['ancestors'] == [
+        admin['_id'], parentChain['folder1']['_id'], parentChain['folder2']['_id'],
+        parentChain['privateFolder']['_id']]
+    assert item['ancestors'] == parentChain['folder4']['ancestors'] + [
+        parentChain['folder4']['_id']]
+    assert list(Folder().checkAncestors()) == []
+
+
+def testAncestorsOnMove(parentChain, admin):
+    item = Item().createItem('item', creator=admin, folder=parentChain['folder4'])
+    Folder().move(parentChain['privateFolder'], parentChain['folder1'], 'folder')
+
+    folder4 = Folder().load(parentChain['folder4']['_id'], force=True)
+    assert folder4['ancestors'] == [
+        admin['_id'], parentChain['folder1']['_id'], parentChain['privateFolder']['_id']]
+    item = Item().load(item['_id'], force=True)
+    assert item['ancestors'] == folder4['ancestors'] + [folder4['_id']]
+    assert [entry['object']['_id'] for entry in Folder().parentsToRoot(folder4, user=admin)] == [
+        admin['_id'], parentChain['folder1']['_id'], parentChain['privateFolder']['_id']]
+    assert list(Folder().checkAncestors()) == []
+
+    Item().move(item, parentChain['folder2'])
+    item = Item().load(item['_id'], force=True)
+    assert item['ancestors'] == [
+        admin['_id'], parentChain['folder1']['_id'], parentChain['folder2']['_id']]
+
+
+def testRebuildAncestors(parentChain, admin):
+    item = Item().createItem('item', creator=admin, folder=parentChain['folder4'])
+    Folder().update({}, {'$unset': {'ancestors': True}})
+    Item().update({}, {'$unset': {'ancestors': True}})
+
+    errors = {error['_id']: error for error in Folder().checkAncestors()}
+    assert item['_id'] in errors
+    assert errors[parentChain['folder1']['_id']]['expected'] == [admin['_id']]
+    assert errors[parentChain['folder2']['_id']]['expected'] is None
+
+    # Moving a folder that predates the index indexes its subtree
+    folder2 = Folder().load(parentChain['folder2']['_id'], force=True)
+    Folder().move(folder2, admin, 'user')
+    item = Item().load(item['_id'], force=True)
+    assert item['ancestors'] == [
+        admin['_id'], parentChain['folder2']['_id'], parentChain['privateFolder']['_id'],
+        parentChain['folder4']['_id']]
+
+    Folder().rebuildAncestors()
+    assert list(Folder().checkAncestors()) == []
+
+
+@pytest.mark.parametrize('bulk', [False, True])
+def testSetAccessListRecursive(admin, user, bulk):
+    f1 = Folder().createFolder(admin, 'F1', parentType='user', creator=admin)
+    Folder().setUserAccess(f1, user, AccessType.ADMIN, save=True)
+    f2 = Folder().createFolder(f1, 'F2', creator=admin)
+    hidden = Folder().createFolder(f2, 'Hidden', creator=admin)
+    Folder().setUserAccess(hidden, user, None, save=True)
+    f4 = Folder().createFolder(hidden, 'F4', creator=admin)
+
+    access = {'users': [{'id': user['_id'], 'level': AccessType.ADMIN}], 'groups': []}
+    Folder().setAccessList(
+        f1, access, save=True, recurse=True, user=user, setPublic=True, bulk=bulk)
+
+    for folder, updated in ((f1, True), (f2, True), (hidden, False), (f4, False)):
+        folder = Folder().load(folder['_id'], force=True)
+        assert Folder().hasAccess(folder, admin) is True
+        assert folder['public'] is updated
+        assert ({entry['id'] for entry in folder['access']['users']} == {user['_id']}) is updated
+    assert Folder().subtreeCount(f1, includeItems=False, user=user, level=AccessType.ADMIN) == 2
+
+
+def testFileListInBatches(admin, mocker):
+    mocker.patch.object(Folder, '_FILE_LIST_BATCH_SIZE', 2)
+    root = Folder().createFolder(admin, 'Root', parentType='user', creator=admin)
+    Folder().setMetadata(root, {'key': 'value'})
+    for name in ('s1', 's2', 's3'):
+        sub = Folder().createFolder(root, name, creator=admin)
+        item = Item().createItem('x.txt', admin, sub)
+        File().createLinkFile('x.txt', item, 'item', 'http://a/' + name, admin)
+    for i in range(5):
+        item = Item().createItem('item%d' % i, admin, root)
+        File().createLinkFile('a.txt', item, 'item', 'http://a', admin, mimeType='text/plain')
+        if i % 2:
+            File().createLinkFile('b.png', item, 'item', 'http://b', admin, mimeType='image/png')
+    Item().createItem('empty', admin, root)
+
+    root = Folder().load(root['_id'], force=True)
+    paths = [path for path, file in Folder().fileList(
+        root, user=admin, includeMetadata=True, data=False)]
+    assert paths == ['Root/s1/x.txt', 'Root/s2/x.txt', 'Root/s3/x.txt'] + [
+        'Root/item%d/%s' % (i, name) for i in range(5)
+        for name in (('a.txt', 'b.png') if i % 2 else ('a.txt',))] + [
+        'Root/girder-folder-metadata.json']
+
+    paths = [path for path, file in Folder().fileList(
+        root, user=admin, subpath=False, mimeFilter=['image/png'], data=False)]
+    assert paths == ['item1/b.png', 'item3/b.png']
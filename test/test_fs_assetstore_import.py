@@ -3,8 +3,17 @@ import tempfile
 
 import pytest
 
+from girder import events
+from girder.models.assetstore import Assetstore
+from girder.models.file import File
 from girder.models.folder import Folder
+from girder.models.item import Item
+from girder.models.user import User
+from girder.utility import filesystem_assetstore_adapter
 from girder.utility import path as path_util
+from girder.utility.filesystem_assetstore_adapter import (
+    FilesystemAssetstoreAdapter, _DirectoryScanner)
+from girder.utility.progress import noProgress
 from pytest_girder.assertions import assertStatusOk
 
 
@@ -66,3 +75,135 @@ def test_mimetype_guessing(server, admin, fsAssetstore, temp_files, eagerWorkerT
                 'jpg': 'image/jpeg',
             }[key]
         )
+
+
+@pytest.fixture
+def importTree(tmp_path):
+    for sub in ('a', 'a/b', 'c'):
+        (tmp_path / sub).mkdir(parents=True, exist_ok=True)
+    files = {'top.txt': 3, 'a/one.txt': 5, 'a/b/two.txt': 7, 'c/three.txt': 11, 'c/four': 13}
+    for name, size in files.items():
+        (tmp_path / name).write_bytes(b'x' * size)
+    yield tmp_path
+
+
+def _importInto(admin, fsAssetstore, folder, path, **params):
+    Assetstore().importData(
+        fsAssetstore, parent=folder, parentType='folder',
+        params=dict(params, importPath=str(path)), progress=noProgress, user=admin,
+        leafFoldersAsItems=params.pop('leafFoldersAsItems', False))
+
+
+def testBulkImportReusesExisting(admin, fsAssetstore, importTree):
+    folder = Folder().createFolder(admin, 'Import', parentType='user', creator=admin)
+    imported = []
+    with events.bound('filesystem_assetstore_imported', 'test', lambda e: imported.append(e.info)):
+        _importInto(admin, fsAssetstore, folder, importTree)
+    assert sorted((info['type'], os.path.relpath(info['importPath'], importTree))
+                  for info in imported) == [
+        ('folder', 'a'), ('folder', 'a/b'), ('folder', 'c'), ('item', 'a/b/two.txt'),
+        ('item', 'a/one.txt'), ('item', 'c/four'), ('item', 'c/three.txt'),
+        ('item', 'top.txt')]
+
+    # Importing again neither duplicates documents nor sizes
+    (importTree / 'c' / 'five.txt').write_bytes(b'x' * 17)
+    _importInto(admin, fsAssetstore, folder, importTree)
+    assert len(list(Item().find({'baseParentId': admin['_id']}))) == 6
+    assert len(list(File().find({'assetstoreId': fsAssetstore['_id']}))) == 6
+    assert Folder().load(folder['_id'], force=True)['size'] == 3
+    sub = Folder().findOne({'parentId': folder['_id'], 'name': 'c'})
+    assert sub['size'] == 41
+    assert sub['ancestors'] == folder['ancestors'] + [folder['_id']]
+    item = Item().findOne({'folderId': sub['_id'], 'name': 'four'})
+    assert item['size'] == 13
+    file = File().findOne({'itemId': item['_id']})
+    assert file['path'] == str(importTree / 'c' / 'four')
+    assert file['imported'] is True
+    assert Item().findOne({'name': 'three.txt'})['lowerName'] == 'three.txt'
+    assert File().findOne({'name': 'three.txt'})['exts'] == ['txt']
+    admin = User().load(admin['_id'], force=True)
+    assert admin['size'] == 3 + 5 + 7 + 11 + 13 + 17
+    assert Folder().getSizeRecursive(Folder().load(folder['_id'], force=True)) == admin['size']
+
+
+def testBulkImportLeafFoldersAndBatchedEvents(admin, fsAssetstore, importTree):
+    folder = Folder().createFolder(admin, 'Import', parentType='user', creator=admin)
+    imported = []
+    with events.bound('filesystem_assetstore_imported.batch', 'test',
+                      lambda e: imported.extend(e.info)):
+        _importInto(admin, fsAssetstore, folder, importTree, leafFoldersAsItems=True,
+                    batchEvents=True)
+    assert sorted((info['type'], os.path.basename(info['importPath']))
+                  for info in imported) == [
+        ('folder', 'a'), ('item', 'b'), ('item', 'c'), ('item', 'one.txt'), ('item', 'top.txt')]
+    item = Item().findOne({'folderId': folder['_id'], 'name': 'c'})
+    assert sorted(file['name'] for file in Item().childFiles(item)) == ['four', 'three.txt']
+    assert item['size'] == 24
+
+
+def testIncrementalImport(admin, fsAssetstore, importTree):
+    folder = Folder().createFolder(admin, 'Import', parentType='user', creator=admin)
+    params = {'importPath': str(importTree), 'incremental': True, 'markVanished': True}
+    adapter = FilesystemAssetstoreAdapter(fsAssetstore)
+    stats = adapter.importData(folder, 'folder', params, noProgress, admin, False)
+    assert stats == {'created': 5, 'updated': 0, 'unchanged': 0, 'vanished': 0}
+
+    (importTree / 'a' / 'one.txt').write_bytes(b'x' * 8)
+    os.utime(importTree / 'a' / 'one.txt', (1, 1))
+    (importTree / 'c' / 'four').unlink()
+    imported = []
+    changed = []
+    with events.bound('filesystem_assetstore_imported', 'test',
+                      lambda e: imported.append(e.info)), \
+            events.bound('model.file.import.changed', 'test', lambda e: changed.append(e.info)):
+        stats = adapter.importData(folder, 'folder', params, noProgress, admin, False)
+    assert stats == {'created': 0, 'updated': 1, 'unchanged': 3, 'vanished': 1}
+    assert [os.path.relpath(info['importPath'], importTree) for info in imported] == ['a/one.txt']
+    assert [(file['name'], file['size']) for file in changed] == [('one.txt', 8)]
+
+    file = File().findOne({'name': 'one.txt'})
+    assert file['size'] == 8
+    assert file['importFingerprint']['mtime'] == 1
+    assert File().findOne({'name': 'four'})['vanished'] is True
+    assert not File().findOne({'name': 'three.txt'}).get('vanished')
+    sub = Folder().findOne({'parentId': folder['_id'], 'name': 'a'})
+    assert sub['size'] == 8
+    assert User().load(admin['_id'], force=True)['size'] == 3 + 8 + 7 + 11 + 13
+
+    # The vanished file is restored once it reappears
+    (importTree / 'c' / 'four').write_bytes(b'x' * 13)
+    stats = adapter.importData(folder, 'folder', params, noProgress, admin, False)
+    assert stats == {'created': 0, 'updated': 1, 'unchanged': 4, 'vanished': 0}
+    assert 'vanished' not in File().findOne({'name': 'four'})
+
+
+@pytest.mark.parametrize('leafFoldersAsItems,scanned', [
+    (False, ['.', 'a', 'a/b', 'c']),
+    # Directories that are not leaves are listed again when imported
+    (True, ['.', 'a', 'c', 'a', 'a/b']),
+])
+def testImportListsDirectoriesWhenImported(
+        admin, fsAssetstore, importTree, mocker, leafFoldersAsItems, scanned):
+    scanDirectory = filesystem_assetstore_adapter._scanDirectory
+    mocker.patch.object(
+        filesystem_assetstore_adapter, '_scanDirectory',
+        side_effect=lambda path: sorted(scanDirectory(path), key=lambda entry: entry.name))
+    scan = mocker.spy(_DirectoryScanner, 'scan')
+    folder = Folder().createFolder(admin, 'Import', parentType='user', creator=admin)
+    _importInto(admin, fsAssetstore, folder, importTree, leafFoldersAsItems=leafFoldersAsItems)
+    assert [os.path.relpath(call.args[1], importTree)
+            for call in scan.call_args_list] == scanned
+
+
+@pytest.mark.parametrize('threads', [1, 4])
+def testDirectoryScanner(importTree, threads):
+    with _DirectoryScanner(threads) as scanner:
+        scanner.prefetch(str(importTree / 'a'))
+        entries = {entry.name: entry for entry in scanner.scan(str(importTree))}
+        assert sorted(entries) == ['a', 'c', 'top.txt']
+        assert entries['a'].isDir and not entries['a'].isFile and entries['a'].stat is None
+        assert entries['top.txt'].isFile and entries['top.txt'].stat.st_size == 3
+        assert sorted(entry.name for entry in scanner.scan(entries['a'].path)) == [
+            'b', 'one.txt']
+        assert scanner.entries == 5
+        assert scanner.status().startswith('5 entries, ')
@@ -1,7 +1,7 @@
 import pytest
 
 from girder.models.group import Group
-from girder.models.model_base import AccessControlledModel, AccessType, Model
+from girder.models.model_base import AccessControlledModel, AccessType, Model, countResults
 from girder.models.user import User
 from girder.utility import acl_mixin, model_importer
 
@@ -350,6 +350,31 @@ def testTextSearch(db):
     assert FakeModel().textSearch('unknown').count() == 0
 
 
+def testCountResults(db):
+    for i in range(5):
+        FakeModel().save({'name': 'doc %d' % i, 'even': i % 2 == 0})
+
+    assert countResults(FakeModel().find({}, limit=2)) == 5
+    assert countResults(FakeModel().find({'even': True}, offset=1)) == 3
+    assert countResults(FakeModel().find({}), limit=2) == 2
+    assert countResults(FakeModel().find({}), estimate=True) == 5
+    assert countResults(FakeModel().find({'even': False}), limit=10, estimate=True) == 2
+    assert countResults(iter([])) is None
+
+
+def testCountResultsAcMix(db, admin, user, FakeAcModel, FakeAcMixModel):
+    _model = FakeAcMixModel()
+    readable = makeDocumentWithPermissions(
+        FakeAcModel(), 'readable', admin, AccessType.ADMIN, user, AccessType.READ)
+    private = makeDocumentWithPermissions(FakeAcModel(), 'private', admin, AccessType.ADMIN)
+    for i in range(4):
+        _model.save({'name': 'doc %d' % i, 'parentId': (readable if i % 2 else private)['_id']})
+
+    assert countResults(_model.findWithPermissions({}, user=user, limit=1)) == 2
+    assert countResults(_model.findWithPermissions({}, user=user), limit=1) == 1
+    assert countResults(_model.findWithPermissions({}, user=admin)) == 4
+
+
 def makeDocumentWithPermissions(
         model, name, admin=None, adminLevel=None, user=None, userLevel=None,
         group=None, groupLevel=None):
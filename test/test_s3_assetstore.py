@@ -0,0 +1,253 @@
+import boto3
+import moto
+import pytest
+
+from girder import events
+from girder.exceptions import GirderException
+from girder.models.assetstore import Assetstore
+from girder.models.file import File
+from girder.models.folder import Folder
+from girder.models.upload import Upload
+from girder.utility import s3_assetstore_adapter
+from girder.utility.progress import noProgress
+from girder.utility.s3_assetstore_adapter import S3AssetstoreAdapter
+from pytest_girder.assertions import assertStatus, assertStatusOk
+
+PART_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def s3Assetstore(db, mocker):
+    mocker.patch.object(S3AssetstoreAdapter, 'CHUNK_LEN', PART_SIZE)
+    with moto.mock_s3():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket='girder')
+        yield Assetstore().createS3Assetstore(
+            name='S3', bucket='girder', accessKeyId='access', secret='secret')
+
+
+def _initUpload(server, user, size):
+    folder = Folder().childFolders(user, parentType='user', user=user)[0]
+    resp = server.request(path='/file', method='POST', user=user, params={
+        'parentType': 'folder', 'parentId': folder['_id'], 'name': 'parts.bin', 'size': size})
+    assertStatusOk(resp)
+    return resp.json
+
+
+def _sendChunk(server, user, upload, data, offset, **kwargs):
+    return server.request(
+        path='/file/chunk', method='POST', user=user, body=data, type='application/octet-stream',
+        params={'uploadId': upload['_id'], 'offset': offset}, **kwargs)
+
+
+def testProxiedPartsOutOfOrderAndResume(server, admin, s3Assetstore):
+    content = bytes(range(256)) * (PART_SIZE * 3 // 256) + b'tail'
+    offsets = [0, PART_SIZE, 2 * PART_SIZE, 3 * PART_SIZE]
+    upload = _initUpload(server, admin, len(content))
+    # Before any part is received, the upload starts from the beginning
+    resp = server.request(path='/file/offset', user=admin, params={'uploadId': upload['_id']})
+    assertStatusOk(resp)
+    assert resp.json['offset'] == 0
+
+    for offset in (offsets[2], offsets[0], offsets[0]):
+        resp = _sendChunk(server, admin, upload, content[offset:offset + PART_SIZE], offset)
+        assertStatusOk(resp)
+        assert resp.json['_id'] == upload['_id']
+    doc = Upload().load(upload['_id'])
+    assert doc['received'] == 2 * PART_SIZE
+    assert sorted(doc['s3']['parts']) == ['1', '3']
+
+    # Chunks that do not line up with the parts are rejected
+    resp = _sendChunk(server, admin, upload, content[100:PART_SIZE + 100], 100)
+    assertStatus(resp, 400)
+
+    resp = server.request(path='/file/offset', user=admin, params={'uploadId': upload['_id']})
+    assertStatusOk(resp)
+    assert resp.json['offset'] == PART_SIZE
+    assert resp.json['missing'] == [offsets[1], offsets[3]]
+
+    resp = _sendChunk(server, admin, upload, content[offsets[3]:], offsets[3])
+    assertStatusOk(resp)
+    resp = _sendChunk(server, admin, upload, content[offsets[1]:offsets[2]], offsets[1])
+    assertStatusOk(resp)
+    assert resp.json['_modelType'] == 'file'
+    assert resp.json['size'] == len(content)
+    assert Upload().load(upload['_id']) is None
+
+    file = File().load(resp.json['_id'], force=True)
+    obj = boto3.client('s3', region_name='us-east-1').get_object(
+        Bucket='girder', Key=file['s3Key'])
+    assert obj['Body'].read() == content
+
+
+def testProxiedSequentialChunks(server, admin, s3Assetstore):
+    # Chunks that do not match the parts are still accepted in order
+    content = b'x' * (PART_SIZE * 3 // 2) * 2
+    upload = _initUpload(server, admin, len(content))
+    half = len(content) // 2
+    assertStatusOk(_sendChunk(server, admin, upload, content[:half], 0))
+    resp = _sendChunk(server, admin, upload, content[:half], 0)
+    assertStatus(resp, 400)
+    resp = _sendChunk(server, admin, upload, content[half:], half)
+    assertStatusOk(resp)
+    assert resp.json['size'] == len(content)
+
+
+def testProxiedPartsResumeAfterFirstPartFails(server, admin, s3Assetstore, mocker):
+    content = b'x' * PART_SIZE + b'tail'
+    upload = _initUpload(server, admin, len(content))
+    mocker.patch.object(
+        S3AssetstoreAdapter, '_putPart', side_effect=GirderException('Upload failed'))
+    resp = _sendChunk(server, admin, upload, content[:PART_SIZE], 0, exception=True)
+    assertStatus(resp, 500)
+    mocker.stopall()
+
+    resp = server.request(path='/file/offset', user=admin, params={'uploadId': upload['_id']})
+    assertStatusOk(resp)
+    assert resp.json['offset'] == 0
+    assert resp.json['missing'] == [0, PART_SIZE]
+
+    assertStatusOk(_sendChunk(server, admin, upload, content[:PART_SIZE], 0))
+    resp = _sendChunk(server, admin, upload, content[PART_SIZE:], PART_SIZE)
+    assertStatusOk(resp)
+    assert resp.json['size'] == len(content)
+
+
+def testProxiedPartsFinalizeAfterFailure(server, admin, s3Assetstore, mocker):
+    content = b'x' * PART_SIZE + b'tail'
+    upload = _initUpload(server, admin, len(content))
+    assertStatusOk(_sendChunk(server, admin, upload, content[:PART_SIZE], 0))
+    finalizeUpload = S3AssetstoreAdapter.finalizeUpload
+    failures = [GirderException('Finalize failed')]
+
+    def failOnce(*args):
+        if failures:
+            raise failures.pop()
+        return finalizeUpload(*args)
+
+    mocker.patch.object(
+        S3AssetstoreAdapter, 'finalizeUpload', autospec=True, side_effect=failOnce)
+    resp = _sendChunk(server, admin, upload, content[PART_SIZE:], PART_SIZE, exception=True)
+    assertStatus(resp, 500)
+    assert 'finalizing' not in Upload().load(upload['_id'])
+
+    # Sending the last part again finalizes the upload
+    resp = _sendChunk(server, admin, upload, content[PART_SIZE:], PART_SIZE)
+    assertStatusOk(resp)
+    assert resp.json['_modelType'] == 'file'
+    assert resp.json['size'] == len(content)
+    assert Upload().load(upload['_id']) is None
+
+
+def testProxiedPartsUseAcceleratedTransfer(server, admin, s3Assetstore, mocker):
+    s3Assetstore['allowS3AcceleratedTransfer'] = True
+    Assetstore().save(s3Assetstore)
+    content = b'x' * PART_SIZE + b'tail'
+    upload = _initUpload(server, admin, len(content))
+    getClient = mocker.spy(S3AssetstoreAdapter, '_getClient')
+    for offset in (PART_SIZE, 0):
+        resp = server.request(
+            path='/file/chunk', method='POST', user=admin, body=content[offset:offset + PART_SIZE],
+            type='application/octet-stream', params={
+                'uploadId': upload['_id'], 'offset': offset,
+                'uploadExtraParameters': '{"use_S3_transfer_acceleration": true}'})
+        assertStatusOk(resp)
+    assert resp.json['size'] == len(content)
+    # Each part is signed with the accelerated client
+    assert [call.args[1] for call in getClient.call_args_list] == [True, True]
+
+
+def testBulkImport(admin, s3Assetstore):
+    client = boto3.client('s3', region_name='us-east-1')
+    for key, size in (('data/a.txt', 3), ('data/b', 5), ('data/b/c.txt', 7), ('data/d/e', 11)):
+        client.put_object(Bucket='girder', Key=key, Body=b'x' * size)
+    folder = Folder().createFolder(admin, 'Import', parentType='user', creator=admin)
+    imported = []
+    with events.bound('s3_assetstore_imported', 'test', lambda e: imported.append(e.info)):
+        for _ in range(2):
+            Assetstore().importData(
+                s3Assetstore, parent=folder, parentType='folder',
+                params={'importPath': 'data/'}, progress=noProgress, user=admin)
+
+    assert len(imported) == 12
+    names = sorted(item['name'] for item in Folder().childItems(folder))
+    assert names == ['a.txt', 'b']
+    # The prefix is renamed since an item has the same name
+    assert sorted(child['name'] for child in Folder().childFolders(
+        folder, 'folder', user=admin)) == ['b/', 'd']
+    files = list(File().find({'assetstoreId': s3Assetstore['_id']}))
+    assert sorted(file['s3Key'] for file in files) == [
+        'data/a.txt', 'data/b', 'data/b/c.txt', 'data/d/e']
+    assert all(file['imported'] for file in files)
+    assert Folder().load(folder['_id'], force=True)['size'] == 8
+    assert Folder().findOne({'parentId': folder['_id'], 'name': 'd'})['size'] == 11
+
+
+def testIncrementalImport(admin, s3Assetstore):
+    client = boto3.client('s3', region_name='us-east-1')
+    for key in ('data/a', 'data/b', 'data/c/d'):
+        client.put_object(Bucket='girder', Key=key, Body=b'xyz')
+    folder = Folder().createFolder(admin, 'Import', parentType='user', creator=admin)
+    adapter = S3AssetstoreAdapter(s3Assetstore)
+    params = {'importPath': 'data/', 'incremental': True, 'markVanished': True}
+    assert adapter.importData(folder, 'folder', params, noProgress, admin)['created'] == 3
+
+    client.put_object(Bucket='girder', Key='data/a', Body=b'abcdef')
+    client.delete_object(Bucket='girder', Key='data/c/d')
+    stats = adapter.importData(folder, 'folder', params, noProgress, admin)
+    assert stats == {'created': 0, 'updated': 1, 'unchanged': 1, 'vanished': 1}
+    assert File().findOne({'s3Key': 'data/a'})['size'] == 6
+    assert File().findOne({'s3Key': 'data/c/d'})['vanished'] is True
+    assert Folder().load(folder['_id'], force=True)['size'] == 9
+
+
+@pytest.mark.parametrize('concurrency', [1, 4])
+def testImportListsPrefixesConcurrently(admin, s3Assetstore, concurrency):
+    client = boto3.client('s3', region_name='us-east-1')
+    keys = ['data/p%02d/q%d/obj' % (p, q) for p in range(20) for q in range(2)]
+    for key in keys:
+        client.put_object(Bucket='girder', Key=key, Body=b'xy')
+    folder = Folder().createFolder(admin, 'Import', parentType='user', creator=admin)
+    adapter = S3AssetstoreAdapter(s3Assetstore)
+    params = {'importPath': 'data/', 'concurrency': concurrency}
+    assert adapter.importData(folder, 'folder', params, noProgress, admin)['created'] == 40
+
+    assert sorted(file['s3Key'] for file in File().find(
+        {'assetstoreId': s3Assetstore['_id']})) == keys
+    children = list(Folder().childFolders(folder, 'folder', user=admin))
+    assert sorted(child['name'] for child in children) == ['p%02d' % p for p in range(20)]
+    assert Folder().load(folder['_id'], force=True)['size'] == 0
+    assert all(child['size'] == 0 for child in children)
+
+
+def testProxiedRangeReadsShareConnectionsAndUrls(admin, s3Assetstore, mocker):
+    data = bytes(range(256)) * 1024
+    client = boto3.client('s3', region_name='us-east-1')
+    client.put_object(Bucket='girder', Key='data/blob', Body=data)
+    folder = Folder().createFolder(admin, 'Import', parentType='user', creator=admin)
+    S3AssetstoreAdapter(s3Assetstore).importData(
+        folder, 'folder', {'importPath': 'data/'}, noProgress, admin)
+    file = File().findOne({'s3Key': 'data/blob'})
+
+    presign = mocker.spy(S3AssetstoreAdapter, '_generatePresignedUrl')
+    sessions = set()
+    for offset, length in ((0, 10), (70000, 5000), (5, 1), (len(data) - 3, 3)):
+        with File().open(file) as handle:
+            handle.seek(offset)
+            assert handle.read(length) == data[offset:offset + length]
+            sessions.add(id(s3_assetstore_adapter._getConnections(s3Assetstore).session))
+    assert presign.call_count == 1
+    assert len(sessions) == 1
+
+    # Changing the credentials of the assetstore presigns new URLs
+    s3Assetstore['secret'] = 'other'
+    stream = S3AssetstoreAdapter(s3Assetstore).downloadFile(file, headers=False, endByte=4)
+    assert b''.join(stream()) == data[:4]
+    assert presign.call_count == 2
+
+    # Without a pool, each download presigns its own URL
+    mocker.patch.object(s3_assetstore_adapter, 'DOWNLOAD_POOL_SIZE', 0)
+    stream = S3AssetstoreAdapter(s3Assetstore).downloadFile(
+        file, headers=False, offset=1, endByte=4)
+    assert b''.join(stream()) == data[1:4]
+    assert presign.call_count == 3
@@ -0,0 +1,48 @@
+import io
+import zipfile
+
+import pytest
+
+from girder.utility import ziputil
+
+
+def _files():
+    return [
+        ('a.txt', lambda: iter([b'hello ', 'world'])),
+        ('empty', lambda: iter([])),
+        ('sub/big.bin', lambda: (bytes([i % 256]) * 1000 for i in range(50))),
+        ('sub/c.txt', lambda: iter([b'c' * 10])),
+    ]
+
+
+@pytest.mark.parametrize('compression', [ziputil.STORE, ziputil.DEFLATE])
+@pytest.mark.parametrize('prefetch', [1, 3, 10])
+def testAddFilesMatchesAddFile(mocker, compression, prefetch):
+    mocker.patch('time.localtime', return_value=(2024, 1, 2, 3, 4, 5, 0, 0, 0))
+
+    zip = ziputil.ZipGenerator('root', compression=compression)
+    expected = b''.join(
+        data for path, generator in _files() for data in zip.addFile(generator, path))
+    expected += zip.footer()
+
+    zip = ziputil.ZipGenerator('root', compression=compression)
+    archive = b''.join(zip.addFiles(_files(), prefetch=prefetch, prefetchBytes=4096))
+    archive += zip.footer()
+    assert archive == expected
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert zf.namelist() == ['root/a.txt', 'root/empty', 'root/sub/big.bin', 'root/sub/c.txt']
+        assert zf.read('root/a.txt') == b'hello world'
+        assert zf.read('root/sub/big.bin') == b''.join(
+            bytes([i % 256]) * 1000 for i in range(50))
+        assert zf.testzip() is None
+
+
+def testAddFilesError():
+    def broken():
+        yield b'data'
+        raise OSError('read failed')
+
+    zip = ziputil.ZipGenerator()
+    with pytest.raises(OSError, match='read failed'):
+        b''.join(zip.addFiles([('a', lambda: iter([b'a'])), ('b', broken)], prefetch=2))
@@ -355,6 +355,35 @@ if not SKIP_FUSE_TESTS:  # noqa
             self.assertIn(os.path.basename(os.path.dirname(
                 os.path.dirname(self.adminFileName))), filelist)
 
+        def testFunctionListCache(self):
+            op = mount.ServerFuse()
+            path = os.path.dirname(self.publicFileName)
+            names = op.readdir(path, 0)
+            self.assertIn(os.path.basename(self.publicFileName), names)
+            # Entries of a listed directory are found in the cached listing
+            hits = op._mount_stats['dircachehits']
+            attr = op.getattr(self.publicFileName)
+            self.assertEqual(attr['st_mode'], 0o400 | stat.S_IFREG)
+            self.assertEqual(op._mount_stats['dircachehits'], hits + 1)
+            with self.assertRaises(fuse.FuseOSError):
+                op.getattr(path + '/nosuchfile')
+            # Changes drop the cached listing
+            file = op._get_path(self.publicFileName)['document']
+            file['name'] = 'Renamed File'
+            File().save(file)
+            try:
+                names = op.readdir(path, 0)
+                self.assertIn('Renamed File', names)
+                self.assertNotIn(os.path.basename(self.publicFileName), names)
+                op.destroy('/')
+                # The cache can be disabled
+                op = mount.ServerFuse(options={'dircache_ttl': '0'})
+                self.assertIn('Renamed File', op.readdir(path, 0))
+                self.assertEqual(op._mount_stats['dircachehits'], 0)
+            finally:
+                file['name'] = os.path.basename(self.publicFileName)
+                File().save(file)
+
         def testFunctionAccess(self):
             op = mount.ServerFuse()
             self.assertEqual(op.access(self.publicFileName, os.F_OK), 0)
@@ -393,6 +422,32 @@ if not SKIP_FUSE_TESTS:  # noqa
             with self.assertRaises(fuse.FuseOSError):
                 op.read(self.publicFileName, 4, 2, fh)
 
+        def testFunctionReadPrefetch(self):
+            cachePath = tempfile.mkdtemp()
+            try:
+                op = mount.ServerFuse(options={
+                    'diskcache_directory': cachePath, 'diskcache_chunk': '4',
+                    'prefetch': '4'})
+                op._get_direct_path = lambda path, doc: None
+                fh = op.open(self.publicFileName, os.O_RDONLY)
+                contents = self.knownPaths[self.publicFileName].encode('utf8')
+                # Reading sequentially prefetches the following chunks
+                data = b''
+                while True:
+                    chunk = op.read(self.publicFileName, 3, len(data), fh)
+                    if not chunk:
+                        break
+                    data += chunk
+                self.assertEqual(data.strip(), contents)
+                self.assertGreater(op.diskcache['prefetched'], 0)
+                self.assertGreater(op.diskcache['prefetchhits'], 0)
+                self.assertIn(b'prefetchhitrate', op._mount_stats_repr())
+                self.assertEqual(op.read(self.publicFileName, 4, 2, fh), data[2:6])
+                op.release(self.publicFileName, fh)
+                op.destroy('/')
+            finally:
+                shutil.rmtree(cachePath)
+
         def testFunctionReaddir(self):
             op = mount.ServerFuse()
             path = os.path.dirname(self.publicFileName)
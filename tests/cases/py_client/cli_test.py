@@ -402,6 +402,26 @@ class PythonCliTestCase(base.TestCase):
                          downloadDir), username='mylogin', password='password')
         self.assertEqual(ret['exitVal'], 0)
 
+    def testUploadParallel(self):
+        localDir = os.path.join(os.path.dirname(__file__), 'testdata')
+        args = ['upload', str(self.publicFolder['_id']), localDir, '--parent-type=folder']
+        with unittest.mock.patch.object(
+                girder_client.GirderClient, 'upload', autospec=True,
+                side_effect=girder_client.GirderClient.upload) as upload:
+            ret = invokeCli(args + ['--parallel=3'], username='mylogin', password='password')
+        self.assertEqual(ret['exitVal'], 0)
+        self.assertEqual(upload.call_args_list[0].kwargs['parallel'], 3)
+
+        subfolder = next(Folder().childFolders(
+            parent=self.publicFolder, parentType='folder', limit=1))
+        self.assertEqual(subfolder['name'], 'testdata')
+        self.assertEqual(
+            sorted(item['name'] for item in Folder().childItems(folder=subfolder)),
+            ['hello.txt', 'world.txt'])
+
+        ret = invokeCli(args + ['--parallel=0'], username='mylogin', password='password')
+        self.assertEqual(ret['exitVal'], 2)
+
     def testLeafFoldersAsItems(self):
         localDir = os.path.join(os.path.dirname(__file__), 'testdata')
         args = ['upload', str(self.publicFolder['_id']), localDir, '--leaf-folders-as-items']
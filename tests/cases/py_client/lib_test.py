@@ -11,12 +11,14 @@ import requests
 
 import girder
 from girder import config, events
+from girder.models.assetstore import Assetstore
 from girder.models.collection import Collection
 from girder.models.file import File
 from girder.models.folder import Folder
 from girder.models.item import Item
 from girder.models.upload import Upload
 from girder.models.user import User
+from girder.utility.s3_assetstore_adapter import S3AssetstoreAdapter
 from tests import base
 
 os.environ['GIRDER_PORT'] = os.environ.get('GIRDER_TEST_PORT', '20200')
@@ -27,7 +29,7 @@ def setUpModule():
     plugins = os.environ.get('ENABLED_PLUGINS', '')
     if plugins:
         base.enabledPlugins.extend(plugins.split())
-    base.startServer(False)
+    base.startServer(False, mockS3=True)
 
 
 def tearDownModule():
@@ -498,6 +500,122 @@ class PythonClientTestCase(base.TestCase):
         sha.update(contents.encode('utf8'))
         self.assertEqual(file['sha512'], sha.hexdigest())
 
+    def _useS3Assetstore(self):
+        assetstore = Assetstore().createS3Assetstore(
+            name='S3', bucket='bucketname', accessKeyId='test', secret='test',
+            service=base.mockS3Server.service)
+        assetstore['current'] = True
+        Assetstore().save(assetstore)
+
+    def _losePostResponses(self, lose):
+        """
+        Make the client lose the responses to some of the requests it posts,
+        after the server has handled them.
+        """
+        post = self.client.post
+        sent = []
+
+        def lossyPost(path, *args, **kwargs):
+            result = post(path, *args, **kwargs)
+            sent.append(path)
+            if lose(path, sent):
+                raise requests.ConnectionError('Lost response')
+            return result
+
+        return unittest.mock.patch.object(self.client, 'post', side_effect=lossyPost), sent
+
+    def testUploadParallelParts(self):
+        self._useS3Assetstore()
+        partSize = S3AssetstoreAdapter.CHUNK_LEN
+        contents = bytes(range(256)) * (partSize * 5 // 256) + b'tail'
+        item = self.client.createItem(self.publicFolder['_id'], 'parts')
+        progress = []
+        self.client.parallel = 3
+        with unittest.mock.patch.object(
+                self.client, '_uploadChunk', wraps=self.client._uploadChunk) as uploadChunk:
+            file = self.client.uploadFile(
+                item['_id'], io.BytesIO(contents), 'parts.bin', len(contents),
+                progressCallback=progress.append)
+
+        self.assertEqual(file['_modelType'], 'file')
+        self.assertEqual(file['size'], len(contents))
+        # Each part is sent as a separate chunk that may arrive in any order
+        self.assertEqual(uploadChunk.call_count, 6)
+        self.assertTrue(all(call.kwargs['isPart'] for call in uploadChunk.call_args_list))
+        self.assertEqual(len(progress), 6)
+        self.assertTrue(all(info['total'] == len(contents) for info in progress))
+        self.assertEqual(max(info['current'] for info in progress), len(contents))
+        self.assertEqual(b''.join(self.client.downloadFileAsIterator(file['_id'])), contents)
+
+    def testUploadResendsFailedPart(self):
+        self._useS3Assetstore()
+        partSize = S3AssetstoreAdapter.CHUNK_LEN
+        contents = b'x' * (partSize * 3)
+        item = self.client.createItem(self.publicFolder['_id'], 'parts')
+        post = self.client.post
+        failed = []
+
+        def flakyPost(path, *args, **kwargs):
+            # The request for the second part fails before reaching the server
+            if path.startswith('file/chunk?offset=%d&' % partSize) and not failed:
+                failed.append(path)
+                raise requests.ConnectionError('Failed request')
+            return post(path, *args, **kwargs)
+
+        self.client.parallel = 2
+        with unittest.mock.patch.object(self.client, 'post', side_effect=flakyPost), \
+                unittest.mock.patch.object(self.client, 'get', wraps=self.client.get) as get:
+            file = self.client.uploadFile(
+                item['_id'], io.BytesIO(contents), 'parts.bin', len(contents))
+
+        self.assertEqual(len(failed), 1)
+        self.assertIn('file/offset', [call.args[0] for call in get.call_args_list])
+        self.assertEqual(file['_modelType'], 'file')
+        self.assertEqual(file['size'], len(contents))
+        self.assertEqual(b''.join(self.client.downloadFileAsIterator(file['_id'])), contents)
+
+    def testUploadLostPartResponses(self):
+        self._useS3Assetstore()
+        partSize = S3AssetstoreAdapter.CHUNK_LEN
+        contents = b'x' * (partSize * 4)
+        item = self.client.createItem(self.publicFolder['_id'], 'parts')
+
+        # Every part is stored, including the one that finishes the upload,
+        # but none of the responses arrive
+        patch, sent = self._losePostResponses(lambda path, sent: path.startswith('file/chunk'))
+        self.client.parallel = 2
+        with patch:
+            file = self.client.uploadFile(
+                item['_id'], io.BytesIO(contents), 'parts.bin', len(contents))
+
+        self.assertEqual(len([path for path in sent if path.startswith('file/chunk')]), 4)
+        self.assertEqual(file['_modelType'], 'file')
+        self.assertEqual(file['size'], len(contents))
+        self.assertEqual(file['itemId'], item['_id'])
+
+    def testUploadLostChunkResponse(self):
+        chunkSize = 1024
+        contents = b'y' * (chunkSize * 3)
+        item = self.client.createItem(self.publicFolder['_id'], 'chunks')
+        self.client.MAX_CHUNK_SIZE = chunkSize
+
+        for lostOffset in (chunkSize, 2 * chunkSize):
+            # The response for a stored chunk is lost; the chunk that finishes
+            # the upload should still return the file.
+            patch, sent = self._losePostResponses(lambda path, sent, lostOffset=lostOffset: (
+                path.startswith('file/chunk?offset=%d&' % lostOffset)
+                and sent.count(path) == 1))
+            with patch:
+                file = self.client.uploadFile(
+                    item['_id'], io.BytesIO(contents), 'chunks%d.bin' % lostOffset,
+                    len(contents))
+
+            # No chunk is sent twice
+            self.assertEqual(len([path for path in sent if path.startswith('file/chunk')]), 3)
+            self.assertEqual(file['_modelType'], 'file')
+            self.assertEqual(file['name'], 'chunks%d.bin' % lostOffset)
+            self.assertEqual(File().load(file['_id'], force=True)['size'], len(contents))
+
     def testListFile(self):
         # Creating item
         item = self.client.createItem(self.publicFolder['_id'], 'SomethingUnique')